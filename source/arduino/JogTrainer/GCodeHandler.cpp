@@ -19,32 +19,35 @@ long GCodeHandler::getYSteps() const { return posY_steps; }
 void GCodeHandler::jogCommand(const String& cmd) {
     if (isFeedHold || isPaused || isResetting || isHoming) {
         Serial.println("Motion paused/held/homing/reset. Jog ignored.");
+        Serial.println("error: jog ignored");
         return;
     }
     if (cmd == "X+") {
         if (limitX.isPressed()) {
             Serial.println("X+ limit reached! Movement blocked.");
+            Serial.println("error: move blocked");
         } else {
             Serial.println("Jog X+");
-            stepperX.step(true, 200, 500);
-            posX_steps += 200;
+            posX_steps += jogSteps(stepperX, true);
+            Serial.println("ok");
         }
     } else if (cmd == "X-") {
         Serial.println("Jog X-");
-        stepperX.step(false, 200, 500);
-        posX_steps -= 200;
+        posX_steps += jogSteps(stepperX, false);
+        Serial.println("ok");
     } else if (cmd == "Y+") {
         if (limitY.isPressed()) {
             Serial.println("Y+ limit reached! Movement blocked.");
+            Serial.println("error: move blocked");
         } else {
             Serial.println("Jog Y+");
-            stepperY.step(true, 200, 500);
-            posY_steps += 200;
+            posY_steps += jogSteps(stepperY, true);
+            Serial.println("ok");
         }
     } else if (cmd == "Y-") {
         Serial.println("Jog Y-");
-        stepperY.step(false, 200, 500);
-        posY_steps -= 200;
+        posY_steps += jogSteps(stepperY, false);
+        Serial.println("ok");
     } else if (cmd == "LIM?") {
         Serial.print("X limit: ");
         Serial.print(limitX.isPressed() ? "PRESSED" : "OPEN");
@@ -62,18 +65,44 @@ void GCodeHandler::jogCommand(const String& cmd) {
     }
 }
 
-float GCodeHandler::parseGcodeValue(const String& line, char code, float fallback) {
-    int idx = line.indexOf(code);
-    if (idx == -1) return fallback;
-    int start = idx + 1;
-    int end = start;
-    while (end < line.length() && (isDigit(line[end]) || line[end] == '.' || line[end] == '-')) end++;
-    return line.substring(start, end).toFloat();
+// Steps one at a time so a JOG_CANCEL byte from the host stops the jog within a step.
+// Returns the signed number of steps actually made.
+long GCodeHandler::jogSteps(StepperModule& stepper, bool dir) {
+    long done = 0;
+    while (done < JOG_STEPS) {
+        if (Serial.peek() == JOG_CANCEL) {
+            Serial.read();
+            Serial.println("Jog cancelled");
+            break;
+        }
+        stepper.step(dir, 1, 500);
+        done++;
+    }
+    return dir ? done : -done;
+}
+
+// Single pass over the line, keeping the first X, Y and F words found.
+// Replaces one indexOf() scan per letter; hosts may send compact lines such as "G1X10Y20F600".
+void GCodeHandler::parseMoveWords(const String& line, bool& hasX, float& x, bool& hasY, float& y, bool& hasF, float& f) {
+    const char* s = line.c_str();
+    int len = line.length();
+    int i = 0;
+    while (i < len) {
+        char code = s[i++];
+        if (code != 'X' && code != 'Y' && code != 'F') continue;
+        int start = i;
+        while (i < len && (isDigit(s[i]) || s[i] == '.' || s[i] == '-')) i++;
+        float value = atof(s + start);
+        if (code == 'X' && !hasX) { hasX = true; x = value; }
+        else if (code == 'Y' && !hasY) { hasY = true; y = value; }
+        else if (code == 'F' && !hasF) { hasF = true; f = value; }
+    }
 }
 
 void GCodeHandler::moveTo(long targetX, long targetY, float feedrate_mm_min) {
     if (isFeedHold || isPaused || isResetting || isHoming) {
         Serial.println("Motion paused/held/homing/reset. Move ignored.");
+        Serial.println("error: move ignored");
         return;
     }
     long dx = targetX - posX_steps;
@@ -86,10 +115,12 @@ void GCodeHandler::moveTo(long targetX, long targetY, float feedrate_mm_min) {
     // Check limit switches before moving in each direction
     if ((dx > 0 && limitX.isPressed()) || (dx < 0 && limitX.isPressed())) {
         Serial.println("X limit reached! Move blocked.");
+        Serial.println("error: move blocked");
         return;
     }
     if ((dy > 0 && limitY.isPressed()) || (dy < 0 && limitY.isPressed())) {
         Serial.println("Y limit reached! Move blocked.");
+        Serial.println("error: move blocked");
         return;
     }
 
@@ -146,11 +177,11 @@ void GCodeHandler::handleGcode(const String& line) {
     l.trim();
     l.toUpperCase();
     if (l.startsWith("G0") || l.startsWith("G1")) {
-        float x_mm = parseGcodeValue(l, 'X', posX_steps / stepsPerMM_X);
-        float y_mm = parseGcodeValue(l, 'Y', posY_steps / stepsPerMM_Y);
-        float f = parseGcodeValue(l, 'F', defaultFeedrate);
-        long targetX = l.indexOf('X') >= 0 ? lround(x_mm * stepsPerMM_X) : posX_steps;
-        long targetY = l.indexOf('Y') >= 0 ? lround(y_mm * stepsPerMM_Y) : posY_steps;
+        bool hasX = false, hasY = false, hasF = false;
+        float x_mm = 0, y_mm = 0, f = defaultFeedrate;
+        parseMoveWords(l, hasX, x_mm, hasY, y_mm, hasF, f);
+        long targetX = hasX ? lround(x_mm * stepsPerMM_X) : posX_steps;
+        long targetY = hasY ? lround(y_mm * stepsPerMM_Y) : posY_steps;
         moveTo(targetX, targetY, f);
     } else {
         Serial.println("Unknown or unsupported G-code");
@@ -175,11 +206,27 @@ void GCodeHandler::handleLine(const String& line) {
         handleReset();
     } else if (l == "HOME") {
         handleHome();
+    } else if (l.startsWith("BAUD ")) {
+        handleBaud(l);
     } else if (l.startsWith("G")) {
         handleGcode(l);
     } else {
         Serial.println("Unknown command. Use X+/X-/Y+/Y-/LIM?/BUZ/CLOCK/FEEDHOLD/PAUSE/CYCLE/RESET/HOME or G-code");
+        Serial.println("error: unknown command");
+    }
+}
+
+void GCodeHandler::handleBaud(const String& line) {
+    long rate = line.substring(5).toInt();
+    // Exact on a 16 MHz AVR (double speed UART) except 115200, which is 2.1% off but standard
+    if (rate != 115200 && rate != 250000 && rate != 500000 && rate != 1000000) {
+        Serial.println("error: unsupported baud rate");
+        return;
     }
+    Serial.println("ok");
+    Serial.flush();  // the ok still goes out at the old rate
+    Serial.end();
+    Serial.begin(rate);
 }
 
 void GCodeHandler::handleFeedHold() {
@@ -9,6 +9,10 @@ class LimitSwitch;
 class PiezoBuzzer;
 class ClockModule;
 
+#define JOG_STEPS 200     // steps per manual X+/X-/Y+/Y- jog
+#define JOG_CANCEL 0x85   // realtime byte that stops a running jog (same value as GRBL's jog cancel)
+#define SERIAL_BAUD 115200  // rate after reset; "BAUD <rate>" switches until the next reset
+
 
 class GCodeHandler {
 public:
@@ -37,7 +41,8 @@ private:
     bool isResetting;
 
     void jogCommand(const String& cmd);
-    float parseGcodeValue(const String& line, char code, float fallback);
+    long jogSteps(StepperModule& stepper, bool dir);
+    void parseMoveWords(const String& line, bool& hasX, float& x, bool& hasY, float& y, bool& hasF, float& f);
     void moveTo(long targetX, long targetY, float feedrate_mm_min);
     void handleGcode(const String& line);
 
@@ -46,6 +51,7 @@ private:
     void handleCycleStart();
     void handleReset();
     void handleHome();
+    void handleBaud(const String& line);
     void doHome();
 };
 
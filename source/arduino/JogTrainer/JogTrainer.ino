@@ -30,7 +30,7 @@ GCodeHandler gcodeHandler(stepperX, stepperY, limitX, limitY, buzzer, clock, ste
 
 
 void setup() {
-  Serial.begin(115200);
+  Serial.begin(SERIAL_BAUD);
   stepperX.begin();
   stepperY.begin();
   limitX.begin();
@@ -43,6 +43,11 @@ void setup() {
 
 void loop() {
   if (Serial.available() > 0) {
+    // A jog cancel that arrives after the jog already finished has nothing to stop
+    if (Serial.peek() == JOG_CANCEL) {
+      Serial.read();
+      return;
+    }
     String cmd = Serial.readStringUntil('\n');
     cmd.trim();
     gcodeHandler.handleLine(cmd);
@@ -0,0 +1,330 @@
+"""Throughput and latency benchmarks for the controller stack.
+
+Runs against the simulated board (controller/simulator.py), so no hardware
+is needed. Run from the JogTrainer directory:
+
+    python -m benchmarks.bench_streaming --output bench_results.json
+    python -m benchmarks.bench_streaming --baseline bench_results.json
+
+Results are a flat JSON object of metrics; with --baseline, every metric is
+compared and the exit code is 1 when one regresses by more than --threshold %
+and by more than its noise floor (NOISE_FLOORS, in the metric's own unit).
+Before measuring, both senders are checked to keep the resume checkpoint on
+the line before an injected error.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from controller.async_grbl import AsyncGRBLController
+from controller.checkpoint import JobCheckpoint
+from controller.gcode_sender import GcodeSender, STREAM_MODES, ARDUINO_RX_BUFFER_SIZE
+from controller.grbl_serial import GRBLController
+from controller.simulator import SimulatedDevice
+from controller.toolpath import compile_program
+
+STATUS_REPORT = "<Run|WPos:12.345,67.890,0.000|FS:600,0|Bf:14,60|Ln:1234>"
+SIZE_SUFFIXES = {"k": 1000, "M": 1000000}
+# Smallest absolute change that counts as a regression, by metric suffix
+NOISE_FLOORS = (("_ms", 0.2), ("_us_per_report", 0.5), ("_s", 0.005), ("_mb", 2.0))
+
+
+def parse_size(text):
+    if text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return None
+    last = len(sorted_samples) - 1
+    return sorted_samples[min(last, int(round(p / 100 * last)))]
+
+
+def write_program(path, lines):
+    with open(path, 'w') as f:
+        f.write("; synthetic benchmark program\nG21 G90\n")
+        chunk = []
+        for i in range(lines):
+            chunk.append(f"G1 X{(i * 7) % 500}.{i % 1000:03d} Y{(i * 3) % 300}.{(i * 7) % 1000:03d} F{600 + i % 5 * 100}\n")
+            if len(chunk) == 10000:
+                f.write(''.join(chunk))
+                chunk.clear()
+        f.write(''.join(chunk))
+
+
+def compile_uncached(sender):
+    # Compile without reading or filling the user's toolpath cache
+    sender.toolpath = compile_program(sender.program, use_cache=False)
+
+
+def connect(device):
+    controller = GRBLController()
+    # The simulator may miss a quick reopen as a reset; probe instead of waiting for a banner
+    if not controller.connect(device.port, ready_timeout=0.1):
+        raise RuntimeError(f"Could not connect to simulator on {device.port}")
+    return controller
+
+
+def bench_sender(workdir, lines, line_delay, rx_buffer_size):
+    path = os.path.join(workdir, f"sender_{lines}.nc")
+    write_program(path, lines)
+    results = {}
+    with SimulatedDevice(rx_buffer_size=rx_buffer_size, line_delay=line_delay) as device:
+        controller = connect(device)
+        try:
+            for mode in STREAM_MODES:
+                sender = GcodeSender(controller, mode=mode, rx_buffer_size=rx_buffer_size)
+                sender.load_file(path)
+                compile_uncached(sender)
+                overflow = device.overflow_bytes
+                start = time.perf_counter()
+                sender.start()
+                sender.thread.join()
+                elapsed = time.perf_counter() - start
+                stats = sender.get_stats()
+                results[f"sender.{mode}.lines_per_sec"] = stats["lines_acked"] / elapsed
+                results[f"sender.{mode}.overflow_bytes"] = device.overflow_bytes - overflow
+                sender.program.close()
+        finally:
+            controller.disconnect()
+    return results
+
+
+def _run_threaded(device, sender, from_line):
+    sender.controller = connect(device)
+    try:
+        sender.start(from_line)
+        sender.thread.join()
+    finally:
+        sender.controller.disconnect()
+
+
+async def _run_async(device, sender, from_line):
+    transport = AsyncGRBLController(rx_buffer_size=device.rx_buffer_size)
+    if not await transport.connect(device.port, ready_timeout=0.1):
+        raise RuntimeError(f"Could not connect to simulator on {device.port}")
+    sender.controller = transport
+    try:
+        await sender.run_async(transport, from_line)
+    finally:
+        await transport.disconnect()
+
+
+def check_error_resume(workdir, lines=2000, error_every=500):
+    """An error must leave the checkpoint on the line before it, and resuming must finish the job.
+
+    Runs the threaded sender and run_async(); raises RuntimeError when
+    either saves a checkpoint past the failed line.
+    """
+    path = os.path.join(workdir, f"resume_{lines}.nc")
+    write_program(path, lines)
+    runners = {
+        "threaded": _run_threaded,
+        "async": lambda device, sender, from_line: asyncio.run(_run_async(device, sender, from_line)),
+    }
+    for name, run in runners.items():
+        checkpoint = JobCheckpoint(os.path.join(workdir, f"{name}.ckpt"))
+        sender = GcodeSender(None, checkpoint=checkpoint)
+        sender.load_file(path)
+        compile_uncached(sender)
+        try:
+            with SimulatedDevice(error_every=error_every) as device:
+                sender.window.rx_buffer_size = device.rx_buffer_size
+                run(device, sender, 0)
+                if sender.error is None:
+                    raise RuntimeError(f"{name}: no error from the simulator")
+                failed = sender.error[0]
+                saved = checkpoint.read()
+                if saved.line != failed - 1:
+                    raise RuntimeError(f"{name}: error on line {failed + 1} but checkpoint at line {saved.line + 1}")
+                device.error_every = 0
+                run(device, sender, saved.line + 1)
+                if sender.error is not None or not checkpoint.read().completed:
+                    raise RuntimeError(f"{name}: resuming at line {saved.line + 2} did not finish the job")
+        finally:
+            sender.program.close()
+            checkpoint.close()
+
+
+def bench_ack_latency(samples, line_delay, rx_buffer_size):
+    latencies = []
+    acked = threading.Event()
+    with SimulatedDevice(rx_buffer_size=rx_buffer_size, line_delay=line_delay) as device:
+        controller = connect(device)
+        controller.add_response_listener(lambda response: acked.set())
+        try:
+            for i in range(samples):
+                acked.clear()
+                start = time.perf_counter()
+                controller.send_command(f"G1 X{i % 100} Y{i % 50}")
+                if not acked.wait(2.0):
+                    raise RuntimeError("No ack from simulator")
+                latencies.append(time.perf_counter() - start)
+        finally:
+            controller.disconnect()
+    latencies.sort()
+    return {
+        "ack_latency.p50_ms": percentile(latencies, 50) * 1000,
+        "ack_latency.p99_ms": percentile(latencies, 99) * 1000,
+        "ack_latency.max_ms": latencies[-1] * 1000,
+    }
+
+
+def bench_status_parse(reports):
+    # Reader-side cost per status report, without and with UI callbacks attached
+    from ui_components.update_pipeline import UIUpdatePipeline
+    results = {}
+    controller = GRBLController()
+    start = time.perf_counter()
+    for _ in range(reports):
+        controller._handle_line(STATUS_REPORT)
+    bare = time.perf_counter() - start
+    results["status_parse.reports_per_sec"] = reports / bare
+
+    pipeline = UIUpdatePipeline(master=None)  # drained by hand below, no Tk loop
+    pipeline.register("status", lambda status, line: None)
+    pipeline.register("position", lambda pos_str: None)
+    controller = GRBLController(
+        on_status_change=lambda status, line: pipeline.post_latest("status", status, line),
+        on_position_update=lambda pos_str: pipeline.post_latest("position", pos_str),
+        on_log=pipeline.post_log)
+    start = time.perf_counter()
+    for i in range(reports):
+        controller._handle_line(STATUS_REPORT)
+        if i % 1000 == 999:
+            pipeline.drain()
+    with_ui = time.perf_counter() - start
+    results["ui_callbacks.overhead_us_per_report"] = (with_ui - bare) / reports * 1e6
+    return results
+
+
+def load_child(path):
+    # Runs in a fresh interpreter so peak RSS belongs to this load alone
+    start = time.perf_counter()
+    sender = GcodeSender(controller=None)
+    sender.load_file(path)
+    load_s = time.perf_counter() - start
+    start = time.perf_counter()
+    count = sum(1 for _ in sender.program.iter_lines())
+    iterate_s = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"load_s": load_s, "iterate_s": iterate_s, "lines": count, "peak_rss_mb": peak_kb / 1024}
+
+
+def bench_load(workdir, sizes):
+    results = {}
+    for size in sizes:
+        path = os.path.join(workdir, f"load_{size}.nc")
+        write_program(path, size)
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_streaming", "--load-child", path],
+            check=True, capture_output=True, text=True).stdout
+        child = json.loads(output.strip().splitlines()[-1])
+        for key in ("load_s", "iterate_s", "peak_rss_mb"):
+            results[f"load.{size}.{key}"] = child[key]
+        os.remove(path)
+    return results
+
+
+def higher_is_better(metric):
+    return "per_sec" in metric
+
+
+def noise_floor(metric):
+    for suffix, floor in NOISE_FLOORS:
+        if metric.endswith(suffix):
+            return floor
+    return 0.0
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"{'metric':48} {'baseline':>12} {'current':>12} {'change':>8}")
+    for metric, value in sorted(results.items()):
+        old = baseline.get(metric)
+        if not isinstance(old, (int, float)) or not isinstance(value, (int, float)):
+            continue
+        if old:
+            change = (value - old) / abs(old) * 100
+        elif value and not higher_is_better(metric):
+            change = float('inf')  # e.g. overflow bytes appearing where there were none
+        else:
+            continue
+        worse = -change if higher_is_better(metric) else change
+        flag = "  REGRESSION" if worse > threshold and abs(value - old) > noise_floor(metric) else ""
+        if flag:
+            regressions.append(metric)
+        print(f"{metric:48} {old:12.3f} {value:12.3f} {change:+7.1f}%{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JogTrainer controller stack benchmarks")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    parser.add_argument("--lines", type=parse_size, default=20000, help="lines streamed per sender mode")
+    parser.add_argument("--line-delay", type=float, default=0.0, help="simulated processing time per line")
+    parser.add_argument("--rx-buffer", type=int, default=ARDUINO_RX_BUFFER_SIZE)
+    parser.add_argument("--latency-samples", type=int, default=2000)
+    parser.add_argument("--reports", type=parse_size, default=200000, help="status reports parsed")
+    parser.add_argument("--sizes", default="10k,1M", help="comma separated program sizes for the load test, e.g. 10k,1M,10M")
+    parser.add_argument("--load-child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.load_child:
+        print(json.dumps(load_child(args.load_child)))
+        return 0
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        print("Checkpoint after an error...")
+        check_error_resume(workdir)
+        print("Streaming through the simulator...")
+        results.update(bench_sender(workdir, args.lines, args.line_delay, args.rx_buffer))
+        print("Ack latency...")
+        results.update(bench_ack_latency(args.latency_samples, args.line_delay, args.rx_buffer))
+        print("Status report parsing...")
+        results.update(bench_status_parse(args.reports))
+        print("File loading...")
+        results.update(bench_load(workdir, [parse_size(size) for size in args.sizes.split(',')]))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("load_child",)},
+        },
+        "results": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {len(results)} metrics to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold}%")
+            return 1
+    else:
+        for metric, value in sorted(results.items()):
+            print(f"{metric:48} {value:12.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""Headless job streaming, without the Tk GUI.
+
+    python -m controller ports
+    python -m controller send job.nc --port /dev/ttyUSB0 [--port /dev/ttyUSB1 ...] [--json]
+    python -m controller serve --socket /tmp/jogtrainer.sock --port /dev/ttyUSB0
+    python -m controller submit job.nc --socket /tmp/jogtrainer.sock
+
+send connects, checks and streams one file with character-counting flow
+control on every port (one asyncio thread through ControllerPool) and exits
+with one of the EXIT_* codes. With --json, stdout carries one JSON object
+per line (loaded, preflight, connected, status, progress, error, done,
+result); everything else goes to stderr.
+
+serve keeps the ports connected and accepts jobs on a Unix socket, one at a
+time, so batch runs skip the board reset per job. A request is one JSON
+line ({"cmd": "send", "file": ...}, {"cmd": "status"}, {"cmd": "stop"} or
+{"cmd": "shutdown"}); the reply is the same JSON event stream as send
+--json. submit is the matching client.
+"""
+import argparse
+import contextlib
+from concurrent import futures
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from controller.controller_pool import ControllerPool
+from controller.gcode_sender import (
+    MODE_CHAR_COUNT, STREAM_MODES, ARDUINO_RX_BUFFER_SIZE, GRBL_RX_BUFFER_SIZE
+)
+from controller.grbl_serial import DEFAULT_BAUDRATE, BAUD_AUTO
+from controller.jog_controller import PROTOCOL_ARDUINO, PROTOCOL_GRBL
+
+EXIT_OK = 0
+EXIT_FAILED = 1         # a job halted on an error, lost its port or did not finish
+EXIT_USAGE = 2          # bad arguments (argparse) or a file that cannot be opened
+EXIT_NOT_CONNECTED = 3  # no port could be opened
+EXIT_PREFLIGHT = 4      # the pre-flight check found errors; --force streams anyway
+EXIT_INTERRUPTED = 130  # Ctrl-C
+
+DEFAULT_SOCKET = os.path.join(os.path.expanduser('~'), '.cache', 'jogtrainer', 'daemon.sock')
+DEFAULT_TOLERANCE = 0.01  # mm, as OPTIMIZE_TOLERANCE_MM in main.py
+PROGRESS_INTERVAL = 1.0   # seconds between progress events
+
+RX_BUFFER_SIZES = {PROTOCOL_ARDUINO: ARDUINO_RX_BUFFER_SIZE, PROTOCOL_GRBL: GRBL_RX_BUFFER_SIZE}
+
+
+class Reporter:
+    """Writes events as JSON lines or as short human-readable lines; safe from any thread."""
+
+    def __init__(self, stream, as_json=False):
+        self.stream = stream
+        self.as_json = as_json
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def emit(self, event, **fields):
+        if self.as_json:
+            text = json.dumps({"event": event, "time": round(time.monotonic() - self.started, 3), **fields})
+        else:
+            text = self._format(event, fields)
+        with self.lock:
+            try:
+                self.stream.write(text + "\n")
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass  # the client went away; the job carries on
+
+    @staticmethod
+    def _format(event, f):
+        port = f"{f['port']}: " if "port" in f else ""
+        if event == "progress":
+            return f"{port}{f['progress'] * 100:5.1f}%  line {f['line']}/{f['total_lines']}  {f['lines_per_sec']:.1f} lines/sec"
+        if event == "done":
+            state = "completed" if f["completed"] else f"failed ({f['error'] or 'stopped'})"
+            return f"{port}{state}: {f['lines_acked']} lines in {f['elapsed']:.1f} s"
+        if event == "preflight":
+            return "\n".join([f"Pre-flight: {f['errors']} error(s), {f['warnings']} warning(s)"] + f["issues"])
+        if event == "status":
+            return f"{port}{f['status']}"
+        if event == "error":
+            return f"{port}error: {f['error']}"
+        if event == "connected":
+            return f"{port}{'connected' if f['ok'] else 'cannot connect'}"
+        if event == "result":
+            return f"Exit code {f['exit_code']}"
+        return port + event + " " + " ".join(f"{k}={v}" for k, v in f.items() if k != "port")
+
+
+class HeadlessSender:
+    """A ControllerPool plus the checks and reporting of a one-shot job."""
+
+    def __init__(self, protocol=PROTOCOL_ARDUINO, mode=MODE_CHAR_COUNT, interval=PROGRESS_INTERVAL):
+        self.protocol = protocol
+        self.interval = interval
+        self.reporter = None
+        self.pool = ControllerPool(on_machine_update=self._on_machine_update, mode=mode,
+                                   rx_buffer_size=RX_BUFFER_SIZES[protocol])
+
+    def _on_machine_update(self, port, event, value):
+        # Loop thread; progress is sampled by run() instead of reported per line
+        reporter = self.reporter
+        if reporter is None:
+            return
+        if event == "status":
+            reporter.emit("status", port=port, status=value)
+        elif event == "error":
+            reporter.emit("error", port=port, error=value)
+
+    def connect(self, ports, baudrate=DEFAULT_BAUDRATE, fast_baudrate=None):
+        results = self.pool.connect(ports, baudrate, fast_baudrate)
+        for port, ok in results.items():
+            self.reporter.emit("connected", port=port, ok=ok)
+        return [port for port, ok in results.items() if ok]
+
+    def run(self, filepath, ports, tolerance=DEFAULT_TOLERANCE, preflight=True, force=False):
+        """Stream filepath on the connected ports; returns an EXIT_* code."""
+        emit = self.reporter.emit
+        try:
+            toolpath = self.pool.load_job(filepath, tolerance)
+        except (OSError, ValueError) as e:
+            emit("error", error=f"Cannot load {filepath}: {e}")
+            return EXIT_USAGE
+        emit("loaded", file=filepath, lines=self.pool.program.line_count, commands=len(toolpath))
+        if preflight:
+            from controller.preflight import preflight_check
+            report = preflight_check(toolpath, self.pool.program, check_words=self.protocol == PROTOCOL_ARDUINO)
+            emit("preflight", errors=len(report.errors), warnings=len(report.warnings),
+                 issues=[issue.describe() for issue in report.issues])
+            if not report.ok and not force:
+                return EXIT_PREFLIGHT
+
+        started = self.pool.start_job(ports)
+        if not started:
+            return EXIT_NOT_CONNECTED
+        links = [self.pool.machines[port] for port in started]
+        jobs = [link.job for link in links]
+        while futures.wait(jobs, timeout=self.interval).not_done:
+            for link in links:
+                if link.sender.is_running:
+                    self._emit_progress(link)
+        results = self.pool.wait(started)
+        for link in links:
+            stats = link.sender.get_stats()
+            emit("done", port=link.port, completed=results[link.port], error=link.error,
+                 lines_acked=stats["lines_acked"], last_line=stats["last_acked_line"],
+                 elapsed=round(stats["elapsed"], 3),
+                 lines_per_sec=round(stats["lines_acked"] / stats["elapsed"], 1) if stats["elapsed"] else 0.0)
+        return EXIT_OK if all(results.values()) and len(started) == len(ports) else EXIT_FAILED
+
+    def _emit_progress(self, link):
+        stats = link.sender.get_stats()
+        self.reporter.emit("progress", port=link.port, progress=round(link.progress, 4),
+                           line=stats["last_acked_line"], total_lines=stats["total_lines"],
+                           lines_per_sec=round(stats["lines_per_sec"], 1))
+
+    def stop(self):
+        self.pool.stop()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+def command_ports(args):
+    for port in ControllerPool.available_ports():
+        print(port)
+    return EXIT_OK
+
+
+def command_send(args):
+    out = sys.stdout
+    sender = HeadlessSender(args.protocol, args.mode, args.interval)
+    sender.reporter = Reporter(out, args.json)
+    # Sender and controller messages are for people; keep stdout machine-readable
+    with contextlib.redirect_stdout(sys.stderr):
+        reporter = sender.reporter
+        try:
+            if not os.path.isfile(args.file):
+                reporter.emit("error", error=f"No such file: {args.file}")
+                code = EXIT_USAGE
+            elif not sender.connect(args.port, args.baud, args.fast_baud):
+                code = EXIT_NOT_CONNECTED
+            else:
+                code = sender.run(args.file, args.port, args.optimize, not args.no_preflight, args.force)
+        except KeyboardInterrupt:
+            sender.stop()
+            code = EXIT_INTERRUPTED
+        finally:
+            sender.reporter = None  # the result is the last event
+            sender.shutdown()
+        reporter.emit("result", exit_code=code)
+        return code
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.job_daemon
+        for raw in self.rfile:
+            try:
+                request = json.loads(raw)
+            except ValueError:
+                request = {}
+            reporter = Reporter(self.events, as_json=True)
+            command = request.get("cmd")
+            if command == "send" and request.get("file"):
+                daemon.run_job(request, reporter)
+            elif command == "status":
+                reporter.emit("machines", machines=daemon.sender.pool.get_status())
+            elif command == "stop":
+                daemon.sender.stop()
+                reporter.emit("result", exit_code=EXIT_OK)
+            elif command == "shutdown":
+                reporter.emit("result", exit_code=EXIT_OK)
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            else:
+                reporter.emit("result", exit_code=EXIT_USAGE, error=f"Bad request: {raw.strip()!r}")
+
+    def setup(self):
+        super().setup()
+        self.events = self.connection.makefile('w')
+
+    def finish(self):
+        self.events.close()
+        super().finish()
+
+
+class JobDaemon:
+    """Keeps the ports connected and runs submitted jobs one after another."""
+
+    def __init__(self, args):
+        self.args = args
+        self.sender = HeadlessSender(args.protocol, args.mode, args.interval)
+        self.sender.reporter = Reporter(sys.stderr)
+        self.lock = threading.Lock()
+
+    def run_job(self, request, reporter):
+        with self.lock:
+            self.sender.reporter = reporter
+            try:
+                ports = request.get("ports") or self.args.port
+                connected = self.sender.connect(ports, self.args.baud, self.args.fast_baud)
+                if not connected:
+                    code = EXIT_NOT_CONNECTED
+                else:
+                    code = self.sender.run(request["file"], ports, request.get("optimize", self.args.optimize),
+                                           request.get("preflight", True), request.get("force", False))
+                reporter.emit("result", exit_code=code)
+            finally:
+                self.sender.reporter = Reporter(sys.stderr)
+
+    def serve(self):
+        path = self.args.socket
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        connected = self.sender.connect(self.args.port, self.args.baud, self.args.fast_baud)
+        if not connected:
+            return EXIT_NOT_CONNECTED
+        server = socketserver.ThreadingUnixStreamServer(path, _JobHandler)
+        server.daemon_threads = True
+        server.job_daemon = self
+        print(f"Listening on {path} for {', '.join(connected)}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.sender.stop()
+        finally:
+            server.server_close()
+            os.remove(path)
+            self.sender.shutdown()
+        return EXIT_OK
+
+
+def command_serve(args):
+    with contextlib.redirect_stdout(sys.stderr):
+        return JobDaemon(args).serve()
+
+
+def command_submit(args):
+    request = {"cmd": "send", "file": os.path.abspath(args.file), "force": args.force,
+               "preflight": not args.no_preflight}
+    if args.port:
+        request["ports"] = args.port
+    if args.optimize is not None:
+        request["optimize"] = args.optimize
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(args.socket)
+        except OSError as e:
+            print(f"Cannot reach the daemon at {args.socket}: {e}", file=sys.stderr)
+            return EXIT_NOT_CONNECTED
+        sock.sendall((json.dumps(request) + "\n").encode())
+        reporter = Reporter(sys.stdout, args.json)
+        for raw in sock.makefile('r'):
+            event = json.loads(raw)
+            name = event.pop("event")
+            event.pop("time", None)
+            reporter.emit(name, **event)
+            if name == "result":
+                return event["exit_code"]
+    return EXIT_FAILED
+
+
+def _baudrate(text):
+    return text if text == BAUD_AUTO else int(text)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m controller", description="Stream G-code without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("ports", help="list serial ports").set_defaults(func=command_ports)
+
+    def add_job_options(p, ports_required, tolerance):
+        p.add_argument("--port", action="append", required=ports_required,
+                       help="serial port; repeat to stream to several machines")
+        p.add_argument("--optimize", type=float, default=tolerance,
+                       help=f"merge collinear segments within this many mm (default {DEFAULT_TOLERANCE}, 0 to disable)")
+        p.add_argument("--no-preflight", action="store_true", help="skip the pre-flight check")
+        p.add_argument("--force", action="store_true", help="stream even when the pre-flight check finds errors")
+
+    def add_link_options(p):
+        p.add_argument("--baud", type=_baudrate, default=DEFAULT_BAUDRATE,
+                       help="rate after reset, or auto to find it")
+        p.add_argument("--fast-baud", type=_baudrate, default=None,
+                       help="ask the sketch to switch to this rate (or auto: the fastest that works)")
+        p.add_argument("--protocol", choices=sorted(RX_BUFFER_SIZES), default=PROTOCOL_ARDUINO,
+                       help="firmware on the board; sets the RX buffer size and pre-flight rules")
+        p.add_argument("--mode", choices=STREAM_MODES, default=MODE_CHAR_COUNT)
+        p.add_argument("--interval", type=float, default=PROGRESS_INTERVAL, help="seconds between progress events")
+
+    send = commands.add_parser("send", help="stream a file and exit")
+    send.add_argument("file")
+    add_job_options(send, True, DEFAULT_TOLERANCE)
+    add_link_options(send)
+    send.add_argument("--json", action="store_true", help="JSON lines on stdout")
+    send.set_defaults(func=command_send)
+
+    serve = commands.add_parser("serve", help="keep ports connected and accept jobs on a Unix socket")
+    serve.add_argument("--port", action="append", required=True)
+    serve.add_argument("--socket", default=DEFAULT_SOCKET)
+    serve.add_argument("--optimize", type=float, default=DEFAULT_TOLERANCE)
+    add_link_options(serve)
+    serve.set_defaults(func=command_serve)
+
+    submit = commands.add_parser("submit", help="send a job to a running daemon and follow it")
+    submit.add_argument("file")
+    submit.add_argument("--socket", default=DEFAULT_SOCKET)
+    add_job_options(submit, False, None)  # None: the daemon's --optimize
+    submit.add_argument("--json", action="store_true", help="JSON lines on stdout")
+    submit.set_defaults(func=command_submit)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import asyncio
+from collections import deque
+
+import serial
+
+from controller.grbl_serial import GRBLController, open_serial, expects_ack, DEFAULT_BAUDRATE, READY_TIMEOUT
+from controller.gcode_sender import StreamWindow, GRBL_RX_BUFFER_SIZE
+
+# Single-byte commands GRBL acts on immediately; they never enter the line queue
+REALTIME_COMMANDS = ('!', '~', '?', '\x18')
+
+
+class AsyncGRBLController(GRBLController):
+    """asyncio transport with the same callbacks as GRBLController.
+
+    The port is watched with loop.add_reader() instead of a polling thread,
+    so disconnect is immediate. Lines go through a bounded write queue that
+    respects the controller's RX buffer; send_line() returns once its line
+    is written, with a future resolved by the line's 'ok' / 'error:...'
+    reply, so a job never has lines waiting behind the RX window.
+    cancel_pending() withdraws lines not written yet. Real-time commands
+    are written straight to the port, ahead of anything queued.
+
+    connect(), disconnect() and send_command() are coroutines here.
+    Requires a POSIX event loop (Raspberry Pi / Linux).
+    """
+
+    def __init__(self, on_status_change=None, on_position_update=None, on_log=None,
+                 rx_buffer_size=GRBL_RX_BUFFER_SIZE, queue_size=32):
+        super().__init__(on_status_change, on_position_update, on_log)
+        self.window = StreamWindow(rx_buffer_size)
+        self.queue_size = queue_size
+        self._acks = deque()  # futures, same order as window.pending
+        self._loop = None
+        self._write_queue = None
+        self._writer_task = None
+        self._writing = None  # ack future of the line waiting for RX space
+        self._space = None
+        self._rx = bytearray()
+
+    async def connect(self, port, baudrate=DEFAULT_BAUDRATE, fast_baudrate=None, ready_timeout=READY_TIMEOUT):
+        self._loop = asyncio.get_running_loop()
+        self.ser = None
+        try:
+            # Opening the port resets the Arduino; wait for its banner without blocking the loop
+            self.ser, self.banner = await self._loop.run_in_executor(
+                None, open_serial, port, baudrate, fast_baudrate, ready_timeout)
+            self.ser.timeout = 0
+            self.baudrate = self.ser.baudrate
+            self.state.reset()
+            self._loop.add_reader(self.ser.fileno(), self._on_readable)
+        except (serial.SerialException, OSError, ValueError, NotImplementedError) as e:
+            if self.ser and self.ser.is_open:
+                self.ser.close()
+            if self.on_status_change:
+                self.on_status_change("Error", f"Failed to connect: {e}")
+            self.is_connected = False
+            return False
+
+        self.window.clear()
+        self._acks.clear()
+        self._rx.clear()
+        self._space = asyncio.Event()
+        self._write_queue = asyncio.Queue(self.queue_size)
+        self._writer_task = self._loop.create_task(self._write_loop())
+        self.is_connected = True
+        if self.recorder is not None:
+            self.recorder.event(f"Connected to {port} at {self.baudrate}")
+        if self.on_status_change:
+            self.on_status_change("Connected", f"Connected to {port} at {self.baudrate} baud")
+        return True
+
+    async def disconnect(self):
+        self._close("Disconnected from port")
+        if self._writer_task:
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+
+    def _close(self, reason):
+        self.stop_status_poller()
+        was_connected = self.is_connected
+        self.is_connected = False
+        if self._writer_task:
+            self._writer_task.cancel()
+        if self.ser and self.ser.is_open:
+            try:
+                self._loop.remove_reader(self.ser.fileno())
+            except (ValueError, OSError):
+                pass
+            self.ser.close()
+        # Nothing queued or in flight will be acknowledged any more
+        error = ConnectionError(reason)
+        while self._acks:
+            future = self._acks.popleft()
+            if not future.done():
+                future.set_exception(error)
+        while self._write_queue and not self._write_queue.empty():
+            _, future, _ = self._write_queue.get_nowait()
+            if not future.done():
+                future.set_exception(error)
+        if self._writing is not None and not self._writing.done():
+            self._writing.set_exception(error)
+        self.window.clear()
+        if was_connected and self.recorder is not None:
+            self.recorder.event(reason)
+        if was_connected and self.on_status_change:
+            self.on_status_change("Disconnected", reason)
+
+    def send_realtime(self, char):
+        if not self.is_connected:
+            return "Not connected"
+        if self.recorder is not None:
+            self.recorder.realtime(char)
+        try:
+            self.ser.write(char.encode('latin-1'))  # 0x80-0xFF commands are single bytes
+        except serial.SerialException as e:
+            self._fail(e)
+            return f"Serial error: {e}"
+        if char != '?' and self.on_log:
+            self.on_log(f"Sent realtime: {char!r}")
+        return "Sent"
+
+    async def send_line(self, line):
+        """Queue a line; returns (once written) a future for its ok/error reply.
+
+        The future is cancelled if cancel_pending() withdrew the line first.
+        """
+        future = self._loop.create_future()
+        if not self.is_connected:
+            future.set_exception(ConnectionError("Not connected"))
+            return future
+        if self._writing is None and self._write_queue.empty() and self.window.fits(len(line) + 1):
+            self._write(line, future)  # nothing ahead of it and room in the RX buffer
+            return future
+        written = self._loop.create_future()
+        await self._write_queue.put((line, future, written))
+        if not self.is_connected and not future.done():
+            future.set_exception(ConnectionError("Disconnected"))  # dropped while waiting for queue space
+        if not future.done():
+            await asyncio.wait((written, future), return_when=asyncio.FIRST_COMPLETED)
+        return future
+
+    def cancel_pending(self):
+        """Withdraw lines not written yet (stop, pause, error); returns how many were cancelled."""
+        count = 0
+        while self._write_queue and not self._write_queue.empty():
+            _, future, _ = self._write_queue.get_nowait()
+            if future.cancel():
+                count += 1
+        if self._writing is not None and self._writing.cancel():
+            count += 1
+            self._space.set()  # wake the writer so it drops the line
+        return count
+
+    async def send_command(self, command):
+        if command in REALTIME_COMMANDS:
+            return self.send_realtime(command)
+        future = await self.send_line(command)
+        if future.cancelled():
+            return "Cancelled"
+        try:
+            return await future
+        except ConnectionError as e:
+            return str(e)
+
+    async def _write_loop(self):
+        window = self.window
+        while True:
+            line, future, written = await self._write_queue.get()
+            if future.done():
+                continue
+            nbytes = len(line) + 1
+            self._writing = future
+            while not window.fits(nbytes) and not future.done():
+                self._space.clear()
+                await self._space.wait()
+            self._writing = None
+            if future.done():
+                continue  # cancelled while waiting for space
+            if not self._write(line, future):
+                return
+            written.set_result(None)
+
+    def _write(self, line, future):
+        self.window.push(None, line)
+        self._acks.append(future)
+        if self.recorder is not None:
+            self.recorder.tx(line, expects_ack(line))
+        try:
+            self.ser.write((line + '\n').encode())
+        except serial.SerialException as e:
+            self._fail(e)
+            return False
+        if self.on_log:
+            self.on_log(f"Sent: {line}")
+        return True
+
+    def _fail(self, error):
+        self.logger.error(f"Serial error: {error}")
+        if self.on_status_change:
+            self.on_status_change("Error", f"Serial error: {error}")
+        self._close(f"Serial error: {error}")
+
+    def _on_readable(self):
+        try:
+            data = self.ser.read(self.ser.in_waiting or 1)
+        except serial.SerialException as e:
+            self._fail(e)
+            return
+        if not data:
+            return
+        self._rx += data
+        while True:
+            end = self._rx.find(b'\n')
+            if end < 0:
+                break
+            raw = bytes(self._rx[:end])
+            del self._rx[:end + 1]
+            line = raw.decode('utf-8', 'replace').strip()
+            if not line:
+                continue
+            if (line == 'ok' or line.startswith('error')) and self._acks:
+                self.window.pop()
+                future = self._acks.popleft()
+                if not future.done():
+                    future.set_result(line)
+                self._space.set()
+            self._handle_line(line)
+
+    def __del__(self):
+        if self.ser and self.ser.is_open:
+            self.ser.close()
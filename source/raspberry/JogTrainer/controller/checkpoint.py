@@ -0,0 +1,145 @@
+import mmap
+import os
+import struct
+import time
+
+from controller.toolpath import (
+    CACHE_DIR, OP_RAPID, OP_LINEAR, OP_ARC_CCW, MODAL_RELATIVE, MODAL_INCHES, _fmt
+)
+
+CHECKPOINT_PATH = os.path.join(os.path.dirname(CACHE_DIR), 'checkpoint.bin')
+FLUSH_INTERVAL = 0.5  # seconds between msync() calls while streaming
+
+_MAGIC = b"JTCKPT01"
+# magic, content hash, last acked line, flags, modal, feed, x, y, wall time of the last flush
+_RECORD = struct.Struct("<8s32sqBBxxfffd")
+_LINE = struct.Struct("<q")
+_LINE_OFFSET = 40
+
+FLAG_STATE = 0x01      # modal/feed/x/y were filled in
+FLAG_COMPLETED = 0x02  # the job ran to the end
+
+
+class Checkpoint:
+    """A saved record: the job's file hash, last acknowledged line and the state after it."""
+
+    def __init__(self, content_hash, line, flags, modal, feed, x, y, updated):
+        self.content_hash = content_hash
+        self.line = line          # 0-based source line, -1 before the first ack
+        self.flags = flags
+        self.modal = modal
+        self.feed = feed
+        self.x = x
+        self.y = y
+        self.updated = updated
+
+    @property
+    def completed(self):
+        return bool(self.flags & FLAG_COMPLETED)
+
+    def can_resume(self, program):
+        return not self.completed and self.line >= 0 and self.content_hash == program.content_hash()
+
+
+class JobCheckpoint:
+    """Fixed-size record in a memory-mapped file, updated on every ack.
+
+    update() only stores the line index into the mapping (a few hundred
+    nanoseconds, and it survives a crash of this process); modal state and
+    position are taken from the controller's MachineState (or looked up in
+    the toolpath) and the page is msync()ed at most every flush_interval
+    seconds and when the job ends.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.toolpath = None
+        self.state = None
+        self._last_flush = 0.0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < _RECORD.size:
+            self._file.truncate(_RECORD.size)
+        self._mm = mmap.mmap(self._file.fileno(), _RECORD.size)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+            self._file.close()
+
+    def begin(self, content_hash, toolpath=None, line=-1, state=None):
+        self.toolpath = toolpath
+        self.state = state
+        _RECORD.pack_into(self._mm, 0, _MAGIC, content_hash.encode('ascii'), line, 0, 0, 0.0, 0.0, 0.0, time.time())
+        self.flush()
+
+    def update(self, line_index):
+        _LINE.pack_into(self._mm, _LINE_OFFSET, line_index)
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        mm = self._mm
+        if mm is None:
+            return
+        magic, content_hash, line, flags, modal, feed, x, y, _ = _RECORD.unpack_from(mm)
+        toolpath = self.toolpath
+        state = self.state.snapshot() if self.state is not None else None
+        if state is not None and line >= 0 and state[4] == line:
+            flags |= FLAG_STATE
+            modal, feed, x, y, _ = state
+        elif toolpath is not None and line >= 0:
+            i = toolpath.index_of_line(line + 1) - 1
+            if i >= 0:
+                flags |= FLAG_STATE
+                modal, feed, x, y = toolpath.modal[i], toolpath.feed[i], toolpath.x[i], toolpath.y[i]
+        _RECORD.pack_into(mm, 0, magic, content_hash, line, flags, modal, feed, x, y, time.time())
+        mm.flush()
+        self._last_flush = time.monotonic() if now is None else now
+
+    def finish(self, completed):
+        if self._mm is None:
+            return
+        if completed:
+            self._mm[_LINE_OFFSET + _LINE.size] |= FLAG_COMPLETED
+        self.flush()
+
+    def read(self):
+        """The saved Checkpoint, or None if nothing was recorded yet."""
+        magic, content_hash, *fields = _RECORD.unpack_from(self._mm)
+        if magic != _MAGIC:
+            return None
+        return Checkpoint(content_hash.decode('ascii'), *fields)
+
+
+def resume_preamble(toolpath, index):
+    """Lines that restore units, distance mode, feed and position before command index.
+
+    The machine is moved to where the previous command ended (in G90/G21)
+    and the motion mode that was in effect is restored so bare coordinate
+    lines keep their meaning; after an arc the move is a G1 followed by a
+    G2/G3 without axis words. G20/G91 are re-applied if the program used them.
+    """
+    if index <= 0:
+        return []
+    prev = index - 1
+    motion = OP_RAPID
+    for i in range(prev, -1, -1):
+        if toolpath.op[i] <= OP_ARC_CCW:
+            motion = toolpath.op[i]
+            break
+    modal = toolpath.modal[prev]
+    feed = toolpath.feed[prev]
+    move = 'G0' if motion == OP_RAPID else 'G1'
+    lines = ['G21', 'G90', f"{move}X{_fmt(toolpath.x[prev])}Y{_fmt(toolpath.y[prev])}" + (f"F{_fmt(feed)}" if feed > 0 else "")]
+    if motion > OP_LINEAR:
+        lines.append(f"G{motion}")
+    if modal & MODAL_INCHES:
+        lines.append('G20')
+    if modal & MODAL_RELATIVE:
+        lines.append('G91')
+    return lines
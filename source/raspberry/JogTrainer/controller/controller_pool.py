@@ -0,0 +1,202 @@
+import asyncio
+import threading
+from functools import partial
+
+from controller.async_grbl import AsyncGRBLController
+from controller.gcode_file import GcodeFile
+from controller.gcode_sender import GcodeSender, MODE_CHAR_COUNT, ARDUINO_RX_BUFFER_SIZE
+from controller.grbl_serial import GRBLController, DEFAULT_BAUDRATE
+from controller.toolpath import compile_program
+
+
+class MachineLink:
+    """One trainer in the pool: its transport, its sender and the last known state."""
+
+    def __init__(self, port, controller, sender):
+        self.port = port
+        self.controller = controller
+        self.sender = sender
+        self.status = "Disconnected"
+        self.position = None
+        self.progress = 0.0
+        self.error = None
+        self.job = None  # concurrent.futures.Future of the running job
+
+    def snapshot(self):
+        stats = self.sender.get_stats()
+        return {
+            "port": self.port,
+            "connected": self.controller.is_connected,
+            "status": self.status,
+            "position": self.position,
+            "progress": self.progress,
+            "running": self.sender.is_running,
+            "lines_per_sec": stats["lines_per_sec"],
+            "error": self.error,
+        }
+
+
+class ControllerPool:
+    """Owns one connection per port, all multiplexed on a single asyncio loop thread.
+
+    Each machine gets an AsyncGRBLController and its own GcodeSender, so
+    16 trainers cost one thread instead of two each. The public methods
+    are called from the UI (or CLI) thread and hand work to the loop.
+    on_machine_update(port, event, value) is called from the loop thread
+    with event in "status", "position", "progress", "error", "log".
+    """
+
+    def __init__(self, on_machine_update=None, mode=MODE_CHAR_COUNT, rx_buffer_size=ARDUINO_RX_BUFFER_SIZE):
+        self.on_machine_update = on_machine_update
+        self.mode = mode
+        self.rx_buffer_size = rx_buffer_size
+        self.machines = {}
+        self.program = None
+        self.toolpath = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = None
+
+    @staticmethod
+    def available_ports():
+        return GRBLController.list_ports()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop.run_forever)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def shutdown(self):
+        if self._thread is None:
+            return
+        self.disconnect()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def _submit(self, coro):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _call(self, callback, *args):
+        self.start()
+        self._loop.call_soon_threadsafe(callback, *args)
+
+    def _select(self, ports):
+        if ports is None:
+            return list(self.machines.values())
+        return [self.machines[port] for port in ports if port in self.machines]
+
+    def _notify(self, port, event, value):
+        link = self.machines.get(port)
+        if link is not None:
+            if event == "status":
+                link.status = value
+            elif event == "position":
+                link.position = value
+            elif event == "progress":
+                link.progress = value
+            elif event == "error":
+                link.error = value
+        if self.on_machine_update:
+            self.on_machine_update(port, event, value)
+
+    def _make_link(self, port):
+        controller = AsyncGRBLController(
+            on_status_change=lambda status, line: self._notify(port, "status", status),
+            on_position_update=lambda pos_str: self._notify(port, "position", pos_str),
+            on_log=lambda message: self._notify(port, "log", message),
+            rx_buffer_size=self.rx_buffer_size
+        )
+        sender = GcodeSender(
+            controller,
+            on_progress=lambda progress, line, total: self._notify(port, "progress", progress),
+            on_error=lambda line_number, line, response: self._notify(port, "error", f"line {line_number}: {response}"),
+            mode=self.mode,
+            rx_buffer_size=self.rx_buffer_size
+        )
+        if self.program is not None:
+            sender.set_program(self.program, self.toolpath)
+        return MachineLink(port, controller, sender)
+
+    # --- Connections ---
+    def connect(self, ports, baudrate=DEFAULT_BAUDRATE, fast_baudrate=None, timeout=None):
+        """Connect all ports concurrently; returns {port: connected}."""
+        return self._submit(self._connect_all(list(ports), baudrate, fast_baudrate)).result(timeout)
+
+    async def _connect_all(self, ports, baudrate, fast_baudrate):
+        for port in ports:
+            if port not in self.machines:
+                self.machines[port] = self._make_link(port)
+        links = [self.machines[port] for port in ports]
+        await asyncio.gather(
+            *(link.controller.connect(link.port, baudrate, fast_baudrate) for link in links if not link.controller.is_connected))
+        return {link.port: link.controller.is_connected for link in links}
+
+    def disconnect(self, ports=None, timeout=None):
+        links = self._select(ports)
+        for link in links:
+            link.sender.stop()
+        self._submit(self._disconnect_all(links)).result(timeout)
+
+    async def _disconnect_all(self, links):
+        await asyncio.gather(*(link.controller.disconnect() for link in links))
+
+    # --- Jobs ---
+    def load_job(self, filepath, tolerance=0):
+        """Open and compile the job once; every machine streams the same compiled toolpath.
+
+        tolerance > 0 merges collinear segments first, as GcodeSender.optimize() does.
+        """
+        if any(link.sender.is_running for link in self.machines.values()):
+            raise RuntimeError("Cannot load a job while machines are running")
+        if self.program is not None:
+            self.program.close()
+        self.program = GcodeFile(filepath)
+        self.toolpath = compile_program(self.program)
+        if tolerance:
+            from controller.optimizer import optimize_toolpath
+            self.toolpath = optimize_toolpath(self.toolpath, tolerance).toolpath
+        for link in self.machines.values():
+            link.sender.set_program(self.program, self.toolpath)
+        return self.toolpath
+
+    def start_job(self, ports=None):
+        """Start the loaded job on the selected (default: all connected) machines."""
+        started = []
+        for link in self._select(ports):
+            if link.controller.is_connected and not link.sender.is_running and link.sender.program is not None:
+                link.progress = 0.0
+                link.error = None
+                link.job = self._submit(link.sender.run_async(link.controller))
+                started.append(link.port)
+        return started
+
+    def pause(self, ports=None):
+        for link in self._select(ports):
+            link.sender.pause()
+
+    def resume(self, ports=None):
+        for link in self._select(ports):
+            link.sender.resume()
+
+    def stop(self, ports=None):
+        for link in self._select(ports):
+            link.sender.stop()
+
+    def send_command(self, command, ports=None):
+        # Real-time commands (feed hold, resume, reset) go out immediately
+        for link in self._select(ports):
+            if link.controller.is_connected:
+                self._submit(link.controller.send_command(command))
+
+    def feed_hold(self, ports=None):
+        for link in self._select(ports):
+            self._call(partial(link.controller.send_realtime, '!'))
+
+    def wait(self, ports=None, timeout=None):
+        """Block until the selected jobs finish; returns {port: completed}."""
+        return {link.port: link.job.result(timeout) if link.job else False for link in self._select(ports)}
+
+    def get_status(self, ports=None):
+        return [link.snapshot() for link in self._select(ports)]
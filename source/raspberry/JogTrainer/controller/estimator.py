@@ -0,0 +1,100 @@
+import numpy as np
+
+from controller.toolpath import OP_RAPID, OP_ARC_CCW, WORD_F
+from controller.machine_defaults import (
+    STEPS_PER_MM_X, STEPS_PER_MM_Y, DEFAULT_FEEDRATE, MIN_STEP_DELAY_MS, MIN_MOVE_MM
+)
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class JobEstimate:
+    def __init__(self, line, segment_length, segment_time, rapid_distance, cut_distance, bbox):
+        self.line = line                      # source line per command
+        self.segment_length = segment_length  # mm per command
+        self.segment_time = segment_time      # seconds per command
+        self.cumulative_time = np.cumsum(segment_time)
+        self.total_time = float(self.cumulative_time[-1]) if len(segment_time) else 0.0
+        self.rapid_distance = rapid_distance
+        self.cut_distance = cut_distance
+        self.bbox = bbox                      # (min_x, min_y, max_x, max_y) in mm
+
+    def time_done(self, line_index):
+        # Estimated machine time up to and including the given source line
+        i = int(np.searchsorted(self.line, line_index, side='right')) - 1
+        return float(self.cumulative_time[i]) if i >= 0 else 0.0
+
+    def fraction_done(self, line_index):
+        if self.total_time <= 0:
+            return 1.0
+        return self.time_done(line_index) / self.total_time
+
+    def eta(self, line_index, elapsed=None):
+        """Seconds left; scaled by the observed pace when the elapsed job time is given."""
+        done = self.time_done(line_index)
+        remaining = self.total_time - done
+        if elapsed and done > 0:
+            remaining *= elapsed / done
+        return remaining
+
+    def summary(self):
+        min_x, min_y, max_x, max_y = self.bbox
+        return (f"Estimated time {format_duration(self.total_time)}, "
+                f"cutting {self.cut_distance:.1f} mm, rapid {self.rapid_distance:.1f} mm, "
+                f"bounds X {min_x:.2f}..{max_x:.2f} Y {min_y:.2f}..{max_y:.2f}")
+
+
+def estimate_job(toolpath, steps_per_mm_x=STEPS_PER_MM_X, steps_per_mm_y=STEPS_PER_MM_Y,
+                 default_feedrate=DEFAULT_FEEDRATE, modal_feed=False):
+    """Vectorized run-time estimate using the GCodeHandler::moveTo timing model.
+
+    The Arduino sketch only honours F on the line it appears on; pass
+    modal_feed=True to estimate for a controller with a modal feed rate
+    (GRBL). Arcs are costed as their chord.
+    """
+    op = np.frombuffer(toolpath.op, dtype=np.uint8)
+    words = np.frombuffer(toolpath.words, dtype=np.uint8)
+    x = np.frombuffer(toolpath.x, dtype=np.float32).astype(np.float64)
+    y = np.frombuffer(toolpath.y, dtype=np.float32).astype(np.float64)
+    feed = np.frombuffer(toolpath.feed, dtype=np.float32).astype(np.float64)
+    line = np.frombuffer(toolpath.line, dtype=np.uint32)
+
+    # Target positions in whole steps, as lround() does on the controller
+    x_steps = np.rint(x * steps_per_mm_x)
+    y_steps = np.rint(y * steps_per_mm_y)
+    dx = np.diff(x_steps, prepend=0.0)
+    dy = np.diff(y_steps, prepend=0.0)
+    length = np.hypot(dx / steps_per_mm_x, dy / steps_per_mm_y)
+
+    motion = op <= OP_ARC_CCW
+    moving = motion & (length >= MIN_MOVE_MM)
+    length = np.where(moving, length, 0.0)
+
+    if not modal_feed:
+        feed = np.where(words & WORD_F, feed, default_feedrate)
+    feed = np.where(feed > 0, feed, default_feedrate)
+
+    move_time_ms = length / feed * 60000.0
+    total_steps = np.maximum(np.maximum(np.abs(dx), np.abs(dy)), 1.0)
+    step_delay_ms = np.maximum(move_time_ms / total_steps, MIN_STEP_DELAY_MS)
+    segment_time = np.where(moving, total_steps * step_delay_ms / 1000.0, 0.0)
+
+    rapid = moving & (op == OP_RAPID)
+    rapid_distance = float(length[rapid].sum())
+    cut_distance = float(length[moving & ~rapid].sum())
+
+    if motion.any():
+        px = np.append(x[motion], 0.0)
+        py = np.append(y[motion], 0.0)
+        bbox = (float(px.min()), float(py.min()), float(px.max()), float(py.max()))
+    else:
+        bbox = (0.0, 0.0, 0.0, 0.0)
+
+    return JobEstimate(line, length, segment_time, rapid_distance, cut_distance, bbox)
@@ -0,0 +1,163 @@
+import hashlib
+import mmap
+import os
+import re
+import struct
+from array import array
+
+from controller.toolpath import CACHE_DIR
+
+# Line indexes are cached by content hash next to the compiled toolpaths, not beside the G-code
+INDEX_DIR = os.path.join(os.path.dirname(CACHE_DIR), 'lineindex')
+INDEX_SUFFIX = ".lidx"
+_INDEX_MAGIC = b"JTLIDX02"
+_INDEX_HEADER = struct.Struct("<8sQQ")  # magic, file size, line count
+
+_NEWLINE = re.compile(rb"\n")
+_COUNT_CHUNK = 16 * 1024 * 1024
+
+
+class GcodeFile:
+    """Memory-mapped G-code program.
+
+    Nothing is read up front: program lines are produced on demand by
+    iter_lines(), and the raw line-offset index is only built when random
+    access (line_offset/line_at) is needed.
+    """
+
+    def __init__(self, filepath, use_index_cache=True, index_dir=INDEX_DIR):
+        self.filepath = filepath
+        self.use_index_cache = use_index_cache
+        self.index_dir = index_dir
+        stat = os.stat(filepath)
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self._file = open(filepath, 'rb')
+        # mmap refuses empty files
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._index = None
+        self._line_count = None
+        self._content_hash = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def line_count(self):
+        # Raw line count (comments and blanks included), counted in C-speed chunks
+        if self._line_count is None:
+            if self._index is not None:
+                self._line_count = len(self._index)
+            elif not self._mm:
+                self._line_count = 0
+            else:
+                newlines = 0
+                for start in range(0, self.size, _COUNT_CHUNK):
+                    newlines += self._mm[start:start + _COUNT_CHUNK].count(b"\n")
+                trailing = 0 if self._mm[self.size - 1] == 0x0A else 1
+                self._line_count = newlines + trailing
+        return self._line_count
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = self._load_index() if self.use_index_cache else None
+            if self._index is None:
+                self._index = self._build_index()
+                if self.use_index_cache:
+                    self._save_index(self._index)
+            self._line_count = len(self._index)
+        return self._index
+
+    def line_offset(self, line_index):
+        return self.index[line_index]
+
+    def line_at(self, line_index):
+        start = self.index[line_index]
+        end = self._mm.find(b"\n", start)
+        if end == -1:
+            end = self.size
+        return self._mm[start:end].strip().decode('utf-8', 'replace')
+
+    def raw_bytes(self):
+        # The whole file as a read-only buffer, for vectorized scans
+        return self._mm if self._mm is not None else b""
+
+    def content_hash(self):
+        if self._content_hash is None:
+            digest = hashlib.blake2b(digest_size=16)
+            if self._mm:
+                for start in range(0, self.size, _COUNT_CHUNK):
+                    digest.update(self._mm[start:start + _COUNT_CHUNK])
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    def iter_lines(self, start_line=0):
+        """Yield (line_index, text) for every program line, skipping blanks and ';' comments."""
+        mm = self._mm
+        if mm is None:
+            return
+        pos = self.line_offset(start_line) if start_line else 0
+        line_index = start_line
+        size = self.size
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end == -1:
+                end = size
+            raw = mm[pos:end].strip()
+            if raw and raw[0] != 0x3B:  # ';'
+                yield line_index, raw.decode('utf-8', 'replace')
+            pos = end + 1
+            line_index += 1
+
+    def _build_index(self):
+        offsets = array('Q')
+        if not self._mm:
+            return offsets
+        offsets.append(0)
+        offsets.extend(match.end() for match in _NEWLINE.finditer(self._mm))
+        if offsets[-1] == self.size:
+            offsets.pop()  # trailing newline does not start a line
+        return offsets
+
+    def _index_path(self):
+        return os.path.join(self.index_dir, self.content_hash() + INDEX_SUFFIX)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'rb') as f:
+                header = f.read(_INDEX_HEADER.size)
+                if len(header) != _INDEX_HEADER.size:
+                    return None
+                magic, size, count = _INDEX_HEADER.unpack(header)
+                if magic != _INDEX_MAGIC or size != self.size:
+                    return None
+                offsets = array('Q')
+                offsets.fromfile(f, count)
+                return offsets
+        except (OSError, EOFError):
+            return None
+
+    def _save_index(self, offsets):
+        # Best effort, like the toolpath cache
+        path = self._index_path()
+        tmp_path = path + '.tmp'
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, self.size, len(offsets)))
+                offsets.tofile(f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
@@ -1,66 +1,462 @@
 import threading
 import time
 import logging
+from collections import deque
+from functools import partial
+from itertools import chain
+
+from controller.gcode_file import GcodeFile
+from controller.toolpath import compile_program
+from controller.checkpoint import resume_preamble
+
+# Serial RX buffer sizes of the supported controllers
+GRBL_RX_BUFFER_SIZE = 128
+ARDUINO_RX_BUFFER_SIZE = 64  # Uno/Nano hardware serial buffer read by GCodeHandler
+
+# Streaming modes
+MODE_PING_PONG = "ping-pong"    # send one line, wait for its ok/error
+MODE_CHAR_COUNT = "char-count"  # keep the controller's RX buffer full
+STREAM_MODES = (MODE_PING_PONG, MODE_CHAR_COUNT)
+
+# After an error, how long to wait for the lines still in the controller's buffer
+DRAIN_TIMEOUT = 5.0
+
+
+class StreamWindow:
+    """Lines sent but not yet acknowledged, oldest first, with their byte counts."""
+
+    def __init__(self, rx_buffer_size=GRBL_RX_BUFFER_SIZE):
+        self.rx_buffer_size = rx_buffer_size
+        self.pending = deque()
+        self.in_flight = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def fits(self, nbytes):
+        # A line longer than the whole buffer still goes out once the window is empty
+        return not self.pending or self.in_flight + nbytes <= self.rx_buffer_size
+
+    def push(self, line_index, line):
+        nbytes = len(line) + 1  # trailing newline
+        self.pending.append((line_index, line, nbytes))
+        self.in_flight += nbytes
+
+    def pop(self):
+        line_index, line, nbytes = self.pending.popleft()
+        self.in_flight -= nbytes
+        return line_index, line
+
+    def drop_newest(self, count):
+        # Undo push() for lines that were never written
+        for _ in range(count):
+            _, _, nbytes = self.pending.pop()
+            self.in_flight -= nbytes
+
+    def clear(self):
+        self.pending.clear()
+        self.in_flight = 0
+
 
 class GcodeSender:
-    def __init__(self, controller, on_progress=None, on_error=None):
+    def __init__(self, controller, on_progress=None, on_error=None,
+                 mode=MODE_CHAR_COUNT, rx_buffer_size=GRBL_RX_BUFFER_SIZE, checkpoint=None):
+        if mode not in STREAM_MODES:
+            raise ValueError(f"Unknown streaming mode: {mode}")
         self.controller = controller
         self.on_progress = on_progress
+        self.on_error = on_error
+        self.mode = mode
+        self.checkpoint = checkpoint  # JobCheckpoint, updated on every ack
         self.filepath = None
-        self.gcode_lines = []
+        self.program = None
+        self.toolpath = None
+        self.total_lines = 0
+        self._job_toolpath = None  # compiled form being streamed, source of the machine state
         self.is_running = False
         self.is_paused = False
         self.thread = None
 
+        self.window = StreamWindow(rx_buffer_size)
+        self.condition = threading.Condition()
+        self.lines_acked = 0
+        self.last_acked_line = -1
+        self.lines_per_sec = 0.0
+        self.error = None
+        self.start_time = None
+        self._rate_mark = (0.0, 0)
+        # Set while run_async() is streaming
+        self._loop = None
+        self._transport = None
+        self._resume_event = None
+
+    @property
+    def rx_buffer_size(self):
+        return self.window.rx_buffer_size
+
+    def set_mode(self, mode, rx_buffer_size=None):
+        if mode not in STREAM_MODES:
+            raise ValueError(f"Unknown streaming mode: {mode}")
+        if self.is_running:
+            raise RuntimeError("Cannot change streaming mode while a job is running")
+        self.mode = mode
+        if rx_buffer_size is not None:
+            self.window.rx_buffer_size = rx_buffer_size
+
     def load_file(self, filepath):
-        self.filepath = filepath
-        with open(filepath, 'r') as f:
-            self.gcode_lines = [line.strip() for line in f if line.strip() and not line.strip().startswith(';')]
-        print(f"Loaded {len(self.gcode_lines)} lines of G-code from {filepath}")
+        # Memory-mapped; lines are read and filtered while streaming
+        if self.is_running:
+            raise RuntimeError("Cannot load a file while a job is running")
+        if self.program is not None:
+            self.program.close()
+        self.set_program(GcodeFile(filepath))
+        print(f"Loaded {self.program.size} bytes of G-code from {filepath}")
+
+    def set_program(self, program, toolpath=None):
+        # Share an already opened (and compiled) program, e.g. one job sent to several machines
+        if self.is_running:
+            raise RuntimeError("Cannot load a file while a job is running")
+        self.filepath = program.filepath
+        self.program = program
+        self.toolpath = toolpath
+        self.total_lines = 0
+
+    def compile(self):
+        # Tokenize once (or load the cached result); jobs started afterwards send the compiled form
+        program = self.program
+        if program is None:
+            return None
+        toolpath = compile_program(program)
+        if program is self.program:
+            self.toolpath = toolpath
+        print(f"Compiled {len(toolpath)} commands from {program.filepath}")
+        return toolpath
 
-    def start(self):
-        if not self.gcode_lines or not self.controller.is_connected:
+    def optimize(self, tolerance=None, fit_arcs=False, modal_feed=False):
+        # Merge tiny collinear moves (and optionally fit arcs) before sending; returns an OptimizeResult
+        program = self.program
+        toolpath = self.toolpath if self.toolpath is not None else self.compile()
+        if toolpath is None:
+            return None
+        # numpy is only loaded when a job is optimized
+        from controller.optimizer import optimize_toolpath, DEFAULT_TOLERANCE
+        if tolerance is None:
+            tolerance = DEFAULT_TOLERANCE
+        result = optimize_toolpath(toolpath, tolerance, fit_arcs=fit_arcs, modal_feed=modal_feed)
+        if program is self.program and not self.is_running:
+            self.toolpath = result.toolpath
+        print(result.summary())
+        return result
+
+    def start(self, from_line=0):
+        """Stream the program; from_line > 0 resumes there after a short state-restoring preamble."""
+        if self.program is None or not self.controller.is_connected:
             print("Cannot start: No file loaded or not connected.")
             return
 
+        self._reset_stats()
         self.is_running = True
         self.is_paused = False
-        self.thread = threading.Thread(target=self._send_gcode)
+        self.controller.add_response_listener(self._on_response)
+        self.thread = threading.Thread(target=self._send_gcode, args=(from_line,))
         self.thread.daemon = True
         self.thread.start()
 
     def stop(self):
         self.is_running = False
-        if self.thread and self.thread.is_alive():
+        with self.condition:
+            self.condition.notify_all()
+        self._call_in_loop(self._set_resume_event)  # wake a paused coroutine so it can exit
+        self._call_in_loop(self._cancel_pending)
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
             self.thread.join()
 
     def pause(self):
         self.is_paused = True
+        self._call_in_loop(self._clear_resume_event)
+        self._call_in_loop(self._cancel_pending)
 
     def resume(self):
         self.is_paused = False
+        with self.condition:
+            self.condition.notify_all()
+        self._call_in_loop(self._set_resume_event)
+
+    def _call_in_loop(self, callback):
+        # pause/resume/stop may come from the Tk thread while run_async() owns the loop
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(callback)
+
+    def _set_resume_event(self):
+        if self._resume_event is not None:
+            self._resume_event.set()
+
+    def _clear_resume_event(self):
+        if self._resume_event is not None and self.is_paused:
+            self._resume_event.clear()
+
+    def _cancel_pending(self):
+        # Lines queued on the transport but not written would still run after a stop, pause or error
+        if self._transport is not None:
+            self._transport.cancel_pending()
+
+    def _reset_stats(self):
+        with self.condition:
+            self.window.clear()
+            self.lines_acked = 0
+            self.last_acked_line = -1
+            self.lines_per_sec = 0.0
+            self.error = None
+        self.start_time = time.monotonic()
+        self._rate_mark = (self.start_time, 0)
 
-    def _send_gcode(self):
-        total_lines = len(self.gcode_lines)
-        for i, line in enumerate(self.gcode_lines):
-            while self.is_paused and self.is_running:
-                time.sleep(0.1)
+    def _iter_program(self, from_line=0):
+        # compile()/optimize() may replace self.toolpath from another thread; the job keeps this one
+        toolpath = self._job_toolpath = self.toolpath
+        if not from_line:
+            if toolpath is not None:
+                return toolpath.iter_commands(self.program)
+            return self.program.iter_lines()
+        # Resuming needs the modal state before from_line, which only the toolpath has
+        if toolpath is None:
+            toolpath = self._job_toolpath = self.compile()
+        start = toolpath.index_of_line(from_line)
+        preamble = [(from_line - 1, line) for line in resume_preamble(toolpath, start)]
+        print(f"Resuming at line {from_line + 1} with preamble: {' '.join(line for _, line in preamble)}")
+        return chain(preamble, toolpath.iter_commands(self.program, start))
 
+    def _begin_checkpoint(self, from_line):
+        if self.checkpoint is not None:
+            self.checkpoint.begin(self.program.content_hash(), self._job_toolpath, from_line - 1, self.controller.state)
+
+    def _end_checkpoint(self, completed):
+        if self.checkpoint is not None:
+            self.checkpoint.finish(completed)
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                "mode": self.mode,
+                "lines_acked": self.lines_acked,
+                "last_acked_line": self.last_acked_line + 1,
+                "total_lines": self.total_lines,
+                "lines_in_flight": len(self.window),
+                "bytes_in_flight": self.window.in_flight,
+                "lines_per_sec": self.lines_per_sec,
+                "elapsed": time.monotonic() - self.start_time if self.start_time else 0.0,
+            }
+
+    def _can_send(self, line):
+        if self.mode == MODE_PING_PONG:
+            return not self.window.pending
+        return self.window.fits(len(line) + 1)
+
+    def _wait(self, predicate):
+        # Returns False when the job was stopped, failed or the link dropped while waiting
+        with self.condition:
+            while not predicate():
+                if not self.is_running or self.error or not self.controller.is_connected:
+                    return False
+                self.condition.wait(0.1)
+            return self.is_running and not self.error
+
+    def _drain(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.window.pending and self.controller.is_connected and time.monotonic() < deadline:
+                self.condition.wait(0.1)
+
+    def _on_response(self, response):
+        # Runs on the controller's reader thread: match the ack to the oldest line in flight
+        with self.condition:
+            if not self.window.pending:
+                return  # Reply to a manual command, not part of the job
+            line_index, line = self.window.pop()
+            halted = self.error is not None
+            if not halted:
+                self._record_response(line_index, line, response)
+            self.condition.notify_all()
+        if not halted:
+            profiler = self.controller.profiler
+            if profiler is None:
+                self._report_response(line_index, line, response)
+            else:
+                started = time.perf_counter()
+                self._report_response(line_index, line, response)
+                profiler.callback(time.perf_counter() - started)
+
+    def _record_response(self, line_index, line, response):
+        # Caller holds self.condition
+        if response.startswith('error'):
+            self.error = (line_index, response)
+            return
+        self.lines_acked += 1
+        self.last_acked_line = line_index
+        # Before the checkpoint, which saves the state after this line
+        toolpath = self._job_toolpath
+        if toolpath is None:
+            self.controller.state.apply_line(line, line_index)
+        else:
+            # Last command at or before the line; resume preamble lines map to the command before from_line
+            i = toolpath.index_of_line(line_index + 1) - 1
+            if i >= 0:
+                self.controller.state.apply_command(toolpath, i, line_index)
+        if self.checkpoint is not None:
+            self.checkpoint.update(line_index)
+        now = time.monotonic()
+        mark_time, mark_count = self._rate_mark
+        if now - mark_time >= 0.5:
+            self.lines_per_sec = (self.lines_acked - mark_count) / (now - mark_time)
+            self._rate_mark = (now, self.lines_acked)
+
+    def _report_response(self, line_index, line, response):
+        if response.startswith('error'):
+            print(f"Error on line {line_index+1}: {line} -> {response}. Halting.")
+            if self.on_error:
+                self.on_error(line_index + 1, line, response)
+        elif self.on_progress:
+            # Progress in source-file lines, comments and blanks included
+            self.on_progress((line_index + 1) / self.total_lines, line_index + 1, self.total_lines)
+
+    def _send_gcode(self, from_line=0):
+        completed = False
+        batch = []  # registered in the window, not written yet
+        try:
+            self.total_lines = self.program.line_count
+            lines = self._iter_program(from_line)
+            self._begin_checkpoint(from_line)
+            profiler = getattr(self.controller, 'profiler', None)
+            if profiler is not None:
+                profiler.reset()
+            for i, line in lines:
+                if profiler is not None:
+                    profiler.enqueue(i)
+                # Lines that fit the window together go out in one write; flush before blocking
+                if batch and (self.is_paused or not self._can_send(line)):
+                    if not self._send_batch(batch):
+                        break
+                    batch = []
+
+                if not self._wait(lambda: not self.is_paused):
+                    break
+
+                if not self._wait(lambda: self._can_send(line)):
+                    break
+
+                # Register before writing so a fast ack always finds its line
+                with self.condition:
+                    self.window.push(i, line)
+                batch.append((i, line))
+            else:
+                if not batch or self._send_batch(batch):
+                    batch = []
+                    # Everything is written; wait for the remaining acks
+                    completed = self._wait(lambda: not self.window.pending)
+                if completed and self.on_progress:
+                    # Trailing comments never get an ack, report completion explicitly
+                    self.on_progress(1.0, self.total_lines, self.total_lines)
+        finally:
+            if batch:
+                # Never written, so never answered
+                with self.condition:
+                    self.window.drop_newest(len(batch))
+            if self.error:
+                # Let the lines behind the failed one drain, so a restart starts with an empty RX buffer
+                self._drain(DRAIN_TIMEOUT)
+            self.controller.remove_response_listener(self._on_response)
+            self._end_checkpoint(completed)
             if not self.is_running:
                 print("G-code sending stopped.")
-                break
-            
-            # Simple flow control: wait for 'ok'
-            response = self.controller.send_command(line)
-            print(f"Sent: {line} -> Got: {response}")
-            if 'ok' not in response:
-                print(f"Error sending line {i+1}: {line}. Halting.")
-                self.is_running = False
-                break
-
-            if self.on_progress:
-                progress = (i + 1) / total_lines
-                self.on_progress(progress, i + 1, total_lines)
-        
-        self.is_running = False
-        print("G-code sending finished.") 
\ No newline at end of file
+            self.is_running = False
+            stats = self.get_stats()
+            print(f"G-code sending finished: {stats['lines_acked']} lines acknowledged, "
+                  f"up to line {stats['last_acked_line']}/{stats['total_lines']} "
+                  f"({stats['lines_acked'] / stats['elapsed'] if stats['elapsed'] else 0:.1f} lines/sec, {self.mode}).")
+
+    def _send_batch(self, batch):
+        response = self.controller.send_lines([line for _, line in batch])
+        if response != "Sent":
+            i, line = batch[0]
+            print(f"Error sending line {i+1}: {line} -> {response}. Halting.")
+            if self.on_error:
+                self.on_error(i + 1, line, response)
+            return False
+        return True
+
+    async def run_async(self, transport, from_line=0):
+        """Stream the loaded program over an AsyncGRBLController.
+
+        Runs as a coroutine on the transport's event loop instead of a
+        thread; flow control is done by the transport's write queue and
+        per-line ack futures. from_line resumes as in start(). Returns True
+        when every line was acknowledged.
+        """
+        import asyncio  # not needed by the threaded sender, kept off its import path
+        if self.program is None or not transport.is_connected:
+            print("Cannot start: No file loaded or not connected.")
+            return False
+
+        self._reset_stats()
+        self._resume_event = asyncio.Event()
+        self._resume_event.set()
+        self._loop = asyncio.get_running_loop()
+        self._transport = transport
+        self.is_running = True
+        self.is_paused = False
+        completed = False
+        try:
+            self.total_lines = self.program.line_count
+            lines = self._iter_program(from_line)
+            self._begin_checkpoint(from_line)
+            last_ack = None
+            for i, line in lines:
+                ack = None
+                while ack is None:
+                    if self.is_paused:
+                        await self._resume_event.wait()
+                    if not self.is_running or self.error:
+                        break
+                    ack = await transport.send_line(line)
+                    if ack.cancelled():
+                        ack = None  # withdrawn by pause() before it was written; sent again on resume
+                if ack is None:
+                    break
+                last_ack = ack
+                last_ack.add_done_callback(partial(self._on_async_ack, i, line))
+                if self.mode == MODE_PING_PONG:
+                    await asyncio.wait([last_ack])
+            else:
+                # Replies arrive in order, so the last ack covers the whole job
+                if last_ack is not None:
+                    await asyncio.wait([last_ack])
+                completed = self.error is None
+                if completed and self.on_progress:
+                    self.on_progress(1.0, self.total_lines, self.total_lines)
+        finally:
+            self._end_checkpoint(completed)
+            self._loop = None
+            self._transport = None
+            self._resume_event = None
+            if not self.is_running:
+                print("G-code sending stopped.")
+            self.is_running = False
+            stats = self.get_stats()
+            print(f"G-code sending finished: {stats['lines_acked']} lines acknowledged, "
+                  f"up to line {stats['last_acked_line']}/{stats['total_lines']} ({self.mode}, asyncio).")
+        return completed
+
+    def _on_async_ack(self, line_index, line, future):
+        if future.exception() is not None:
+            response = f"error: {future.exception()}"
+        else:
+            response = future.result()
+        with self.condition:
+            # Replies behind a failed line are not progress; the checkpoint stays at the failure
+            halted = self.error is not None
+            if not halted:
+                self._record_response(line_index, line, response)
+        if not halted:
+            if self.error is not None:
+                self._cancel_pending()
+            self._report_response(line_index, line, response)
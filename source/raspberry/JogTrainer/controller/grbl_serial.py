@@ -3,6 +3,296 @@ import serial.tools.list_ports
 import time
 import threading
 import logging
+from collections import deque
+
+from controller.machine_state import MachineState
+
+# '?' poll rates accepted by StatusPoller
+MIN_POLL_RATE_HZ = 1
+MAX_POLL_RATE_HZ = 50
+# GRBL 1.1 on an ATmega328p reports 15 free planner blocks when idle
+PLANNER_BLOCKS = 15
+
+# Serial link setup
+DEFAULT_BAUDRATE = 115200          # SERIAL_BAUD in the sketch, GRBL's default
+BAUD_AUTO = "auto"
+AUTO_BAUDRATES = (115200, 250000, 500000, 1000000)  # tried by baudrate="auto", default first
+FAST_BAUDRATES = (1000000, 500000, 250000)          # tried by fast_baudrate="auto", fastest first
+READY_TIMEOUT = 2.5   # seconds for the start-up banner; opening the port resets an Uno
+BANNER_GRACE = 0.3    # seconds to listen for a banner before probing a board that may not reset
+PROBE_TIMEOUT = 0.3   # seconds for the reply to a probe or BAUD command
+BANNERS = ("CNC JogTrainer", "Grbl ")
+PROBE_COMMAND = b"LIM?\n"  # answered by the sketch ("X limit: ...") and, with an error, by GRBL
+PROBE_REPLIES = ("X limit", "ok", "error", "Grbl")
+# Sketch commands answered with text only, never with ok/error
+TEXT_REPLY_COMMANDS = frozenset(("LIM?", "BUZ", "CLOCK", "FEEDHOLD", "HOLD", "PAUSE", "CYCLE", "START", "RESUME",
+                                 "RESET", "HOME"))
+
+
+class MachineStatus:
+    """One parsed real-time status report, e.g. <Run|MPos:1.000,2.000,0.000|Bf:15,128|FS:500,0|Ln:12>."""
+
+    __slots__ = ('state', 'mpos', 'wpos', 'wco', 'feed', 'spindle', 'planner_free', 'rx_free',
+                 'line_number', 'received_at')
+
+    def __init__(self, state, received_at=None):
+        self.state = state
+        self.mpos = None
+        self.wpos = None
+        self.wco = None
+        self.feed = None
+        self.spindle = None
+        self.planner_free = None
+        self.rx_free = None
+        self.line_number = None
+        self.received_at = received_at
+
+    @property
+    def position(self):
+        # Work position when reported (or derivable), machine position otherwise
+        if self.wpos is not None:
+            return self.wpos
+        if self.mpos is not None and self.wco is not None:
+            return tuple(m - o for m, o in zip(self.mpos, self.wco))
+        return self.mpos
+
+    def planner_fill(self, blocks=PLANNER_BLOCKS):
+        if self.planner_free is None:
+            return None
+        return max(0.0, min(1.0, 1.0 - self.planner_free / blocks))
+
+
+def expects_ack(line):
+    # False for the sketch's text-only commands; the app sends them to the sketch only
+    return line.strip().upper() not in TEXT_REPLY_COMMANDS
+
+
+def _parse_floats(text):
+    return tuple(float(v) for v in text.split(','))
+
+
+def parse_status_report(line, received_at=None):
+    """Parse a '<...>' status report line; returns None for anything else."""
+    if not (line.startswith('<') and line.endswith('>')):
+        return None
+    parts = line[1:-1].split('|')
+    status = MachineStatus(parts[0].split(':')[0], received_at)
+    for part in parts[1:]:
+        key, _, value = part.partition(':')
+        try:
+            if key == 'MPos':
+                status.mpos = _parse_floats(value)
+            elif key == 'WPos':
+                status.wpos = _parse_floats(value)
+            elif key == 'WCO':
+                status.wco = _parse_floats(value)
+            elif key == 'FS':
+                feed, _, spindle = value.partition(',')
+                status.feed = float(feed)
+                status.spindle = float(spindle) if spindle else None
+            elif key == 'F':
+                status.feed = float(value)
+            elif key == 'Bf':
+                blocks, _, rx = value.partition(',')
+                status.planner_free = int(blocks)
+                status.rx_free = int(rx) if rx else None
+            elif key == 'Ln':
+                status.line_number = int(value)
+        except ValueError:
+            continue
+    return status
+
+
+def _read_until(ser, timeout, accept):
+    # First line accepted within timeout, or None; ser.timeout must be short
+    deadline = time.monotonic() + timeout
+    buf = bytearray()
+    while time.monotonic() < deadline:
+        buf += ser.read(ser.in_waiting or 1)
+        while b'\n' in buf:
+            raw, _, buf = buf.partition(b'\n')
+            line = raw.decode('ascii', 'replace').strip()
+            if accept(line):
+                return line
+    return None
+
+
+def _probe(ser):
+    # A banner arriving meanwhile also means the board is ready
+    ser.reset_input_buffer()
+    ser.write(PROBE_COMMAND)
+    return _read_until(ser, PROBE_TIMEOUT, lambda line: line.startswith(PROBE_REPLIES + BANNERS)) is not None
+
+
+def _probe_rates(ser, rates):
+    for rate in rates:
+        ser.baudrate = rate
+        if _probe(ser):
+            return True
+    ser.baudrate = rates[0]
+    return False
+
+
+def _switch_baudrate(ser, rate):
+    # Sketch only: 'BAUD <rate>' is acked at the old rate, then the board switches
+    ser.reset_input_buffer()
+    ser.write(f"BAUD {rate}\n".encode())
+    reply = _read_until(ser, PROBE_TIMEOUT, lambda line: line == 'ok' or line.startswith('error'))
+    if reply != 'ok':
+        return False
+    ser.baudrate = rate
+    return _probe(ser)
+
+
+def open_serial(port, baudrate=DEFAULT_BAUDRATE, fast_baudrate=None, ready_timeout=READY_TIMEOUT):
+    """Open port once the board is ready; returns (serial.Serial, banner line or None).
+
+    Instead of a fixed delay, waits for the start-up banner the board prints
+    after the reset that opening the port causes. If none arrives within
+    BANNER_GRACE the board is probed, which answers at once when it did not
+    reset; otherwise the banner is awaited for the rest of ready_timeout.
+    baudrate="auto" probes AUTO_BAUDRATES in turn without reopening, the
+    default first. fast_baudrate (a rate or "auto") then asks the sketch
+    to switch with 'BAUD <rate>'; a rate the USB adapter cannot do is undone
+    by reopening the port, which resets the board to its SERIAL_BAUD.
+    """
+    rates = AUTO_BAUDRATES if baudrate == BAUD_AUTO else (baudrate,)
+    ser = serial.Serial(port, rates[0], timeout=0.05)
+    try:
+        grace = min(BANNER_GRACE, ready_timeout)
+        banner = _read_until(ser, grace, lambda line: line.startswith(BANNERS))
+        if banner is None and not _probe_rates(ser, rates):
+            # Nothing answers yet: most likely still in the bootloader after the reset
+            banner = _read_until(ser, ready_timeout - grace, lambda line: line.startswith(BANNERS))
+            if banner is None and len(rates) > 1:
+                _probe_rates(ser, rates)
+        if fast_baudrate:
+            base = ser.baudrate
+            for rate in (FAST_BAUDRATES if fast_baudrate == BAUD_AUTO else (fast_baudrate,)):
+                if rate <= base:
+                    continue
+                if _switch_baudrate(ser, rate):
+                    break
+                # The board may be at the new rate while we cannot hear it: reset it
+                ser.close()
+                ser.baudrate = base
+                ser.open()
+                _read_until(ser, ready_timeout, lambda line: line.startswith(BANNERS))
+        ser.reset_input_buffer()
+        return ser, banner
+    except (serial.SerialException, OSError):
+        ser.close()
+        raise
+
+
+class StatusPoller:
+    """Sends GRBL's '?' real-time query at a fixed rate and tracks round-trip latency.
+
+    Only one query is outstanding at a time; a report that does not arrive
+    within query_timeout is counted as missed and the next query goes out.
+    Requires GRBL-compatible firmware: the JogTrainer Arduino sketch reads
+    line by line and would treat '?' as part of the next command.
+    """
+
+    def __init__(self, controller, rate_hz=10, history=1000, query_timeout=1.0):
+        self.controller = controller
+        self.rate_hz = self._clamp_rate(rate_hz)
+        self.query_timeout = query_timeout
+        self.latencies = deque(maxlen=history)  # seconds, most recent window
+        self.last_status = None
+        self.queries_sent = 0
+        self.reports_received = 0
+        self.missed = 0
+        self._sent_at = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def _clamp_rate(rate_hz):
+        return max(MIN_POLL_RATE_HZ, min(MAX_POLL_RATE_HZ, rate_hz))
+
+    def set_rate(self, rate_hz):
+        self.rate_hz = self._clamp_rate(rate_hz)
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def _run(self):
+        next_poll = time.monotonic()
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            if now >= next_poll:
+                next_poll += 1.0 / self.rate_hz
+                if next_poll < now:
+                    next_poll = now + 1.0 / self.rate_hz  # fell behind, don't burst
+                self._poll(now)
+            self._stop_event.wait(max(0.0, next_poll - time.monotonic()))
+
+    def _poll(self, now):
+        if not self.controller.is_connected:
+            return
+        with self._lock:
+            if self._sent_at is not None:
+                if now - self._sent_at < self.query_timeout:
+                    return  # previous query still outstanding
+                self.missed += 1
+            self._sent_at = now
+            self.queries_sent += 1
+        self.controller.send_realtime('?')
+
+    def report_received(self, status):
+        with self._lock:
+            self.last_status = status
+            self.reports_received += 1
+            if self._sent_at is not None and status.received_at is not None:
+                self.latencies.append(status.received_at - self._sent_at)
+                self._sent_at = None
+
+    def latency_percentiles(self, percentiles=(50, 99)):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return {p: None for p in percentiles}
+        last = len(samples) - 1
+        return {p: samples[min(last, int(round(p / 100 * last)))] for p in percentiles}
+
+    def latency_histogram(self, bucket_ms=5):
+        """Counts per latency bucket over the rolling window, keyed by bucket start in ms."""
+        with self._lock:
+            samples = list(self.latencies)
+        histogram = {}
+        for latency in samples:
+            bucket = int(latency * 1000 // bucket_ms) * bucket_ms
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        return dict(sorted(histogram.items()))
+
+    def get_stats(self):
+        percentiles = self.latency_percentiles((50, 99))
+        status = self.last_status
+        return {
+            "rate_hz": self.rate_hz,
+            "queries_sent": self.queries_sent,
+            "reports_received": self.reports_received,
+            "missed": self.missed,
+            "samples": len(self.latencies),
+            "p50_ms": percentiles[50] * 1000 if percentiles[50] is not None else None,
+            "p99_ms": percentiles[99] * 1000 if percentiles[99] is not None else None,
+            "planner_free": status.planner_free if status else None,
+            "planner_fill": status.planner_fill() if status else None,
+            "rx_free": status.rx_free if status else None,
+        }
+
 
 class GRBLController:
     def __init__(self, on_status_change=None, on_position_update=None, on_log=None):
@@ -10,7 +300,16 @@ class GRBLController:
         self.on_status_change = on_status_change
         self.on_position_update = on_position_update
         self.on_log = on_log
+        # Called with every 'ok' / 'error:' line, used by GcodeSender for flow control
+        self.response_listeners = []
         self.is_connected = False
+        self.banner = None
+        self.baudrate = None
+        self.machine_status = None
+        self.state = MachineState()  # modal state and position, shared with the sender and UI
+        self.poller = None
+        self.recorder = None  # TelemetryRecorder, or None to record nothing
+        self.profiler = None  # StreamProfiler, or None to time nothing
         self.thread = None
         self.stop_thread = False
         self.logger = logging.getLogger(__name__)
@@ -26,14 +325,28 @@ class GRBLController:
         ports = serial.tools.list_ports.comports()
         return [port.device for port in ports]
 
-    def connect(self, port, baudrate=115200):
+    def add_response_listener(self, callback):
+        if callback not in self.response_listeners:
+            self.response_listeners.append(callback)
+
+    def remove_response_listener(self, callback):
+        if callback in self.response_listeners:
+            self.response_listeners.remove(callback)
+
+    def connect(self, port, baudrate=DEFAULT_BAUDRATE, fast_baudrate=None, ready_timeout=READY_TIMEOUT):
         try:
-            self.ser = serial.Serial(port, baudrate, timeout=1)
-            time.sleep(2)
-            self.ser.flushInput()
+            started = time.monotonic()
+            self.ser, self.banner = open_serial(port, baudrate, fast_baudrate, ready_timeout)
+            self.ser.timeout = 1
+            self.baudrate = self.ser.baudrate
+            self.state.reset()
             self.is_connected = True
+            self.logger.info(f"Connected to {port} at {self.baudrate} baud in {time.monotonic() - started:.2f} s"
+                             + ("" if self.banner else " (no start-up banner)"))
+            if self.recorder is not None:
+                self.recorder.event(f"Connected to {port} at {self.baudrate}")
             if self.on_status_change:
-                self.on_status_change("Connected", f"Connected to {port}")
+                self.on_status_change("Connected", f"Connected to {port} at {self.baudrate} baud")
             
             self.stop_thread = False
             self.thread = threading.Thread(target=self._read_from_port)
@@ -41,19 +354,37 @@ class GRBLController:
             self.thread.start()
 
             return True
-        except serial.SerialException as e:
+        except (serial.SerialException, OSError, ValueError) as e:
+            # ValueError: a baud rate pyserial rejects
             if self.on_status_change:
                 self.on_status_change("Error", f"Failed to connect: {e}")
             self.is_connected = False
             return False
 
+    def start_status_poller(self, rate_hz=10):
+        if self.poller is None:
+            self.poller = StatusPoller(self, rate_hz)
+        else:
+            self.poller.set_rate(rate_hz)
+        self.poller.start()
+        return self.poller
+
+    def stop_status_poller(self):
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+
     def disconnect(self):
+        self.stop_status_poller()
         self.stop_thread = True
-        if self.thread and self.thread.is_alive():
+        # disconnect() is also called from the reader thread on serial errors
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
             self.thread.join()
         if self.ser and self.ser.isOpen():
             self.ser.close()
             self.is_connected = False
+            if self.recorder is not None:
+                self.recorder.event("Disconnected")
             if self.on_status_change:
                 self.on_status_change("Disconnected", "Disconnected from port")
 
@@ -63,11 +394,24 @@ class GRBLController:
             if self.on_log:
                 self.on_log("[Not connected] Cannot send: " + command)
             return "Not connected"
+        if self.recorder is not None:
+            self.recorder.tx(command, expects_ack(command))
+        profiler = self.profiler
         try:
-            self.ser.write((command + '\n').encode())
+            if profiler is None:
+                self.ser.write((command + '\n').encode())
+            else:
+                profiler.write_begin()
+                self.ser.write((command + '\n').encode())
+                profiler.write_end()
             self.logger.debug(f"Sent command: {command}")
             if self.on_log:
-                self.on_log(f"Sent: {command}")
+                if profiler is None:
+                    self.on_log(f"Sent: {command}")
+                else:
+                    started = time.perf_counter()
+                    self.on_log(f"Sent: {command}")
+                    profiler.callback(time.perf_counter() - started)
             return "Sent"
         except serial.SerialException as e:
             self.logger.error(f"Serial error while sending command '{command}': {e}")
@@ -85,24 +429,105 @@ class GRBLController:
                 self.on_status_change("Error", f"Communication error: {e}")
             return f"Communication error: {e}"
 
+    def send_lines(self, lines):
+        """Write several lines with one ser.write() and one log callback.
+
+        The caller keeps the lines within the controller's RX buffer, as
+        GcodeSender does for the lines that fit its window at once.
+        """
+        if len(lines) == 1:
+            return self.send_command(lines[0])
+        if not self.is_connected:
+            self.logger.warning("Attempted to send lines while not connected")
+            return "Not connected"
+        recorder = self.recorder
+        if recorder is not None:
+            for line in lines:
+                recorder.tx(line)
+        profiler = self.profiler
+        try:
+            data = ('\n'.join(lines) + '\n').encode()
+            if profiler is None:
+                self.ser.write(data)
+            else:
+                profiler.write_begin()
+                self.ser.write(data)
+                profiler.write_end(len(lines))
+            if self.on_log:
+                self.on_log(f"Sent {len(lines)} lines: {lines[0]} ... {lines[-1]}")
+            return "Sent"
+        except serial.SerialException as e:
+            self.logger.error(f"Serial error while sending {len(lines)} lines: {e}")
+            if self.on_log:
+                self.on_log(f"Serial error while sending: {e}")
+            if self.on_status_change:
+                self.on_status_change("Error", f"Serial error: {e}")
+            self.disconnect()
+            return f"Serial error: {e}"
+        except Exception as e:
+            self.logger.error(f"Unexpected error while sending {len(lines)} lines: {e}")
+            if self.on_log:
+                self.on_log(f"Unexpected error while sending: {e}")
+            if self.on_status_change:
+                self.on_status_change("Error", f"Communication error: {e}")
+            return f"Communication error: {e}"
+
+    def send_realtime(self, char):
+        # Single-character real-time command: no newline, not line-buffered by GRBL
+        if not self.is_connected:
+            return "Not connected"
+        if self.recorder is not None:
+            self.recorder.realtime(char)
+        try:
+            self.ser.write(char.encode('latin-1'))  # 0x80-0xFF commands are single bytes
+            if char != '?' and self.on_log:
+                self.on_log(f"Sent realtime: {char!r}")
+            return "Sent"
+        except serial.SerialException as e:
+            self.logger.error(f"Serial error while sending real-time command {char!r}: {e}")
+            return f"Serial error: {e}"
+
+    def _handle_line(self, line):
+        profiler = self.profiler
+        if line == 'ok' or line.startswith('error'):
+            if profiler is not None:
+                profiler.ack()
+            # Acks first so the sender can refill the buffer before UI work
+            for listener in list(self.response_listeners):
+                listener(line)
+        if profiler is not None:
+            started = time.perf_counter()
+        is_report = line.startswith('<') and line.endswith('>')
+        recorder = self.recorder
+        if recorder is not None and not is_report:
+            recorder.rx(line)
+        # Polled reports would flood the log
+        if self.on_log and not (is_report and self.poller):
+            self.on_log(f"GRBL: {line}")
+        if is_report:
+            # Status report like <Idle|WPos:0.000,0.000,0.000|FS:0,0>
+            status = parse_status_report(line, time.monotonic())
+            self.machine_status = status
+            self.state.apply_status(status)
+            if recorder is not None:
+                recorder.status(line, status.position)
+            poller = self.poller
+            if poller:
+                poller.report_received(status)
+            if self.on_status_change:
+                self.on_status_change(status.state, line)
+            position = status.position
+            if position is not None and self.on_position_update:
+                self.on_position_update(','.join(f"{v:.3f}" for v in position))
+        if profiler is not None:
+            profiler.callback(time.perf_counter() - started)
+
     def _read_from_port(self):
         while not self.stop_thread and self.is_connected:
             try:
                 line = self.ser.readline().decode('utf-8').strip()
                 if line:
-                    if self.on_log:
-                        self.on_log(f"GRBL: {line}")
-                    if line.startswith('<') and line.endswith('>'):
-                        # Status report like <Idle|WPos:0.000,0.000,0.000|FS:0,0>
-                        parts = line[1:-1].split('|')
-                        status = parts[0]
-                        if self.on_status_change:
-                            self.on_status_change(status, line)
-                        for part in parts:
-                            if part.startswith('WPos:'):
-                                pos_str = part[5:]
-                                if self.on_position_update:
-                                    self.on_position_update(pos_str)
+                    self._handle_line(line)
             except serial.SerialException as e:
                 self.logger.error(f"Serial error in reader thread: {e}")
                 if self.on_log:
@@ -0,0 +1,124 @@
+import threading
+import time
+
+from controller.toolpath import _fmt
+
+PROTOCOL_ARDUINO = "arduino"  # X+/X-/Y+/Y- lines, a fixed 200-step jog each
+PROTOCOL_GRBL = "grbl"        # $J= jog lines
+JOG_CANCEL = '\x85'           # GRBL jog cancel; the Arduino sketch stops a running jog on the same byte
+
+TAP_TIME = 0.25     # seconds; a shorter press is a single jog that is allowed to finish
+ACK_TIMEOUT = 2.0   # forget a jog that was never answered, e.g. by a sketch that does not ack jogs
+MAX_PENDING = 4     # presses folded into the next move at most
+
+DIRECTIONS = {"x+": ("X", 1), "x-": ("X", -1), "y+": ("Y", 1), "y-": ("Y", -1)}
+
+
+class HoldJogger:
+    """Press-and-hold jogging paced by the controller's acks.
+
+    While a button is held, a new jog is sent each time one is answered with
+    'ok', so no more than max_in_flight are ever outstanding (1 for the
+    Arduino, whose jogs are acked when done; 2 for GRBL, which acks once a
+    jog is planned). Presses that arrive while a jog is running are folded
+    into the next one: a longer $J move on GRBL, or one more jog per ack on
+    the Arduino. release() cancels the running jog with 0x85, unless the
+    press was a short tap.
+    """
+
+    def __init__(self, controller, protocol=PROTOCOL_ARDUINO, step_mm=1.0, feedrate=500,
+                 max_in_flight=None, on_log=None):
+        self.controller = controller
+        self.protocol = protocol
+        self.step_mm = step_mm        # distance per GRBL jog
+        self.feedrate = feedrate
+        self.max_in_flight = max_in_flight or (2 if protocol == PROTOCOL_GRBL else 1)
+        self.on_log = on_log
+        self.lock = threading.Lock()
+        self.direction = None
+        self.held = False
+        self.pending = 0
+        self.in_flight = 0
+        self.pressed_at = 0.0
+        self.last_sent = 0.0
+        self.sent_this_press = 0
+        controller.add_response_listener(self._on_response)
+
+    def close(self):
+        self.controller.remove_response_listener(self._on_response)
+
+    def press(self, direction):
+        with self.lock:
+            now = time.monotonic()
+            if self.in_flight and now - self.last_sent > ACK_TIMEOUT:
+                self.in_flight = 0
+            if direction != self.direction:
+                self.pending = 0
+            self.direction = direction
+            self.held = True
+            self.pressed_at = now
+            self.sent_this_press = 0
+            self.pending = min(self.pending + 1, MAX_PENDING)
+            moves = self._take_moves()
+        self._send(moves)
+
+    def release(self, direction=None):
+        with self.lock:
+            if not self.held or (direction is not None and direction != self.direction):
+                return
+            self.held = False
+            tap = time.monotonic() - self.pressed_at < TAP_TIME and self.sent_this_press <= 1
+            if not tap:
+                self.pending = 0
+            cancel = not tap and self.in_flight > 0
+        if cancel:
+            self.controller.send_realtime(JOG_CANCEL)
+
+    def _on_response(self, line):
+        # Reader thread: every ok/error answers the oldest jog in flight
+        with self.lock:
+            if not self.in_flight:
+                return
+            self.in_flight -= 1
+            if line.startswith('error'):
+                # Limit switch or hold: stop instead of hammering the controller
+                self.held = False
+                self.pending = 0
+                if self.on_log:
+                    self.on_log(f"Jog stopped: {line}")
+                return
+            moves = self._take_moves()
+        self._send(moves)
+
+    def _take_moves(self):
+        # Called with the lock held; reserves the in-flight slots and returns the lines to send
+        moves = []
+        while self.in_flight < self.max_in_flight and (self.held or self.pending):
+            if self.protocol == PROTOCOL_GRBL:
+                count = max(self.pending, 1)
+                self.pending = 0
+            else:
+                count = 1
+                self.pending = max(self.pending - 1, 0)
+            moves.append(self._format(count))
+            self.in_flight += 1
+            self.sent_this_press += 1
+        if moves:
+            self.last_sent = time.monotonic()
+        return moves
+
+    def _format(self, count):
+        axis, sign = DIRECTIONS[self.direction]
+        if self.protocol == PROTOCOL_GRBL:
+            return f"$J=G91 G21 {axis}{_fmt(sign * self.step_mm * count)} F{_fmt(self.feedrate)}"
+        return f"{axis}{'+' if sign > 0 else '-'}"
+
+    def _send(self, moves):
+        for move in moves:
+            if self.controller.send_command(move) != "Sent":
+                # Nothing will answer it; give up on this press
+                with self.lock:
+                    self.in_flight = 0
+                    self.held = False
+                    self.pending = 0
+                return
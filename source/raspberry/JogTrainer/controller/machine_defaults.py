@@ -0,0 +1,6 @@
+# Machine defaults from JogTrainer.ino, shared by the estimator, pre-flight check and simulator
+STEPS_PER_MM_X = 80.0
+STEPS_PER_MM_Y = 80.0
+DEFAULT_FEEDRATE = 600.0  # mm/min
+MIN_STEP_DELAY_MS = 1.0   # GCodeHandler::moveTo clamps step_delay to 1 ms
+MIN_MOVE_MM = 0.001       # shorter moves are answered with "No move"
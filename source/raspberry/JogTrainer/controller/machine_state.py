@@ -0,0 +1,178 @@
+import threading
+from array import array
+
+from controller.toolpath import (
+    OP_RAPID, OP_ARC_CCW, OP_OTHER, MODAL_INCHES, MM_PER_INCH, parse_words, move_target, strip_comments
+)
+
+# Fields, by index into MachineState.values
+X, Y, Z = 0, 1, 2           # reported position, mm
+TARGET_X, TARGET_Y = 3, 4   # end of the last acknowledged move, absolute mm
+FEED = 5                    # modal feed, mm/min; 0 until the program sets one
+REPORTED_FEED = 6           # FS: feed from the last status report
+LINE = 7                    # last acknowledged source line, -1 before the first
+_VALUE_COUNT = 8
+# Fields outside the array
+MODAL = 8                   # MODAL_RELATIVE | MODAL_INCHES
+MOTION = 9                  # OP_RAPID .. OP_ARC_CCW
+STATE = 10                  # 'Idle', 'Run', ... from the last status report
+
+# Change masks passed to listeners
+POSITION = (1 << X) | (1 << Y) | (1 << Z)
+TARGET = (1 << TARGET_X) | (1 << TARGET_Y)
+CHANGED_FEED = 1 << FEED
+CHANGED_LINE = 1 << LINE
+CHANGED_MODAL = (1 << MODAL) | (1 << MOTION)
+CHANGED_STATE = (1 << STATE) | (1 << REPORTED_FEED)
+
+
+class MachineState:
+    """What the Pi knows about the machine, updated incrementally.
+
+    Acknowledged job lines move the modal state, feed and target position
+    along, taken from the compiled toolpath (apply_command) or parsed from
+    the text when there is none (apply_line); status reports (apply_status)
+    set the reported position and state. Numeric fields live in one
+    array('d') indexed by the constants above. Writers hold a lock; single fields can be read
+    without it, snapshot() reads several consistently.
+
+    Listeners are called as listener(state, changed) after each update
+    that changed something, outside the lock and on the writer's thread;
+    changed is a bit mask (1 << field, or POSITION, TARGET, ...).
+    """
+
+    __slots__ = ('values', 'modal', 'motion', 'state', 'reports', '_lock', '_listeners')
+
+    def __init__(self):
+        self.values = array('d', bytes(8 * _VALUE_COUNT))
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.reports = 0
+        self.reset()
+
+    def reset(self):
+        """Power-on state: G90, G21, no feed, at the origin; called when the board resets."""
+        with self._lock:
+            values = self.values
+            for i in range(_VALUE_COUNT):
+                values[i] = 0.0
+            values[LINE] = -1
+            self.modal = 0
+            self.motion = OP_RAPID
+            self.state = None
+        self._notify(POSITION | TARGET | CHANGED_FEED | CHANGED_LINE | CHANGED_MODAL | CHANGED_STATE)
+
+    def add_listener(self, callback):
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, changed):
+        if changed:
+            for listener in list(self._listeners):
+                listener(self, changed)
+
+    # --- Updates ---
+    def apply_line(self, line, line_index=None):
+        """Apply a line the controller acknowledged, parsed as compile_lines() would."""
+        code = strip_comments(line).upper()
+        if not code:
+            return
+        with self._lock:
+            values = self.values
+            op, _, modal, motion, nx, ny, nf = parse_words(code, self.modal, self.motion)
+            feed = values[FEED]
+            if nf is not None:
+                feed = nf * MM_PER_INCH if modal & MODAL_INCHES else nf
+            x, y = values[TARGET_X], values[TARGET_Y]
+            if op != OP_OTHER:
+                x, y = move_target(modal, x, y, nx, ny)
+            changed = self._set(modal, motion, feed, x, y, line_index)
+        self._notify(changed)
+
+    def apply_command(self, toolpath, i, line_index=None):
+        """Apply compiled command i of toolpath, acknowledged by the controller, without parsing it again."""
+        op = toolpath.op[i]
+        with self._lock:
+            changed = self._set(toolpath.modal[i], op if op <= OP_ARC_CCW else self.motion,
+                                toolpath.feed[i], toolpath.x[i], toolpath.y[i], line_index)
+        self._notify(changed)
+
+    def _set(self, modal, motion, feed, x, y, line_index):
+        # Caller holds the lock; returns the change mask
+        changed = 0
+        values = self.values
+        if values[FEED] != feed:
+            values[FEED] = feed
+            changed |= CHANGED_FEED
+        if x != values[TARGET_X] or y != values[TARGET_Y]:
+            values[TARGET_X] = x
+            values[TARGET_Y] = y
+            changed |= TARGET
+        if modal != self.modal or motion != self.motion:
+            self.modal = modal
+            self.motion = motion
+            changed |= CHANGED_MODAL
+        if line_index is not None and values[LINE] != line_index:
+            values[LINE] = line_index
+            changed |= CHANGED_LINE
+        return changed
+
+    def apply_status(self, status):
+        """Apply a parsed MachineStatus report."""
+        changed = 0
+        with self._lock:
+            self.reports += 1
+            if status.state != self.state:
+                self.state = status.state
+                changed |= 1 << STATE
+            if status.feed is not None and status.feed != self.values[REPORTED_FEED]:
+                self.values[REPORTED_FEED] = status.feed
+                changed |= 1 << REPORTED_FEED
+            if status.position is not None:
+                changed |= self._set_position(status.position)
+        self._notify(changed)
+
+    def set_position(self, position):
+        """Set the reported position from a tuple of floats, e.g. a replayed report."""
+        with self._lock:
+            changed = self._set_position(position)
+        self._notify(changed)
+
+    def _set_position(self, position):
+        # Caller holds the lock
+        changed = 0
+        values = self.values
+        for axis, value in enumerate(position[:3]):
+            if values[axis] != value:
+                values[axis] = value
+                changed |= 1 << axis
+        return changed
+
+    # --- Reads ---
+    @property
+    def position(self):
+        with self._lock:
+            return self.values[X], self.values[Y], self.values[Z]
+
+    @property
+    def target(self):
+        with self._lock:
+            return self.values[TARGET_X], self.values[TARGET_Y]
+
+    @property
+    def feed(self):
+        return self.values[FEED]
+
+    @property
+    def line(self):
+        return int(self.values[LINE])
+
+    def snapshot(self):
+        """(modal, feed, target_x, target_y, line) read together."""
+        with self._lock:
+            values = self.values
+            return self.modal, values[FEED], values[TARGET_X], values[TARGET_Y], int(values[LINE])
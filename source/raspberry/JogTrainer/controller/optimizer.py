@@ -0,0 +1,248 @@
+import math
+
+import numpy as np
+
+from controller.toolpath import (
+    Toolpath, OP_LINEAR, OP_ARC_CW, OP_ARC_CCW, OP_OTHER,
+    MODAL_RELATIVE, WORD_X, WORD_Y, WORD_F, WORD_OTHER, _fmt
+)
+from controller.estimator import (
+    estimate_job, format_duration, STEPS_PER_MM_X, STEPS_PER_MM_Y, DEFAULT_FEEDRATE
+)
+
+DEFAULT_TOLERANCE = 0.01  # mm a merged path may deviate from the original points
+MIN_ARC_SEGMENTS = 4      # fewer segments are left to the line merge
+MAX_ARC_SEGMENTS = 512
+MAX_ARC_RADIUS = 1000.0   # mm; flatter curves are merged as lines
+MAX_ARC_SWEEP = math.pi   # keep each arc to a half circle
+
+
+class OptimizeResult:
+    def __init__(self, toolpath, lines_before, dropped, arcs, time_before, time_after):
+        self.toolpath = toolpath
+        self.lines_before = lines_before
+        self.lines_after = len(toolpath)
+        self.dropped = dropped          # zero-length moves removed
+        self.arcs = arcs                # G2/G3 commands fitted
+        self.time_before = time_before  # estimated seconds
+        self.time_after = time_after
+
+    def summary(self):
+        text = (f"Optimized {self.lines_before} -> {self.lines_after} commands "
+                f"({self.dropped} zero-length dropped")
+        if self.arcs:
+            text += f", {self.arcs} arcs"
+        return text + (f"), est. {format_duration(self.time_before)} -> {format_duration(self.time_after)}")
+
+
+def _is_plain(toolpath, i):
+    # Plain G0/G1 moves in G90/G21, which may be rewritten
+    return toolpath.op[i] <= OP_LINEAR and not toolpath.modal[i] and not toolpath.words[i] & WORD_OTHER
+
+
+def _merge_line(xs, ys, start, end, ax, ay, half_tol):
+    """Index of the last point reachable from (ax, ay) in one straight move.
+
+    Every point up to it lies within half_tol of the line through the anchor
+    and the first point, moving forward along it; the chord to the last one
+    is then within twice that of every point it replaces.
+    """
+    dx = xs[start] - ax
+    dy = ys[start] - ay
+    length = math.hypot(dx, dy)
+    if length == 0:
+        return start
+    ux, uy = dx / length, dy / length
+    last_t = length
+    k = start + 1
+    while k < end:
+        px = xs[k] - ax
+        py = ys[k] - ay
+        t = px * ux + py * uy
+        if t < last_t or abs(px * uy - py * ux) > half_tol:
+            break
+        last_t = t
+        k += 1
+    return k - 1
+
+
+def _fit_arc(px, py, tolerance):
+    """Circle through the anchor, middle and last point if every point and chord is within tolerance.
+
+    Returns (cx, cy, ccw) or None.
+    """
+    n = len(px) - 1
+    x0, y0, x1, y1, x2, y2 = px[0], py[0], px[n // 2], py[n // 2], px[n], py[n]
+    det = 2.0 * ((x1 - x0) * (y2 - y0) - (y1 - y0) * (x2 - x0))
+    if abs(det) < 1e-9:
+        return None
+    a = (x1 - x0) * (x1 + x0) + (y1 - y0) * (y1 + y0)
+    b = (x2 - x0) * (x2 + x0) + (y2 - y0) * (y2 + y0)
+    cx = (a * (y2 - y0) - b * (y1 - y0)) / det
+    cy = (b * (x1 - x0) - a * (x2 - x0)) / det
+    radius = math.hypot(x0 - cx, y0 - cy)
+    if radius > MAX_ARC_RADIUS:
+        return None
+    if np.abs(np.hypot(px - cx, py - cy) - radius).max() > tolerance:
+        return None
+    # Same turning direction throughout, and no more than MAX_ARC_SWEEP in total
+    sweep = np.diff(np.unwrap(np.arctan2(py - cy, px - cx)))
+    ccw = det > 0
+    if (sweep <= 0).any() if ccw else (sweep >= 0).any():
+        return None
+    if abs(sweep.sum()) > MAX_ARC_SWEEP:
+        return None
+    # The original straight segments must stay close to the arc as well
+    chord = np.hypot(np.diff(px), np.diff(py)).max()
+    if radius - math.sqrt(max(radius * radius - chord * chord / 4.0, 0.0)) > tolerance:
+        return None
+    return cx, cy, ccw
+
+
+def _longest_arc(xs, ys, start, end, ax, ay, tolerance):
+    """Fit the longest arc from the anchor over points start..; returns (last index, (cx, cy, ccw)) or None."""
+    available = min(end - start, MAX_ARC_SEGMENTS)
+    if available < MIN_ARC_SEGMENTS:
+        return None
+
+    def attempt(count):
+        px = np.array([ax] + xs[start:start + count])
+        py = np.array([ay] + ys[start:start + count])
+        return _fit_arc(px, py, tolerance)
+
+    good = MIN_ARC_SEGMENTS
+    fit = attempt(good)
+    if fit is None:
+        return None
+    # Grow by doubling, then bisect between the last fit and the first miss
+    bad = None
+    while good < available:
+        count = min(good * 2, available)
+        found = attempt(count)
+        if found is None:
+            bad = count
+            break
+        good, fit = count, found
+    while bad is not None and bad - good > 1:
+        count = (good + bad) // 2
+        found = attempt(count)
+        if found is None:
+            bad = count
+        else:
+            good, fit = count, found
+    return start + good - 1, fit
+
+
+def optimize_toolpath(toolpath, tolerance=DEFAULT_TOLERANCE, fit_arcs=False, modal_feed=False,
+                      steps_per_mm_x=STEPS_PER_MM_X, steps_per_mm_y=STEPS_PER_MM_Y,
+                      default_feedrate=DEFAULT_FEEDRATE):
+    """Return a shorter Toolpath that traces the same path within tolerance mm.
+
+    Runs of plain G0/G1 moves at the same effective feed are rewritten once
+    both axes have a known absolute position:
+    moves that land on the current step position (the Arduino's "No move")
+    are dropped and collinear segments are merged. With fit_arcs=True,
+    curves made of short G1 segments become G2/G3 arcs; only for GRBL,
+    since the Arduino sketch does not execute arcs. Every other command is
+    kept and still sent from its source line. Each output command carries
+    the source line of the last command it replaces, so progress and
+    error reporting keep working. modal_feed has the same meaning as in
+    estimate_job().
+    """
+    op, modal, words = toolpath.op, toolpath.modal, toolpath.words
+    x, y, feed, line = toolpath.x, toolpath.y, toolpath.feed, toolpath.line
+    out = Toolpath()
+    dropped = arcs = 0
+    half_tol = tolerance / 2.0
+    known = 0           # axes whose position is known, WORD_X | WORD_Y
+    sent_feed = None    # modal feed the controller holds, for modal_feed
+    count = len(toolpath)
+
+    def effective_feed(i):
+        if modal_feed or words[i] & WORD_F:
+            return feed[i] if feed[i] > 0 else default_feedrate
+        return default_feedrate
+
+    def feed_words(value):
+        nonlocal sent_feed
+        if modal_feed:
+            if value == sent_feed:
+                return 0
+            sent_feed = value
+            return WORD_F
+        return WORD_F if value != default_feedrate else 0
+
+    def steps(px, py):
+        return round(px * steps_per_mm_x), round(py * steps_per_mm_y)
+
+    def copy(i):
+        nonlocal sent_feed
+        out.append(op[i], modal[i], words[i], x[i], y[i], feed[i], line[i])
+        if words[i] & WORD_F:
+            sent_feed = feed[i]
+
+    i = 0
+    while i < count:
+        if not _is_plain(toolpath, i):
+            copy(i)
+            if op[i] == OP_OTHER:
+                known = 0  # G28, G92, $H... may move the machine in ways not modelled here
+            elif not modal[i] & MODAL_RELATIVE:
+                known |= words[i] & (WORD_X | WORD_Y)
+            i += 1
+            continue
+
+        # Until a move has set both axes, the compiled position is a guess: send as written
+        if known != WORD_X | WORD_Y:
+            copy(i)
+            known |= words[i] & (WORD_X | WORD_Y)
+            i += 1
+            continue
+
+        # A block of plain moves with one opcode and one effective feed
+        block_op = op[i]
+        block_feed = effective_feed(i)
+        end = i + 1
+        while end < count and _is_plain(toolpath, end) and op[end] == block_op and effective_feed(end) == block_feed:
+            end += 1
+        pos = (out.x[-1], out.y[-1])
+
+        # Drop moves that do not change the step position
+        xs, ys, lines = [], [], []
+        at = steps(*pos)
+        for k in range(i, end):
+            target = steps(x[k], y[k])
+            if target == at:
+                dropped += 1
+                continue
+            xs.append(x[k])
+            ys.append(y[k])
+            lines.append(line[k])
+            at = target
+        i = end
+
+        k = 0
+        while k < len(xs):
+            ax, ay = pos
+            arc = None
+            if fit_arcs and block_op == OP_LINEAR:
+                arc = _longest_arc(xs, ys, k, len(xs), ax, ay, tolerance)
+            if arc is not None:
+                last, (cx, cy, ccw) = arc
+                arc_op = OP_ARC_CCW if ccw else OP_ARC_CW
+                flags = WORD_X | WORD_Y | feed_words(block_feed)
+                text = (f"G{arc_op}X{_fmt(xs[last])}Y{_fmt(ys[last])}I{_fmt(cx - ax)}J{_fmt(cy - ay)}"
+                        + (f"F{_fmt(block_feed)}" if flags & WORD_F else ""))
+                out.text[len(out)] = text
+                out.append(arc_op, 0, flags, xs[last], ys[last], block_feed, lines[last])
+                arcs += 1
+            else:
+                last = _merge_line(xs, ys, k, len(xs), ax, ay, half_tol)
+                out.append(block_op, 0, WORD_X | WORD_Y | feed_words(block_feed),
+                           xs[last], ys[last], block_feed, lines[last])
+            pos = (xs[last], ys[last])
+            k = last + 1
+
+    before = estimate_job(toolpath, steps_per_mm_x, steps_per_mm_y, default_feedrate, modal_feed)
+    after = estimate_job(out, steps_per_mm_x, steps_per_mm_y, default_feedrate, modal_feed)
+    return OptimizeResult(out, count, dropped, arcs, before.total_time, after.total_time)
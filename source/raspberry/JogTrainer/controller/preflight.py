@@ -0,0 +1,226 @@
+import numpy as np
+
+from controller.toolpath import (
+    OP_LINEAR, OP_ARC_CW, OP_ARC_CCW,
+    MODAL_RELATIVE, MODAL_INCHES, WORD_F, WORD_OTHER, strip_comments, _WORD
+)
+from controller.machine_defaults import STEPS_PER_MM_X, STEPS_PER_MM_Y, DEFAULT_FEEDRATE, MIN_STEP_DELAY_MS
+
+# Work envelope after homing (the sketch homes to the X-/Y- switches and calls that 0); adjust for your hardware
+TRAVEL_X_MM = 300.0
+TRAVEL_Y_MM = 200.0
+
+SEVERITY_ERROR = "error"      # the job would halt or move somewhere else than the program says
+SEVERITY_WARNING = "warning"  # runs, but not as written
+
+MAX_LISTED_LINES = 10
+_CHUNK = 262144        # flagged lines per numpy pass over the file bytes
+_PYTHON_LINES = 4096   # fewer flagged lines are simply classified one by one
+_COMMENT_BIT = 1 << 26
+_GXYF_BITS = sum(1 << (ord(letter) - 65) for letter in "GXYF")
+# Ignored by the sketch but matching what it does anyway (absolute mm, XY plane, ...)
+HARMLESS_G = {17, 21, 40, 49, 54, 80, 90, 94}
+
+
+class PreflightIssue:
+    def __init__(self, severity, code, message, lines):
+        self.severity = severity
+        self.code = code
+        self.message = message
+        self.lines = lines  # 0-based source lines, ascending
+
+    @property
+    def count(self):
+        return len(self.lines)
+
+    def describe(self):
+        shown = ", ".join(str(int(i) + 1) for i in self.lines[:MAX_LISTED_LINES])
+        more = f" (+{self.count - MAX_LISTED_LINES} more)" if self.count > MAX_LISTED_LINES else ""
+        plural = "s" if self.count > 1 else ""
+        return f"{self.severity}: {self.message} - line{plural} {shown}{more}"
+
+
+class PreflightReport:
+    def __init__(self, issues):
+        self.issues = issues
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue.severity == SEVERITY_ERROR]
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue.severity == SEVERITY_WARNING]
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def first_error_line(self):
+        lines = [int(issue.lines[0]) for issue in self.errors]
+        return min(lines) if lines else None
+
+    def summary(self):
+        if not self.issues:
+            return "Pre-flight: no problems found"
+        return (f"Pre-flight: {len(self.errors)} error(s), {len(self.warnings)} warning(s)\n"
+                + "\n".join(issue.describe() for issue in self.issues))
+
+
+def max_feedrate(steps_per_mm_x=STEPS_PER_MM_X, steps_per_mm_y=STEPS_PER_MM_Y):
+    # moveTo never steps faster than once per MIN_STEP_DELAY_MS on the longer axis
+    return 60000.0 / MIN_STEP_DELAY_MS / max(steps_per_mm_x, steps_per_mm_y)
+
+
+def _classify_text(code):
+    """What GCodeHandler::handleLine does with a line the toolpath marked WORD_OTHER.
+
+    Returns (severity, issue code, message) or None.
+    """
+    if not code.startswith('G'):
+        return SEVERITY_ERROR, "unknown-command", "not a G-code line; the sketch answers 'error: unknown command' and the job halts"
+    words = _WORD.findall(code)
+    g_values = [float(value) for letter, value in words if letter == 'G']
+    first = g_values[0] if g_values else None
+    # handleGcode() only looks at the text prefix: "G0..." and "G1..." run as moves, G10-G19 included
+    runs_as_move = code.startswith('G0') or code.startswith('G1')
+    if first in (0, 1) and len(g_values) == 1:
+        extra = sorted({letter for letter, _ in words if letter not in 'GXYF'})
+        return SEVERITY_WARNING, "ignored-words", f"words {'/'.join(extra)} are ignored by the sketch"
+    if runs_as_move and any(letter in 'XY' for letter, _ in words):
+        return (SEVERITY_ERROR, "misread-g",
+                f"G{first:g} is executed as a straight move to its X/Y words by the sketch")
+    label = '/'.join(f"G{g:g}" for g in g_values) if g_values else code.split()[0]
+    if not runs_as_move and (0 in g_values or 1 in g_values or any(letter in 'XY' for letter, _ in words)):
+        return (SEVERITY_ERROR, "skipped-move",
+                f"{label} line is skipped by the sketch, which only runs lines starting with G0/G1")
+    if first is not None and all(g in HARMLESS_G for g in g_values):
+        return None
+    return SEVERITY_WARNING, "ignored-g", f"{label} is not supported and is skipped by the sketch"
+
+
+def _letters(mask):
+    return '/'.join(chr(65 + bit) for bit in range(26) if mask >> bit & 1)
+
+
+def _scan_other_lines(program, lines, ops):
+    """Classify the given source lines; returns {(severity, code, message): sorted line array}.
+
+    The common cases, a G0/G1 move with extra words (Z, S, ...) and a line
+    not starting with G, are decided on the raw bytes with numpy; lines with
+    comments, leading blanks or other G codes go through _classify_text().
+    """
+    found = {}
+
+    def add(key, values):
+        found.setdefault(key, []).append(values)
+
+    def classify(source_lines):
+        for source_line in source_lines:
+            result = _classify_text(strip_comments(program.line_at(int(source_line))).upper())
+            if result is not None:
+                add(result, np.array([source_line]))
+
+    if len(lines) <= _PYTHON_LINES:
+        classify(lines)
+    else:
+        data = np.frombuffer(program.raw_bytes(), dtype=np.uint8)
+        index = np.frombuffer(program.index, dtype=np.uint64).astype(np.int64)
+        for chunk in range(0, len(lines), _CHUNK):
+            chunk_lines = lines[chunk:chunk + _CHUNK].astype(np.int64)
+            chunk_ops = ops[chunk:chunk + _CHUNK]
+            # One contiguous slice of the file from the first to the last of these lines
+            first, last = int(chunk_lines[0]), int(chunk_lines[-1])
+            begin = int(index[first])
+            end = int(index[last + 1]) if last + 1 < len(index) else len(data)
+            raw = data[begin:end]
+            line_start = index[first:last + 1] - begin
+            upper = raw & 0xDF
+            letter = (upper >= 65) & (upper <= 90) & (raw >= 65) & (raw < 0x80)
+            # One bit per letter A-Z, bit 26 for a comment character
+            bits = np.left_shift(np.uint32(1), np.where(letter, upper - 65, 26).astype(np.uint32))
+            bits[~letter & (raw != 0x28) & (raw != 0x3B)] = 0
+            mask = np.bitwise_or.reduceat(bits, line_start)
+            g_count = np.add.reduceat((upper == 71) & letter, line_start, dtype=np.uint16)
+            rows = chunk_lines - first
+            mask = mask[rows]
+            g_count = g_count[rows]
+            first_byte = raw[line_start[rows]]
+            first_upper = first_byte & 0xDF
+            simple = ((mask & _COMMENT_BIT) == 0) & (first_upper >= 65) & (first_upper <= 90) & (first_byte >= 65)
+            unknown = simple & (first_upper != 71)
+            if unknown.any():
+                add((SEVERITY_ERROR, "unknown-command",
+                     "not a G-code line; the sketch answers 'error: unknown command' and the job halts"),
+                    chunk_lines[unknown])
+            extra_words = simple & (first_upper == 71) & (chunk_ops <= OP_LINEAR) & (g_count == 1)
+            if extra_words.any():
+                extra = mask[extra_words] & ~np.uint32(_GXYF_BITS)
+                for value in np.unique(extra):
+                    add((SEVERITY_WARNING, "ignored-words", f"words {_letters(int(value))} are ignored by the sketch"),
+                        chunk_lines[extra_words][extra == value])
+            classify(chunk_lines[~(unknown | extra_words)])
+    return {key: np.sort(np.concatenate(parts)).astype(np.uint32) for key, parts in found.items()}
+
+
+def preflight_check(toolpath, program=None, travel_x=(0.0, TRAVEL_X_MM), travel_y=(0.0, TRAVEL_Y_MM),
+                    steps_per_mm_x=STEPS_PER_MM_X, steps_per_mm_y=STEPS_PER_MM_Y,
+                    default_feedrate=DEFAULT_FEEDRATE, check_words=True):
+    """Check a compiled program against the Arduino sketch before it is sent.
+
+    Soft limits, feed rates and modal state are checked with whole-array
+    numpy operations on the toolpath. With program (the GcodeFile), the
+    lines the compiler marked WORD_OTHER are also checked for words and
+    commands GCodeHandler does not implement.
+    Pass check_words=False for GRBL, which implements the full set.
+    Arcs are checked at their end points only.
+    """
+    op = np.frombuffer(toolpath.op, dtype=np.uint8)
+    modal = np.frombuffer(toolpath.modal, dtype=np.uint8)
+    words = np.frombuffer(toolpath.words, dtype=np.uint8)
+    x = np.frombuffer(toolpath.x, dtype=np.float32)
+    y = np.frombuffer(toolpath.y, dtype=np.float32)
+    feed = np.frombuffer(toolpath.feed, dtype=np.float32)
+    line = np.frombuffer(toolpath.line, dtype=np.uint32)
+    motion = op <= OP_ARC_CCW
+    issues = []
+
+    def add(severity, code, message, mask):
+        lines = line[mask]
+        if len(lines):
+            issues.append(PreflightIssue(severity, code, message, lines))
+
+    # Work envelope
+    for axis, values, (low, high) in (("X", x, travel_x), ("Y", y, travel_y)):
+        outside = motion & ((values < low) | (values > high))
+        if outside.any():
+            reached = values[outside]
+            add(SEVERITY_ERROR, f"soft-limit-{axis.lower()}",
+                f"{axis} goes to {float(reached.min()):.3f}..{float(reached.max()):.3f} mm, outside the {low:g}..{high:g} mm travel",
+                outside)
+
+    # Feed rates
+    limit = max_feedrate(steps_per_mm_x, steps_per_mm_y)
+    has_feed = motion & ((words & WORD_F) != 0)
+    add(SEVERITY_WARNING, "feed-too-high",
+        f"F above {limit:g} mm/min; the 1 ms minimum step delay caps it", has_feed & (feed > limit))
+    add(SEVERITY_WARNING, "feed-zero",
+        f"F0 or negative feed; the sketch uses the default {default_feedrate:g} mm/min", has_feed & (feed <= 0))
+    if check_words:
+        # F is not modal on the sketch: lines without it run at the default feed
+        add(SEVERITY_WARNING, "feed-not-modal",
+            f"moves without F run at the default {default_feedrate:g} mm/min, not the program's last F",
+            (op == OP_LINEAR) & ((words & WORD_F) == 0) & (feed > 0) & (feed != np.float32(default_feedrate)))
+
+        # Commands and modal state the sketch does not implement
+        add(SEVERITY_ERROR, "arc", "G2/G3 arcs are not executed by the sketch", (op == OP_ARC_CW) | (op == OP_ARC_CCW))
+        add(SEVERITY_ERROR, "relative", "G91 relative moves would be executed as absolute", motion & ((modal & MODAL_RELATIVE) != 0))
+        add(SEVERITY_ERROR, "inches", "G20 inch moves would be executed as millimetres", motion & ((modal & MODAL_INCHES) != 0))
+
+        if program is not None:
+            other = np.flatnonzero(((words & WORD_OTHER) != 0) & (op != OP_ARC_CW) & (op != OP_ARC_CCW))
+            for (severity, code, message), lines in _scan_other_lines(program, line[other], op[other]).items():
+                issues.append(PreflightIssue(severity, code, message, lines))
+
+    issues.sort(key=lambda issue: (issue.severity != SEVERITY_ERROR, int(issue.lines[0])))
+    return PreflightReport(issues)
@@ -0,0 +1,143 @@
+import heapq
+import time
+from array import array
+
+RING_SIZE = 65536   # lines kept for the percentiles
+SLOWEST_KEPT = 50   # slowest lines kept over the whole job
+
+
+def _percentile(sorted_samples, p):
+    if not sorted_samples:
+        return None
+    last = len(sorted_samples) - 1
+    return sorted_samples[min(last, int(round(p / 100 * last)))]
+
+
+class StreamProfiler:
+    """Per-line enqueue -> write -> ack timings for a streamed job.
+
+    Attach one as controller.profiler; GcodeSender and GRBLController then
+    call enqueue(), write_begin()/write_end(count), ack() and callback() on
+    their hot paths. With no profiler attached those paths only test for
+    None. Timings go into preallocated ring buffers indexed by a sequence
+    number, so recording a line allocates nothing but the timestamps.
+
+    The service time of a line is the time from the later of its write and
+    the previous ack to its own ack: what the controller spent on that
+    line alone (step loop included), with the queueing behind earlier lines
+    taken out. Lines are matched to acks in order; replies to commands sent
+    outside the job (nothing enqueued) are ignored.
+    """
+
+    def __init__(self, capacity=RING_SIZE, slowest_kept=SLOWEST_KEPT):
+        self.capacity = capacity
+        self.slowest_kept = slowest_kept
+        self.line = array('q', bytes(8 * capacity))
+        self.enqueued = array('d', bytes(8 * capacity))
+        self.written = array('d', bytes(8 * capacity))
+        self.acked = array('d', bytes(8 * capacity))
+        self.reset()
+
+    def reset(self):
+        self.sent = 0               # lines enqueued
+        self.acks = 0               # lines acknowledged
+        self.started = time.perf_counter()
+        self.last_ack = self.started
+        self.wait_time = 0.0        # enqueue -> write: flow control, pause
+        self.write_time = 0.0       # inside ser.write()
+        self.callback_time = 0.0    # reader thread inside UI/progress callbacks
+        self.callbacks = 0
+        self._unwritten = 0         # first line not written yet
+        self._write_start = 0.0
+        self._slowest = []          # min-heap of (service time, line)
+
+    # --- Hooks ---
+    def enqueue(self, line_index):
+        seq = self.sent
+        slot = seq % self.capacity
+        self.line[slot] = line_index
+        self.enqueued[slot] = time.perf_counter()
+        self.written[slot] = 0.0
+        self.sent = seq + 1
+
+    def write_begin(self):
+        self._write_start = time.perf_counter()
+
+    def write_end(self, count=1):
+        # The oldest count enqueued lines went out in this write
+        first = self._unwritten
+        last = min(first + count, self.sent)
+        if first >= last:
+            return  # a command sent outside the job
+        now = time.perf_counter()
+        self.write_time += now - self._write_start
+        for seq in range(first, last):
+            slot = seq % self.capacity
+            self.written[slot] = now
+            self.wait_time += self._write_start - self.enqueued[slot]
+        self._unwritten = last
+
+    def ack(self):
+        seq = self.acks
+        if seq >= self.sent:
+            return
+        now = time.perf_counter()
+        slot = seq % self.capacity
+        written = self.written[slot] or now
+        self.acked[slot] = now
+        service = now - (written if written > self.last_ack else self.last_ack)
+        self.last_ack = now
+        self.acks = seq + 1
+        slowest = self._slowest
+        if len(slowest) < self.slowest_kept:
+            heapq.heappush(slowest, (service, self.line[slot]))
+        elif service > slowest[0][0]:
+            heapq.heapreplace(slowest, (service, self.line[slot]))
+
+    def callback(self, seconds):
+        self.callback_time += seconds
+        self.callbacks += 1
+
+    # --- Reports ---
+    def _acked_slots(self):
+        count = min(self.acks, self.capacity)
+        return [(self.acks - count + k) % self.capacity for k in range(count)]
+
+    def summary(self):
+        slots = self._acked_slots()
+        latencies = sorted(self.acked[s] - (self.written[s] or self.acked[s]) for s in slots)
+        elapsed = self.last_ack - self.started
+        stats = {
+            "lines_sent": self.sent,
+            "lines_acked": self.acks,
+            "lines_per_sec": self.acks / elapsed if elapsed > 0 else 0.0,
+            "wait_s": self.wait_time,
+            "write_s": self.write_time,
+            "callback_s": self.callback_time,
+            "callback_avg_us": self.callback_time / self.callbacks * 1e6 if self.callbacks else 0.0,
+        }
+        for p in (50, 95, 99):
+            value = _percentile(latencies, p)
+            stats[f"ack_p{p}_ms"] = value * 1000 if value is not None else None
+        return stats
+
+    def format_summary(self):
+        s = self.summary()
+        if s["ack_p50_ms"] is None:
+            return f"Profile: {s['lines_sent']} lines sent, no acks yet"
+        return (f"Profile: {s['lines_acked']}/{s['lines_sent']} lines, {s['lines_per_sec']:.1f} lines/sec, "
+                f"ack p50/p95/p99 {s['ack_p50_ms']:.1f}/{s['ack_p95_ms']:.1f}/{s['ack_p99_ms']:.1f} ms, "
+                f"waiting {s['wait_s']:.2f} s, writing {s['write_s']:.2f} s, "
+                f"UI callbacks {s['callback_s']:.2f} s ({s['callback_avg_us']:.0f} us each)")
+
+    def slowest(self, count=20):
+        """[(source line index, service seconds)], slowest first."""
+        return [(line, service) for service, line in sorted(self._slowest, reverse=True)[:count]]
+
+    def dump(self, program=None, count=20):
+        """Text report: the summary and the slowest source lines, with their text when program is given."""
+        lines = [self.format_summary(), f"Slowest {count} lines by controller service time:"]
+        for line_index, service in self.slowest(count):
+            text = program.line_at(line_index) if program is not None else ""
+            lines.append(f"  line {line_index + 1:>8}: {service * 1000:9.2f} ms  {text}")
+        return "\n".join(lines)
@@ -0,0 +1,467 @@
+"""Simulated JogTrainer board on a pseudo-terminal, for load and latency testing.
+
+Speaks the protocol of the Arduino sketch (GCodeHandler.cpp): X+/X-/Y+/Y-/LIM?/
+BUZ/CLOCK, FEEDHOLD/PAUSE/CYCLE/RESET/HOME/BAUD and G0/G1 moves answered with 'ok'
+or 'error: ...', and the 0x85 jog cancel. It also understands GRBL's real-time
+'!', '~', '?' and Ctrl-X and the $H line. The slave end of the pty behaves like a serial port, so
+GRBLController.connect(sim.port) works unchanged: opening it resets the board, which prints
+its ready banner boot_time later. A port reopened within a few milliseconds of being closed
+may not be seen as a reset; connect() then finds the board with its probe.
+
+    python -m controller.simulator --rx-buffer 64 --line-delay 0.0005
+"""
+import argparse
+import math
+import os
+import random
+import select
+import threading
+import time
+from collections import deque
+
+from controller.machine_defaults import STEPS_PER_MM_X, STEPS_PER_MM_Y, DEFAULT_FEEDRATE, MIN_STEP_DELAY_MS, MIN_MOVE_MM
+from controller.gcode_sender import ARDUINO_RX_BUFFER_SIZE
+
+BANNER = "CNC JogTrainer G-code Ready. Manual: X+/X-/Y+/Y-/LIM?/BUZ/CLOCK. G-code: G0/G1 X Y F"
+JOG_STEPS = 200
+JOG_CANCEL = 0x85
+REALTIME_BYTES = (ord('!'), ord('~'), ord('?'), 0x18, JOG_CANCEL)
+BAUD_RATES = (115200, 250000, 500000, 1000000)  # accepted by 'BAUD <rate>'
+
+
+class SimulatedDevice:
+    def __init__(self, rx_buffer_size=ARDUINO_RX_BUFFER_SIZE, line_delay=0.0, simulate_motion=False,
+                 time_scale=1.0, error_every=0, error_rate=0.0, baudrate=None, drop_on_overflow=True,
+                 seed=None, steps_per_mm_x=STEPS_PER_MM_X, steps_per_mm_y=STEPS_PER_MM_Y,
+                 default_feedrate=DEFAULT_FEEDRATE, boot_time=0.05):
+        self.rx_buffer_size = rx_buffer_size
+        self.line_delay = line_delay            # seconds spent on every line
+        self.simulate_motion = simulate_motion  # also spend the modelled move time
+        self.time_scale = time_scale            # < 1 runs moves faster than real time
+        self.error_every = error_every          # answer every Nth G-code line with an error
+        self.error_rate = error_rate            # or a random fraction of them
+        self.baudrate = baudrate                # throttle input to the wire speed, None = unlimited
+        self.drop_on_overflow = drop_on_overflow
+        self.boot_time = boot_time              # port opened -> banner; an Uno takes about 1.5 s
+        self.steps_per_mm_x = steps_per_mm_x
+        self.steps_per_mm_y = steps_per_mm_y
+        self.default_feedrate = default_feedrate
+        self.random = random.Random(seed)
+
+        self.pos_x_steps = 0
+        self.pos_y_steps = 0
+        self.limit_x_pressed = False
+        self.limit_y_pressed = False
+        self.is_feed_hold = False
+        self.is_paused = False
+        self.is_homing = False
+        self.jogging = False
+        self.jog_cancel = False
+        self.state = "Idle"
+        self.feed = 0.0
+
+        # Stats
+        self.lines_received = 0
+        self.gcode_lines = 0
+        self.errors_injected = 0
+        self.overflow_bytes = 0
+        self.max_rx_used = 0
+        self.resets = 0
+
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._rx = bytearray()      # the device's serial RX buffer
+        self._lines = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._running = False
+        self._threads = []
+
+    # --- Lifecycle ---
+    def start(self):
+        import pty
+        import tty
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        # Without our own handle on the slave, the master sees POLLHUP until a client opens it
+        os.close(self._slave)
+        self._slave = None
+        self._running = True
+        for target in (self._reader, self._executor):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self.port
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def get_stats(self):
+        return {
+            "lines_received": self.lines_received,
+            "gcode_lines": self.gcode_lines,
+            "errors_injected": self.errors_injected,
+            "overflow_bytes": self.overflow_bytes,
+            "max_rx_used": self.max_rx_used,
+            "resets": self.resets,
+            "rx_buffer_size": self.rx_buffer_size,
+        }
+
+    # --- Serial side ---
+    def _println(self, text):
+        with self._write_lock:
+            if self._master is not None:
+                try:
+                    os.write(self._master, (text + "\r\n").encode())
+                except OSError:
+                    pass
+
+    def _reset(self):
+        # Like the Uno's auto-reset on open: input is lost, and the banner follows once booted
+        self.resets += 1
+        with self._cond:
+            self._rx.clear()
+            self._lines.clear()
+        time.sleep(self.boot_time)
+        self._println(BANNER)
+
+    def _reader(self):
+        poller = select.poll()
+        poller.register(self._master, select.POLLIN)
+        opened = False
+        while self._running:
+            try:
+                events = poller.poll(50)
+            except (OSError, ValueError):
+                break
+            flags = events[0][1] if events else 0
+            if flags & select.POLLHUP:
+                # No client has the port open; POLLHUP stays set, so do not spin on it
+                opened = False
+                time.sleep(0.01)
+                continue
+            if not opened:
+                opened = True
+                self._reset()
+            if not flags & select.POLLIN:
+                continue
+            try:
+                data = os.read(self._master, 1024)
+            except (OSError, TypeError):
+                break
+            if not data:
+                break
+            if self.baudrate:
+                time.sleep(len(data) * 10 / self.baudrate)
+            with self._cond:
+                for byte in data:
+                    # '?' inside a line belongs to it, as in the sketch's "LIM?"
+                    if byte in REALTIME_BYTES and not (byte == 0x3F and self._rx and self._rx[-1] != 0x0A):
+                        self._realtime(byte)
+                        continue
+                    if len(self._rx) >= self.rx_buffer_size:
+                        # The host sent more than the buffer holds
+                        self.overflow_bytes += 1
+                        if self.drop_on_overflow:
+                            continue
+                    self._rx.append(byte)
+                    if byte == 0x0A:
+                        end = len(self._rx)
+                        self._lines.append(end)
+                self.max_rx_used = max(self.max_rx_used, len(self._rx))
+                self._cond.notify_all()
+
+    def _next_line(self):
+        # Like Serial.readStringUntil('\n'): the line leaves the RX buffer before it is executed
+        with self._cond:
+            while self._running and not self._lines:
+                self._cond.wait(0.1)
+            if not self._running:
+                return None
+            end = self._lines.popleft()
+            raw = bytes(self._rx[:end])
+            del self._rx[:end]
+            self._lines = deque(pos - end for pos in self._lines)
+            return raw.decode('utf-8', 'replace').strip()
+
+    def _executor(self):
+        while self._running:
+            line = self._next_line()
+            if line is None:
+                break
+            self.lines_received += 1
+            if self.line_delay:
+                time.sleep(self.line_delay)
+            if line:
+                self.handle_line(line)
+
+    # --- Real-time commands (GRBL style) ---
+    def _realtime(self, byte):
+        if byte == ord('?'):
+            self._println(self.status_report())
+        elif byte == ord('!'):
+            self.handle_feed_hold()
+        elif byte == ord('~'):
+            self.handle_cycle_start()
+        elif byte == JOG_CANCEL:
+            # Only a running jog is stopped; a late cancel is dropped like in loop()
+            if self.jogging:
+                self.jog_cancel = True
+        elif byte == 0x18:
+            # Soft reset also discards whatever is waiting in the RX buffer
+            self._rx.clear()
+            self._lines.clear()
+            self.handle_reset()
+
+    def status_report(self):
+        x = self.pos_x_steps / self.steps_per_mm_x
+        y = self.pos_y_steps / self.steps_per_mm_y
+        rx_free = max(0, self.rx_buffer_size - len(self._rx))
+        return (f"<{self.state}|WPos:{x:.3f},{y:.3f},0.000|FS:{self.feed:.0f},0"
+                f"|Bf:{15 - min(15, len(self._lines))},{rx_free}|Ln:{self.lines_received}>")
+
+    # --- GCodeHandler::handleLine ---
+    def handle_line(self, line):
+        l = line.strip().upper()
+        if l in ("X+", "X-", "Y+", "Y-", "LIM?", "BUZ", "CLOCK"):
+            self.jog_command(l)
+        elif l in ("FEEDHOLD", "HOLD"):
+            self.handle_feed_hold()
+        elif l == "PAUSE":
+            self.is_paused = True
+            self.state = "Hold"
+            self._println("Pause activated. Motion paused.")
+        elif l in ("CYCLE", "START", "RESUME"):
+            self.handle_cycle_start()
+        elif l == "RESET":
+            self.handle_reset()
+        elif l in ("HOME", "$H"):
+            self.handle_home()
+        elif l.startswith("BAUD "):
+            self.handle_baud(l)
+        elif l.startswith("G"):
+            self.handle_gcode(l)
+        else:
+            self._println("Unknown command. Use X+/X-/Y+/Y-/LIM?/BUZ/CLOCK/FEEDHOLD/PAUSE/CYCLE/RESET/HOME or G-code")
+            self._println("error: unknown command")
+
+    def handle_baud(self, l):
+        # GCodeHandler::handleBaud; a pty has no line rate, only the wire-speed throttle follows it
+        try:
+            rate = int(l[5:])
+        except ValueError:
+            rate = 0
+        if rate not in BAUD_RATES:
+            self._println("error: unsupported baud rate")
+            return
+        self._println("ok")
+        if self.baudrate:
+            self.baudrate = rate
+
+    def jog_command(self, cmd):
+        if self.is_feed_hold or self.is_paused or self.is_homing:
+            self._println("Motion paused/held/homing/reset. Jog ignored.")
+            self._println("error: jog ignored")
+            return
+        if cmd == "X+":
+            if self.limit_x_pressed:
+                self._println("X+ limit reached! Movement blocked.")
+                self._println("error: move blocked")
+            else:
+                self._println("Jog X+")
+                self.pos_x_steps += self._jog_steps()
+                self._println("ok")
+        elif cmd == "X-":
+            self._println("Jog X-")
+            self.pos_x_steps -= self._jog_steps()
+            self._println("ok")
+        elif cmd == "Y+":
+            if self.limit_y_pressed:
+                self._println("Y+ limit reached! Movement blocked.")
+                self._println("error: move blocked")
+            else:
+                self._println("Jog Y+")
+                self.pos_y_steps += self._jog_steps()
+                self._println("ok")
+        elif cmd == "Y-":
+            self._println("Jog Y-")
+            self.pos_y_steps -= self._jog_steps()
+            self._println("ok")
+        elif cmd == "LIM?":
+            self._println(f"X limit: {'PRESSED' if self.limit_x_pressed else 'OPEN'} | "
+                          f"Y limit: {'PRESSED' if self.limit_y_pressed else 'OPEN'}")
+        elif cmd == "BUZ":
+            self._println("Buzzer test")
+        elif cmd == "CLOCK":
+            self._println("Current time: " + time.strftime("%Y/%m/%d %H:%M:%S"))
+
+    def _jog_steps(self):
+        # GCodeHandler::jogSteps: 1 ms per step, stopped by a 0x85 byte
+        self.jog_cancel = False
+        self.jogging = True
+        done = self._spend_steps(JOG_STEPS, 1.0)
+        self.jogging = False
+        if self.jog_cancel:
+            self.jog_cancel = False
+            self._println("Jog cancelled")
+        return done
+
+    def handle_gcode(self, l):
+        if not (l.startswith("G0") or l.startswith("G1")):
+            self._println("Unknown or unsupported G-code")
+            self._println("ok")
+            return
+        self.gcode_lines += 1
+        if (self.error_every and self.gcode_lines % self.error_every == 0) or \
+                (self.error_rate and self.random.random() < self.error_rate):
+            self.errors_injected += 1
+            self._println("error: injected")
+            return
+        words = {}
+        i = 0
+        while i < len(l):
+            code = l[i]
+            i += 1
+            if code in "XYF":
+                start = i
+                while i < len(l) and (l[i].isdigit() or l[i] in ".-"):
+                    i += 1
+                if code not in words:
+                    try:
+                        words[code] = float(l[start:i])
+                    except ValueError:
+                        words[code] = 0.0
+        target_x = round(words["X"] * self.steps_per_mm_x) if "X" in words else self.pos_x_steps
+        target_y = round(words["Y"] * self.steps_per_mm_y) if "Y" in words else self.pos_y_steps
+        self.move_to(target_x, target_y, words.get("F", self.default_feedrate))
+
+    def move_to(self, target_x, target_y, feedrate):
+        if self.is_feed_hold or self.is_paused or self.is_homing:
+            self._println("Motion paused/held/homing/reset. Move ignored.")
+            self._println("error: move ignored")
+            return
+        dx = target_x - self.pos_x_steps
+        dy = target_y - self.pos_y_steps
+        if dx and self.limit_x_pressed:
+            self._println("X limit reached! Move blocked.")
+            self._println("error: move blocked")
+            return
+        if dy and self.limit_y_pressed:
+            self._println("Y limit reached! Move blocked.")
+            self._println("error: move blocked")
+            return
+        dist_mm = math.hypot(dx / self.steps_per_mm_x, dy / self.steps_per_mm_y)
+        if dist_mm < MIN_MOVE_MM:
+            self._println("No move")
+            self._println("ok")
+            return
+        feed = feedrate if feedrate > 0 else self.default_feedrate
+        self.feed = feed
+        total_steps = max(abs(dx), abs(dy), 1)
+        step_delay_ms = max(dist_mm / feed * 60000.0 / total_steps, MIN_STEP_DELAY_MS)
+        self.state = "Run"
+        done = self._spend_steps(total_steps, step_delay_ms)
+        if done < total_steps:
+            self._println("Motion interrupted by feed hold/pause/reset/homing.")
+        self.pos_x_steps += round(dx * done / total_steps)
+        self.pos_y_steps += round(dy * done / total_steps)
+        if self.state == "Run":
+            self.state = "Idle"
+        self._println("ok")
+
+    def _spend_steps(self, steps, step_delay_ms):
+        # Sleeps the modelled move time in slices so feed hold/reset can interrupt; returns steps done
+        if not self.simulate_motion or self.time_scale <= 0:
+            return steps
+        duration = steps * step_delay_ms / 1000.0 * self.time_scale
+        start = time.monotonic()
+        while True:
+            elapsed = time.monotonic() - start
+            if elapsed >= duration:
+                return steps
+            if self.is_feed_hold or self.is_paused or self.jog_cancel or not self._running:
+                return int(steps * elapsed / duration)
+            time.sleep(min(0.005, duration - elapsed))
+
+    def handle_feed_hold(self):
+        self.is_feed_hold = True
+        self.state = "Hold"
+        self._println("Feed hold activated. Motion paused.")
+
+    def handle_cycle_start(self):
+        if self.is_feed_hold or self.is_paused:
+            self.is_feed_hold = False
+            self.is_paused = False
+            self.state = "Idle"
+            self._println("Cycle start. Motion resumed.")
+        else:
+            self._println("Not paused or held. Nothing to resume.")
+
+    def handle_reset(self):
+        self.is_feed_hold = False
+        self.is_paused = False
+        self.pos_x_steps = 0
+        self.pos_y_steps = 0
+        self.state = "Idle"
+        self._println("Resetting system. All motion stopped. State reset.")
+
+    def handle_home(self):
+        self.is_homing = True
+        self.state = "Home"
+        self._println("Homing started...")
+        self.pos_x_steps = 0
+        self.pos_y_steps = 0
+        self.is_homing = False
+        self.state = "Idle"
+        self._println("Homing complete.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated JogTrainer board on a pseudo-terminal")
+    parser.add_argument("--rx-buffer", type=int, default=ARDUINO_RX_BUFFER_SIZE, help="RX buffer size in bytes")
+    parser.add_argument("--line-delay", type=float, default=0.0, help="processing time per line, seconds")
+    parser.add_argument("--motion", action="store_true", help="also spend the modelled move time")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="move time multiplier with --motion")
+    parser.add_argument("--error-every", type=int, default=0, help="inject an error every N G-code lines")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="inject errors at this random rate")
+    parser.add_argument("--baud", type=int, default=None, help="throttle input to this wire speed")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    device = SimulatedDevice(rx_buffer_size=args.rx_buffer, line_delay=args.line_delay,
+                             simulate_motion=args.motion, time_scale=args.time_scale,
+                             error_every=args.error_every, error_rate=args.error_rate,
+                             baudrate=args.baud, seed=args.seed)
+    port = device.start()
+    print(f"Simulated JogTrainer on {port} (Ctrl-C to stop)", flush=True)
+    try:
+        while True:
+            time.sleep(5)
+            print(device.get_stats(), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        device.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Session telemetry: an append-only binary log of everything on the serial link.
+
+Each file starts with a header (magic, wall-clock and monotonic time at
+creation) followed by records of
+
+    float64 monotonic time | uint8 kind | uint16 payload length | payload
+
+Text payloads (sent lines, replies, status reports) are UTF-8; positions
+are float32 per axis and ack latencies one float32 in seconds. Files are
+rotated by size and the oldest are removed beyond max_files.
+
+Replay a session into the app with `python main.py --replay <file or dir>`,
+or dump it with `python -m controller.telemetry <file or dir>`.
+"""
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+from controller.toolpath import CACHE_DIR
+
+TELEMETRY_DIR = os.path.join(os.path.dirname(CACHE_DIR), 'telemetry')
+MAX_FILE_BYTES = 8 * 1024 * 1024
+MAX_FILES = 20
+FLUSH_INTERVAL = 0.25  # seconds between batched writes
+
+_MAGIC = b"JTTLM001"
+_FILE_HEADER = struct.Struct("<8sdd")
+_RECORD = struct.Struct("<dBH")
+_LATENCY = struct.Struct("<f")
+MAX_PAYLOAD = 0xFFFF
+
+KIND_TX = 1        # line written to the port
+KIND_REALTIME = 2  # single real-time byte
+KIND_RX = 3        # line received, other than status reports
+KIND_STATUS = 4    # '<...>' status report
+KIND_POSITION = 5  # position from a status report
+KIND_ACK = 6       # seconds from a line being written to its ok/error
+KIND_EVENT = 7     # free text, e.g. connect/disconnect
+
+KIND_NAMES = {KIND_TX: "tx", KIND_REALTIME: "rt", KIND_RX: "rx", KIND_STATUS: "status",
+              KIND_POSITION: "pos", KIND_ACK: "ack", KIND_EVENT: "event"}
+
+
+class TelemetryRecorder:
+    """Records serial traffic from any thread; a background thread writes it in batches.
+
+    The record methods only append a tuple to a deque, so they are safe to
+    call from the serial reader. Ack latency is measured by matching each
+    ok/error to the oldest line still waiting for one, which holds for GRBL
+    and the JogTrainer sketch as long as lines that get no ok (the sketch's
+    LIM?/BUZ/CLOCK/FEEDHOLD/...) are passed with expects_ack=False. Lines
+    still waiting are dropped on a soft reset and on every event, which
+    marks a connect or disconnect.
+    """
+
+    def __init__(self, directory=TELEMETRY_DIR, max_bytes=MAX_FILE_BYTES, max_files=MAX_FILES,
+                 flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self.records_written = 0
+        self.bytes_written = 0
+        self.path = None
+        self._queue = deque()
+        self._sent_at = deque(maxlen=256)
+        self._file = None
+        self._size = 0
+        self._sequence = 0
+        self._stop_event = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._open_file()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # --- Called from the controller ---
+    def tx(self, line, expects_ack=True):
+        now = time.monotonic()
+        if expects_ack:
+            self._sent_at.append(now)
+        self._queue.append((now, KIND_TX, line))
+
+    def realtime(self, char):
+        if char == '\x18':
+            self._sent_at.clear()  # GRBL drops its buffered lines without acks
+        self._queue.append((time.monotonic(), KIND_REALTIME, char))
+
+    def rx(self, line):
+        now = time.monotonic()
+        self._queue.append((now, KIND_RX, line))
+        if (line == 'ok' or line.startswith('error')) and self._sent_at:
+            self._queue.append((now, KIND_ACK, now - self._sent_at.popleft()))
+
+    def status(self, line, position=None):
+        now = time.monotonic()
+        self._queue.append((now, KIND_STATUS, line))
+        if position is not None:
+            self._queue.append((now, KIND_POSITION, position))
+
+    def event(self, text):
+        self._sent_at.clear()
+        self._queue.append((time.monotonic(), KIND_EVENT, text))
+
+    # --- Writer thread ---
+    def close(self):
+        self._stop_event.set()
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+        self._write_batch()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self._write_batch()
+            except OSError as e:
+                print(f"Telemetry recording stopped: {e}")
+                self._queue.clear()
+                return
+
+    def _write_batch(self):
+        queue = self._queue
+        if not queue or self._file is None:
+            return
+        buf = bytearray()
+        count = 0
+        for _ in range(len(queue)):
+            t, kind, value = queue.popleft()
+            if kind == KIND_POSITION:
+                payload = struct.pack(f"<{len(value)}f", *value)
+            elif kind == KIND_ACK:
+                payload = _LATENCY.pack(value)
+            else:
+                payload = value.encode('utf-8', 'replace')[:MAX_PAYLOAD]
+            buf += _RECORD.pack(t, kind, len(payload))
+            buf += payload
+            count += 1
+        self._file.write(buf)
+        self._file.flush()
+        self._size += len(buf)
+        self.records_written += count
+        self.bytes_written += len(buf)
+        if self._size >= self.max_bytes:
+            self._file.close()
+            self._open_file()
+
+    def _open_file(self):
+        self._sequence += 1
+        name = f"session-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence:03d}.jtl"
+        self.path = os.path.join(self.directory, name)
+        self._file = open(self.path, 'ab')
+        self._file.write(_FILE_HEADER.pack(_MAGIC, time.time(), time.monotonic()))
+        self._size = _FILE_HEADER.size
+        self._remove_old_files()
+
+    def _remove_old_files(self):
+        files = session_files(self.directory)
+        for path in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def session_files(path):
+    """Telemetry files at path (a file or a directory), oldest first."""
+    if os.path.isfile(path):
+        return [path]
+    files = [os.path.join(path, name) for name in os.listdir(path) if name.endswith('.jtl')]
+    return sorted(files, key=os.path.getmtime)
+
+
+def read_records(path):
+    """Yield (monotonic time, kind, value) from one telemetry file; a truncated tail is ignored."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _FILE_HEADER.size:
+        return
+    magic, _, _ = _FILE_HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError(f"{path} is not a telemetry file")
+    offset = _FILE_HEADER.size
+    end = len(data)
+    while offset + _RECORD.size <= end:
+        t, kind, length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        if offset + length > end:
+            break
+        payload = data[offset:offset + length]
+        offset += length
+        if kind == KIND_POSITION:
+            value = struct.unpack(f"<{length // 4}f", payload)
+        elif kind == KIND_ACK:
+            value = _LATENCY.unpack(payload)[0]
+        else:
+            value = payload.decode('utf-8', 'replace')
+        yield t, kind, value
+
+
+class TelemetryReplayer:
+    """Feeds a recorded session back through the controller callbacks.
+
+    Records are replayed with their original spacing divided by speed
+    (0 replays as fast as possible); the callbacks receive the same
+    arguments GRBLController passes, so the app's handlers work unchanged.
+    """
+
+    def __init__(self, path, on_status_change=None, on_position_update=None, on_log=None, speed=1.0,
+                 machine_state=None):
+        self.files = session_files(path)
+        self.on_status_change = on_status_change
+        self.on_position_update = on_position_update
+        self.machine_state = machine_state  # MachineState to receive positions as floats
+        self.on_log = on_log
+        self.speed = speed
+        self.records_replayed = 0
+        self._stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        if self.on_status_change:
+            self.on_status_change("Replay", f"Replaying {len(self.files)} telemetry file(s)")
+        for path in self.files:
+            start = None
+            begin = time.monotonic()
+            for t, kind, value in read_records(path):
+                if start is None:
+                    start = t
+                if self.speed > 0:
+                    delay = (t - start) / self.speed - (time.monotonic() - begin)
+                    if delay > 0 and self._stop_event.wait(delay):
+                        return
+                elif self._stop_event.is_set():
+                    return
+                self._dispatch(kind, value)
+                self.records_replayed += 1
+        if self.on_status_change:
+            self.on_status_change("Replay", f"Replay finished, {self.records_replayed} records")
+
+    def _dispatch(self, kind, value):
+        if kind == KIND_TX:
+            if self.on_log:
+                self.on_log(f"Sent: {value}")
+        elif kind == KIND_REALTIME:
+            if value != '?' and self.on_log:
+                self.on_log(f"Sent realtime: {value!r}")
+        elif kind == KIND_RX:
+            if self.on_log:
+                self.on_log(f"GRBL: {value}")
+        elif kind == KIND_STATUS:
+            if self.on_status_change:
+                self.on_status_change(value[1:-1].split('|')[0].split(':')[0], value)
+        elif kind == KIND_POSITION:
+            if self.machine_state is not None:
+                self.machine_state.set_position(value)
+            if self.on_position_update:
+                self.on_position_update(','.join(f"{v:.3f}" for v in value))
+        elif kind == KIND_EVENT:
+            if self.on_log:
+                self.on_log(f"[{value}]")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print a JogTrainer telemetry log")
+    parser.add_argument("path", nargs='?', default=TELEMETRY_DIR, help="telemetry file or directory")
+    parser.add_argument("--kind", choices=sorted(KIND_NAMES.values()), action='append',
+                        help="only show these record kinds")
+    args = parser.parse_args(argv)
+
+    kinds = {k for k, name in KIND_NAMES.items() if not args.kind or name in args.kind}
+    for path in session_files(args.path):
+        start = None
+        for t, kind, value in read_records(path):
+            if start is None:
+                start = t
+            if kind not in kinds:
+                continue
+            if kind == KIND_ACK:
+                value = f"{value * 1000:.2f} ms"
+            print(f"{t - start:12.6f} {KIND_NAMES.get(kind, kind):6} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
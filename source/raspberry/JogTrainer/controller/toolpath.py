@@ -0,0 +1,241 @@
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+# Opcodes
+OP_RAPID = 0     # G0
+OP_LINEAR = 1    # G1
+OP_ARC_CW = 2    # G2
+OP_ARC_CCW = 3   # G3
+OP_OTHER = 255   # anything else, sent as written
+
+# Modal state in effect for a command
+MODAL_RELATIVE = 0x01  # G91
+MODAL_INCHES = 0x02    # G20
+
+# Words present on the source line
+WORD_X = 0x01
+WORD_Y = 0x02
+WORD_F = 0x04
+WORD_OTHER = 0x08  # any word besides the motion G code and X/Y/F
+WORD_INEXACT = 0x10  # an X/Y/F value the compact form would not reproduce
+
+MM_PER_INCH = 25.4
+
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'jogtrainer', 'toolpaths')
+_CACHE_MAGIC = b"JTPATH02"
+_CACHE_HEADER = struct.Struct("<8sQ")  # magic, command count
+
+_WORD = re.compile(r'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))')
+_COMMENT = re.compile(r'\(.*?\)|;.*')
+
+# (attribute, typecode); also the on-disk order
+_FIELDS = (
+    ('op', 'B'),
+    ('modal', 'B'),
+    ('words', 'B'),
+    ('x', 'f'),     # absolute X after the command, mm
+    ('y', 'f'),     # absolute Y after the command, mm
+    ('feed', 'f'),  # modal feed rate, mm/min
+    ('line', 'I'),  # 0-based source line
+)
+
+
+def strip_comments(text):
+    return _COMMENT.sub('', text).strip()
+
+
+def _fmt(value):
+    text = ('%.4f' % value).rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+def _keeps(value):
+    # True when _fmt() of the value stored as float32 reads back as written
+    if value is None:
+        return True
+    if -1024.0 < value < 1024.0:
+        # float32 is within 3.1e-5 here, so %.4f recovers anything with four decimals
+        scaled = value * 10000.0
+        return abs(scaled - round(scaled)) < 1e-6
+    return float(_fmt(array('f', (value,))[0])) == value
+
+
+class Toolpath:
+    """Compiled program: one entry per command in parallel typed arrays."""
+
+    def __init__(self):
+        for name, typecode in _FIELDS:
+            setattr(self, name, array(typecode))
+        # Command index -> text to send instead of the source line (fitted arcs); not cached
+        self.text = {}
+
+    def __len__(self):
+        return len(self.op)
+
+    def append(self, op, modal, words, x, y, feed, line):
+        self.op.append(op)
+        self.modal.append(modal)
+        self.words.append(words)
+        self.x.append(x)
+        self.y.append(y)
+        self.feed.append(feed)
+        self.line.append(line)
+
+    def index_of_line(self, line_index):
+        # First command at or after the given source line
+        return bisect_left(self.line, line_index)
+
+    def format_command(self, i):
+        """Compact text for plain G0/G1 moves in G90/G21 with exact values (or generated text), None when the source line must be sent as written."""
+        if self.text and i in self.text:
+            return self.text[i]
+        op = self.op[i]
+        words = self.words[i]
+        if op > OP_LINEAR or self.modal[i] or words & (WORD_OTHER | WORD_INEXACT):
+            return None
+        parts = ['G1' if op else 'G0']
+        if words & WORD_X:
+            parts.append('X' + _fmt(self.x[i]))
+        if words & WORD_Y:
+            parts.append('Y' + _fmt(self.y[i]))
+        if words & WORD_F:
+            parts.append('F' + _fmt(self.feed[i]))
+        return ''.join(parts)
+
+    def iter_commands(self, source, start=0):
+        """Yield (line_index, text) to send, starting at command index start."""
+        op, line = self.op, self.line
+        for i in range(start, len(op)):
+            text = self.format_command(i)
+            if text is None:
+                text = strip_comments(source.line_at(line[i]))
+            yield line[i], text
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, len(self)))
+            for name, _ in _FIELDS:
+                values = getattr(self, name)
+                if sys.byteorder == 'big':
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        toolpath = cls()
+        with open(path, 'rb') as f:
+            magic, count = _CACHE_HEADER.unpack(f.read(_CACHE_HEADER.size))
+            if magic != _CACHE_MAGIC:
+                raise ValueError(f"Not a compiled toolpath: {path}")
+            for name, _ in _FIELDS:
+                values = getattr(toolpath, name)
+                values.fromfile(f, count)
+                if sys.byteorder == 'big':
+                    values.byteswap()
+        return toolpath
+
+
+_MOTION_CODES = ('0', '00', '1', '01', '2', '02', '3', '03')
+
+
+def parse_words(code, modal, motion):
+    """Tokenize one upper-case line without comments, given the modal state before it.
+
+    Returns (op, words, modal, motion, x, y, f): the opcode, the WORD_* flags,
+    the modal state and motion mode after the line, and the X/Y/F values as
+    written (None when absent). Shared by compile_lines() and MachineState.
+    """
+    found = _WORD.findall(code)
+    if not found or code[0] == '$':
+        return OP_OTHER, WORD_OTHER, modal, motion, None, None, None
+    op = None
+    words = 0
+    nx = ny = nf = None
+    for letter, value in found:
+        if letter == 'X':
+            nx = float(value)
+            words |= WORD_X
+        elif letter == 'Y':
+            ny = float(value)
+            words |= WORD_Y
+        elif letter == 'F':
+            nf = float(value)
+            words |= WORD_F
+        elif letter == 'G' and value in _MOTION_CODES:
+            motion = op = int(value)
+        else:
+            words |= WORD_OTHER
+            if letter == 'G':
+                g = float(value)
+                if g == 90:
+                    modal &= ~MODAL_RELATIVE
+                elif g == 91:
+                    modal |= MODAL_RELATIVE
+                elif g == 20:
+                    modal |= MODAL_INCHES
+                elif g == 21:
+                    modal &= ~MODAL_INCHES
+                elif op is not None:
+                    op = OP_OTHER  # e.g. G0 together with G28/G92: not a plain move
+    if op is None:
+        # Bare "X10 Y5" continues the modal motion
+        op = motion if words & (WORD_X | WORD_Y) and not words & WORD_OTHER else OP_OTHER
+    return op, words, modal, motion, nx, ny, nf
+
+
+def move_target(modal, x, y, nx, ny):
+    """Absolute position in mm after a move from (x, y) to the words nx/ny (None when absent)."""
+    scale = MM_PER_INCH if modal & MODAL_INCHES else 1.0
+    if modal & MODAL_RELATIVE:
+        return x + (nx or 0.0) * scale, y + (ny or 0.0) * scale
+    return (x if nx is None else nx * scale), (y if ny is None else ny * scale)
+
+
+def compile_lines(lines):
+    """Tokenize (line_index, text) pairs once into a Toolpath."""
+    toolpath = Toolpath()
+    append = toolpath.append
+    x = y = feed = 0.0
+    modal = 0
+    motion = OP_RAPID
+    for line_index, text in lines:
+        code = strip_comments(text).upper()
+        if not code:
+            continue
+        op, words, modal, motion, nx, ny, nf = parse_words(code, modal, motion)
+        if nf is not None:
+            feed = nf * MM_PER_INCH if modal & MODAL_INCHES else nf
+        if op != OP_OTHER:
+            x, y = move_target(modal, x, y, nx, ny)
+            if not modal and not (_keeps(nx) and _keeps(ny) and _keeps(nf)):
+                words |= WORD_INEXACT
+        append(op, modal, words, x, y, feed, line_index)
+    return toolpath
+
+
+def compile_program(gcode_file, cache_dir=CACHE_DIR, use_cache=True):
+    """Compile a GcodeFile, reusing the on-disk result for identical content."""
+    cache_path = None
+    if use_cache:
+        cache_path = os.path.join(cache_dir, gcode_file.content_hash() + '.jtp')
+        try:
+            return Toolpath.load(cache_path)
+        except (OSError, EOFError, ValueError, struct.error):
+            pass
+    toolpath = compile_lines(gcode_file.iter_lines())
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            toolpath.save(cache_path)
+        except OSError:
+            pass
+    return toolpath
@@ -1,21 +1,101 @@
+import time
+_STARTED = time.perf_counter()
+
 import customtkinter as ctk
-from tkinter import filedialog, PhotoImage, messagebox
+from tkinter import filedialog, messagebox
+import argparse
+import json
 import os
+import sys
+import threading
 
 from ui_components.jog_panel import JogPanel
 from ui_components.file_upload import FileUploadFrame
 from ui_components.status_bar import StatusBar
 from ui_components.connection_panel import ConnectionPanel
-from controller.grbl_serial import GRBLController
-from controller.gcode_sender import GcodeSender
+from ui_components.update_pipeline import UIUpdatePipeline, BoundedLog
+from controller.jog_controller import PROTOCOL_ARDUINO
+from controller.machine_state import POSITION
+# pyserial, numpy (estimator, optimizer, preview) and the rest of the
+# controller stack are imported in finish_startup() or where first used
 
 # Set theme and appearance
 ctk.set_appearance_mode("System")  # Options: "Light", "Dark", "System"
 ctk.set_default_color_theme("blue")  # You can use "green", "dark-blue", etc.
 
+UI_UPDATE_RATE_HZ = 30
+LOG_MAX_LINES = 500
+# '?' status polling needs GRBL-compatible firmware; 0 keeps it off for the Arduino sketch
+STATUS_POLL_RATE_HZ = 0
+# Merge CAM segments closer than this to a straight line (mm) before sending; 0 sends the program as compiled
+OPTIMIZE_TOLERANCE_MM = 0.01
+PREVIEW_SIZE = (150, 90)
+# Press and hold the jog buttons to move continuously; False sends one jog per click
+HOLD_TO_JOG = True
+JOG_PROTOCOL = PROTOCOL_ARDUINO
+# Append all serial traffic to ~/.cache/jogtrainer/telemetry for later replay
+RECORD_TELEMETRY = True
+# Time every streamed line (write, ack, UI callbacks) and log a summary while a job runs
+PROFILE_STREAMING = False
+PROFILE_LOG_INTERVAL = 5.0  # seconds between summaries
+# Serial rate after reset, or "auto" to find it; FAST_BAUDRATE asks the sketch to switch up
+# after connecting (a rate such as 500000, or "auto" for the fastest the USB adapter keeps up with)
+SERIAL_BAUDRATE = 115200
+FAST_BAUDRATE = None
+# Cold start target from the first line of main.py to the first frame on screen
+STARTUP_BUDGET_MS = 1500
+# Last port scan, shown before the next one finishes
+PORT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'jogtrainer', 'ports.json')
+
+
+class StartupTimer:
+    """Named timestamps from process start, reported once the app is ready."""
+
+    def __init__(self, started):
+        self.marks = [("start", started)]
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def elapsed_ms(self, name):
+        for mark, t in self.marks:
+            if mark == name:
+                return (t - self.marks[0][1]) * 1000
+        return None
+
+    def over_budget(self, budget_ms=STARTUP_BUDGET_MS):
+        first_frame = self.elapsed_ms("first frame")
+        return first_frame is not None and first_frame > budget_ms
+
+    def report(self, budget_ms=STARTUP_BUDGET_MS):
+        steps = ", ".join(f"{name} +{(t - prev) * 1000:.0f} ms"
+                          for (_, prev), (name, t) in zip(self.marks, self.marks[1:]))
+        first_frame = self.elapsed_ms("first frame")
+        text = f"Startup: {steps}; first frame at {first_frame:.0f} ms (budget {budget_ms} ms)"
+        return text + (" - OVER BUDGET" if self.over_budget(budget_ms) else "")
+
+
+def load_cached_ports(path=PORT_CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def save_cached_ports(ports, path=PORT_CACHE_PATH):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(ports, f)
+    except OSError:
+        pass
+
 
 class JogTrainerApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, replay=None, replay_speed=1.0, startup=None):
+        self.startup = startup or StartupTimer(_STARTED)
+        self.startup.mark("imports")
         super().__init__()
 
         # --- Log Area ---
@@ -23,14 +103,26 @@ class JogTrainerApp(ctk.CTk):
         self.log_frame.grid(row=4, column=0, columnspan=4, sticky="ew", padx=10, pady=(0, 10))
         self.log_textbox = ctk.CTkTextbox(self.log_frame, height=80, width=780, state="disabled")
         self.log_textbox.pack(fill="both", expand=True)
-
-        # GRBL Controller
-        self.controller = GRBLController(
-            on_status_change=self.update_status,
-            on_position_update=self.update_position,
-            on_log=self.append_log
-        )
-        self.gcode_sender = GcodeSender(self.controller, on_progress=self.update_progress)
+        self.log = BoundedLog(self.log_textbox, max_lines=LOG_MAX_LINES)
+
+        # Controller and sender callbacks run on worker threads; they only post
+        # here, and the pipeline applies them to the widgets on the Tk thread
+        self.ui_updates = UIUpdatePipeline(self, log_sink=self.log.append_lines, rate_hz=UI_UPDATE_RATE_HZ)
+        self.ui_updates.register("status", self.update_status)
+        self.ui_updates.register("position", self.update_position)
+        self.ui_updates.register("progress", self.update_progress)
+
+        # Built in finish_startup(), after the first frame
+        self.controller = None
+        self.gcode_sender = None
+        self.jogger = None
+        self.recorder = None
+        self.replayer = None
+        self.checkpoint = None
+        self.toolpath_preview = None
+        self.job_estimate = None
+        self.preflight = None
+        self.profile_logged_at = 0.0
 
         # Window setup
         self.title("CNC Jog Trainer")
@@ -65,7 +157,10 @@ class JogTrainerApp(ctk.CTk):
             "y+": self.jog_y_plus_manual,
             "y-": self.jog_y_minus_manual
         }
-        self.jog_panel = JogPanel(self.main_frame, jog_commands, fg_color="transparent")
+        self.jog_panel = JogPanel(self.main_frame, jog_commands,
+                                  on_jog_press=self.jog_press if HOLD_TO_JOG else None,
+                                  on_jog_release=self.jog_release if HOLD_TO_JOG else None,
+                                  fg_color="transparent")
         self.jog_panel.grid(row=0, column=0, rowspan=3, columnspan=2, sticky="nsew", padx=5, pady=5)
         
         # Machine Controls
@@ -92,30 +187,130 @@ class JogTrainerApp(ctk.CTk):
         self.file_upload_frame = FileUploadFrame(self, self.upload_file, self.start_gcode_job, fg_color="transparent")
         self.file_upload_frame.grid(row=3, column=0, columnspan=4, sticky="ew", padx=10, pady=5)
         
+        # Ports from the last scan; the real scan runs in the background
+        self.connection_panel.set_ports(load_cached_ports())
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.startup.mark("window")
+        self.after_idle(self.finish_startup, replay, replay_speed)
+
+    def finish_startup(self, replay, replay_speed):
+        # Runs on the first idle pass of the main loop, once the window has been drawn
+        self.update_idletasks()
+        self.startup.mark("first frame")
+
+        from controller.grbl_serial import GRBLController
+        from controller.gcode_sender import GcodeSender, MODE_CHAR_COUNT, ARDUINO_RX_BUFFER_SIZE
+        from controller.checkpoint import JobCheckpoint
+        from controller.jog_controller import HoldJogger
+        from controller.telemetry import TelemetryRecorder, TelemetryReplayer
+        from controller.profiler import StreamProfiler
+        from ui_components.toolpath_preview import ToolpathPreview
+
+        # GRBL Controller
+        self.controller = GRBLController(
+            on_status_change=self.post_status,
+            on_log=self.append_log
+        )
+        self.controller.state.add_listener(self.on_machine_state)
+        if RECORD_TELEMETRY and not replay:
+            try:
+                self.recorder = TelemetryRecorder()
+                self.controller.recorder = self.recorder
+            except OSError as e:
+                print(f"Telemetry recording disabled: {e}")
+        if PROFILE_STREAMING:
+            self.controller.profiler = StreamProfiler()
+        if replay:
+            # Post-mortem: a recorded session drives the same UI callbacks instead of a port
+            try:
+                self.replayer = TelemetryReplayer(
+                    replay,
+                    on_status_change=self.post_status,
+                    on_log=self.append_log,
+                    speed=replay_speed,
+                    machine_state=self.controller.state)
+            except OSError as e:
+                self.append_log(f"Cannot replay {replay}: {e}")
+        try:
+            self.checkpoint = JobCheckpoint()
+        except OSError as e:
+            print(f"Job checkpoints disabled: {e}")
+            self.checkpoint = None
+        self.gcode_sender = GcodeSender(
+            self.controller,
+            on_progress=lambda *args: self.ui_updates.post_latest("progress", *args),
+            on_error=lambda *args: self.ui_updates.post_event(self.on_gcode_error, *args),
+            mode=MODE_CHAR_COUNT,
+            rx_buffer_size=ARDUINO_RX_BUFFER_SIZE,
+            checkpoint=self.checkpoint
+        )
+        self.jogger = HoldJogger(self.controller, protocol=JOG_PROTOCOL, on_log=self.append_log)
+
+        # Toolpath preview in the free cell under Pause
+        self.toolpath_preview = ToolpathPreview(self.main_frame, width=PREVIEW_SIZE[0], height=PREVIEW_SIZE[1], fg_color="transparent")
+        self.toolpath_preview.grid(row=2, column=2, padx=5, pady=5)
 
         self.refresh_ports()
-        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.ui_updates.start()
+        if self.replayer:
+            self.replayer.start()
+        self.startup.mark("ready")
+        self.append_log(self.startup.report())
+
     def append_log(self, message):
-        self.log_textbox.configure(state="normal")
-        self.log_textbox.insert("end", message + "\n")
-        self.log_textbox.see("end")
-        self.log_textbox.configure(state="disabled")
+        # Safe from any thread; written in bulk on the next UI tick
+        self.ui_updates.post_log(message)
+
+    def post_status(self, status, line):
+        if status == "Error":
+            # Never coalesce errors away
+            self.ui_updates.post_event(self.update_status, status, line)
+        else:
+            self.ui_updates.post_latest("status", status, line)
 
     def on_closing(self):
-        self.controller.disconnect()
+        self.ui_updates.stop()
+        if self.controller:
+            self.controller.disconnect()
+        if self.replayer:
+            self.replayer.stop()
+        if self.recorder:
+            self.recorder.close()
+        if self.checkpoint:
+            self.checkpoint.close()
         self.destroy()
 
     # --- Controller Methods ---
+    def controller_ready(self):
+        # Buttons can be pressed before finish_startup() has built the controller
+        if self.controller is None:
+            self.append_log("Still starting up, try again in a moment")
+            return False
+        return True
+
     def refresh_ports(self):
+        # Enumeration can take a while on the Pi; never on the Tk thread
+        if not self.controller_ready():
+            return
+        threading.Thread(target=self.scan_ports, daemon=True).start()
+
+    def scan_ports(self):
         ports = self.controller.list_ports()
-        self.connection_panel.set_ports(ports)
+        save_cached_ports(ports)
+        self.ui_updates.post_event(self.connection_panel.set_ports, ports)
 
     def connect_controller(self, port):
+        if not self.controller_ready():
+            return
         if port and port != "-":
-            is_connected = self.controller.connect(port)
+            is_connected = self.controller.connect(port, SERIAL_BAUDRATE, FAST_BAUDRATE)
             self.connection_panel.set_connection_state(is_connected)
+            if is_connected and STATUS_POLL_RATE_HZ:
+                self.controller.start_status_poller(STATUS_POLL_RATE_HZ)
 
     def disconnect_controller(self):
+        if not self.controller_ready():
+            return
         self.controller.disconnect()
         self.connection_panel.set_connection_state(False)
 
@@ -126,84 +321,245 @@ class JogTrainerApp(ctk.CTk):
         if status == "Error":
             messagebox.showerror("Connection Error", line)
 
-    def update_position(self, pos_str):
-        try:
-            # pos_str is like "0.000,0.000,0.000"
-            x, y, z = map(float, pos_str.split(','))
-            self.status_bar.set_position(x, y, z)
-        except ValueError as e:
-            print(f"Could not parse position: {pos_str}, error: {e}")
+    def on_machine_state(self, state, changed):
+        # Controller thread: only fields that changed are posted
+        if changed & POSITION:
+            self.ui_updates.post_latest("position", *state.position)
+
+    def update_position(self, x, y, z):
+        self.status_bar.set_position(x, y, z)
 
     def update_progress(self, progress, lines_sent, total_lines):
-        self.file_upload_frame.update_progress(progress)
-        self.append_log(f"Progress: {progress*100:.1f}% ({lines_sent}/{total_lines})")
+        estimate = self.job_estimate
+        if estimate is not None and self.gcode_sender.toolpath is not None:
+            from controller.estimator import format_duration  # loaded by compile_gcode()
+            # Time-weighted: long moves count for more than short ones
+            elapsed = self.gcode_sender.get_stats()["elapsed"]
+            line = self.controller.state.line  # last acknowledged line
+            eta = estimate.eta(line, elapsed)
+            self.file_upload_frame.update_progress(estimate.fraction_done(line), f"ETA {format_duration(eta)}")
+        else:
+            self.file_upload_frame.update_progress(progress)
+        if self.toolpath_preview:
+            self.toolpath_preview.set_progress(lines_sent - 1)
+        self.append_log(f"Progress: {progress*100:.1f}% ({lines_sent}/{total_lines}, {self.gcode_sender.lines_per_sec:.1f} lines/sec)")
+        self.log_profile(final=progress == 1)
         if progress == 1:
             self.file_upload_frame.set_running_state(False)
 
+    def log_profile(self, final=False):
+        profiler = self.controller.profiler
+        if profiler is None:
+            return
+        now = time.monotonic()
+        if final:
+            self.append_log(profiler.dump(self.gcode_sender.program, count=10))
+        elif now - self.profile_logged_at >= PROFILE_LOG_INTERVAL:
+            self.append_log(profiler.format_summary())
+        else:
+            return
+        self.profile_logged_at = now
+
+    def on_gcode_error(self, line_number, line, response):
+        self.append_log(f"Job halted at line {line_number}: {line} -> {response}")
+        self.log_profile(final=True)
+        self.file_upload_frame.set_running_state(False)
+
 
     # --- Command Methods (Placeholders) ---
     def jog_x_plus(self):
-        self.controller.send_command("$J=G91 X1 F500")
+        self.send_manual("$J=G91 X1 F500")
     def jog_y_plus(self):
-        self.controller.send_command("$J=G91 Y1 F500")
+        self.send_manual("$J=G91 Y1 F500")
     def jog_y_minus(self):
-        self.controller.send_command("$J=G91 Y-1 F500")
+        self.send_manual("$J=G91 Y-1 F500")
     def jog_x_minus(self):
-        self.controller.send_command("$J=G91 X-1 F500")
+        self.send_manual("$J=G91 X-1 F500")
 
     # --- Manual Jog Methods for Arduino Protocol ---
     def jog_x_plus_manual(self):
-        self.controller.send_command("X+")
+        self.send_manual("X+")
 
     def jog_x_minus_manual(self):
-        self.controller.send_command("X-")
+        self.send_manual("X-")
 
     def jog_y_plus_manual(self):
-        self.controller.send_command("Y+")
+        self.send_manual("Y+")
 
     def jog_y_minus_manual(self):
-        self.controller.send_command("Y-")
-        
+        self.send_manual("Y-")
+
+    def jog_press(self, direction):
+        if not self.controller_ready():
+            return
+        if self.gcode_sender.is_running:
+            self.append_log("Jog ignored while a job is running")
+            return
+        self.jogger.press(direction)
+
+    def jog_release(self, direction):
+        if self.jogger is not None:
+            self.jogger.release(direction)
+
+    def send_manual(self, command):
+        # Answered with ok/error, which a running job would take as the ack of one of its own lines
+        if not self.controller_ready():
+            return
+        if self.gcode_sender.is_running:
+            self.append_log(f"{command} ignored while a job is running")
+            return
+        self.controller.send_command(command)
+
+    def send_machine_command(self, arduino_command, grbl_char):
+        # Sketch commands are lines answered with text only; GRBL's are real-time bytes.
+        # A line would queue behind a running job's lines in the 64-byte RX buffer, so it waits for the job
+        if JOG_PROTOCOL != PROTOCOL_ARDUINO:
+            self.controller.send_realtime(grbl_char)
+        elif not self.gcode_sender.is_running:
+            self.controller.send_command(arduino_command)
+
+    def set_job_paused(self, paused):
+        if paused:
+            self.gcode_sender.pause()
+            self.file_upload_frame.start_btn.configure(text="Resume")
+        else:
+            self.gcode_sender.resume()
+            self.file_upload_frame.start_btn.configure(text="Pause")
+
     def feed_hold(self):
-        self.controller.send_command("!")
-        
+        if not self.controller_ready():
+            return
+        if self.gcode_sender.is_running:
+            self.set_job_paused(True)
+        self.send_machine_command("FEEDHOLD", "!")
+
     def go_home(self):
-        self.controller.send_command("$H")
+        self.send_manual("HOME" if JOG_PROTOCOL == PROTOCOL_ARDUINO else "$H")
 
     def pause_job(self):
-        self.controller.send_command("!")
-        
+        if not self.controller_ready():
+            return
+        if self.gcode_sender.is_running:
+            self.set_job_paused(True)
+        self.send_machine_command("PAUSE", "!")
+
     def start_job(self):
-        self.controller.send_command("~")
+        if not self.controller_ready():
+            return
+        if self.gcode_sender.is_running:
+            self.set_job_paused(False)
+        self.send_machine_command("CYCLE", "~")
 
     def reset_job(self):
-        # Sending a soft-reset command
-        self.controller.send_command("\x18")
+        if not self.controller_ready():
+            return
+        if self.gcode_sender.is_running:
+            self.gcode_sender.stop()
+            self.file_upload_frame.set_running_state(False)
+            self.append_log("Job stopped by RESET")
+            if JOG_PROTOCOL == PROTOCOL_ARDUINO:
+                return  # lines already in the sketch's buffer run first; press RESET again once it is idle
+        self.send_machine_command("RESET", "\x18")
 
     def upload_file(self):
+        if not self.controller_ready():
+            return
         filepath = filedialog.askopenfilename(
             title="Open G-code File",
             filetypes=(("G-code files", "*.nc *.gcode"), ("All files", "*.*"))
         )
         self.file_upload_frame.set_file_name(filepath)
+        if self.toolpath_preview:
+            self.toolpath_preview.clear()
+        self.job_estimate = None
+        self.preflight = None
         if filepath:
             self.gcode_sender.load_file(filepath)
             print(f"Selected file: {filepath}")
+            # Start stays enabled; the raw file is streamed until compilation finishes
+            threading.Thread(target=self.compile_gcode, daemon=True).start()
+
+    def compile_gcode(self):
+        # Worker thread: the numpy-based modules are imported here on first use
+        from controller.estimator import estimate_job, format_duration
+        from ui_components.toolpath_preview import PreviewGeometry, prerender_tiles
+        from controller.preflight import preflight_check
+        try:
+            toolpath = self.gcode_sender.compile()
+            if toolpath is not None:
+                self.append_log(f"Compiled {len(toolpath)} commands")
+                # Soft limits, feeds and unsupported words, checked on the program as written
+                self.preflight = preflight_check(toolpath, self.gcode_sender.program,
+                                                 check_words=JOG_PROTOCOL == PROTOCOL_ARDUINO)
+                self.append_log(self.preflight.summary())
+                # Preview the program as written; numpy work stays on this thread
+                geometry = PreviewGeometry(toolpath)
+                self.ui_updates.post_event(
+                    self.toolpath_preview.set_geometry, geometry, prerender_tiles(geometry, *PREVIEW_SIZE))
+                if OPTIMIZE_TOLERANCE_MM > 0:
+                    # No arc fitting: the Arduino sketch only executes G0/G1
+                    result = self.gcode_sender.optimize(OPTIMIZE_TOLERANCE_MM)
+                    self.append_log(result.summary())
+                    toolpath = result.toolpath
+                self.job_estimate = estimate_job(toolpath)
+                self.append_log(self.job_estimate.summary())
+                self.ui_updates.post_event(
+                    self.file_upload_frame.set_estimate, f"Est. {format_duration(self.job_estimate.total_time)}")
+        except Exception as e:
+            self.append_log(f"Could not compile G-code: {e}")
+
+    def ask_resume_line(self):
+        # Offer to continue an interrupted run of the same file instead of starting over
+        saved = self.checkpoint.read() if self.checkpoint else None
+        program = self.gcode_sender.program
+        if saved is None or program is None or not saved.can_resume(program):
+            return 0
+        resume = messagebox.askyesno(
+            "Resume Job",
+            f"The last run of this file stopped after line {saved.line + 1} (X{saved.x:.3f} Y{saved.y:.3f}).\n"
+            f"Resume from line {saved.line + 2}? Make sure the machine is zeroed at the job origin first.\n"
+            "Choose No to start from the beginning.")
+        return saved.line + 1 if resume else 0
+
+    def confirm_preflight(self):
+        report = self.preflight
+        if report is None or report.ok:
+            return True
+        errors = report.errors
+        details = "\n".join(issue.describe() for issue in errors[:5])
+        return messagebox.askyesno(
+            "Pre-flight Check",
+            f"{len(errors)} problem(s) found, the first at line {report.first_error_line() + 1}:\n\n{details}\n\n"
+            "The job will probably halt or move outside the travel. Start anyway?")
 
     def start_gcode_job(self):
+        if not self.controller_ready():
+            return
         if self.gcode_sender.is_running:
-            if self.gcode_sender.is_paused:
-                self.gcode_sender.resume()
-                self.file_upload_frame.start_btn.configure(text="Pause")
-            else:
-                self.gcode_sender.pause()
-                self.file_upload_frame.start_btn.configure(text="Resume")
+            self.set_job_paused(not self.gcode_sender.is_paused)
         else:
-            self.gcode_sender.start()
+            if not self.confirm_preflight():
+                return
+            self.gcode_sender.start(from_line=self.ask_resume_line())
             self.file_upload_frame.set_running_state(True)
             self.file_upload_frame.start_btn.configure(text="Pause")
 
 
 if __name__ == "__main__":
-    app = JogTrainerApp()
-    app.mainloop() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="CNC Jog Trainer")
+    parser.add_argument("--replay", help="replay a telemetry file or directory instead of using a serial port")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, e.g. 10 for 10x; 0 for as fast as possible")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print the startup timings and exit; exit code 1 when over STARTUP_BUDGET_MS")
+    args = parser.parse_args()
+    if args.replay and not os.path.exists(args.replay):
+        parser.error(f"--replay: no such file or directory: {args.replay}")
+    app = JogTrainerApp(replay=args.replay, replay_speed=args.speed)
+    if args.startup_report:
+        def report_and_exit():
+            print(app.startup.report())
+            app.on_closing()
+        app.after_idle(lambda: app.after(0, report_and_exit))
+    app.mainloop()
+    if args.startup_report:
+        sys.exit(1 if app.startup.over_budget() else 0) 
\ No newline at end of file
@@ -26,7 +26,8 @@ class ConnectionPanel(ctk.CTkFrame):
         if not ports:
             ports = ["-"]
         self.port_menu.configure(values=ports)
-        if ports:
+        # Keep the user's choice when a background rescan finds it again
+        if self.port_menu.get() not in ports:
             self.port_menu.set(ports[0])
 
     def set_connection_state(self, is_connected):
@@ -21,9 +21,12 @@ class FileUploadFrame(ctk.CTkFrame):
         self.start_btn.grid(row=0, column=2, padx=5, pady=5)
         
         self.progress_bar = ctk.CTkProgressBar(self)
-        self.progress_bar.grid(row=1, column=0, columnspan=3, sticky="ew", padx=5, pady=5)
+        self.progress_bar.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
         self.progress_bar.set(0)
 
+        self.eta_label = ctk.CTkLabel(self, text="", anchor="e")
+        self.eta_label.grid(row=1, column=2, padx=5, sticky="e")
+
     def set_file_name(self, filepath):
         if filepath:
             filename = os.path.basename(filepath)
@@ -32,9 +35,16 @@ class FileUploadFrame(ctk.CTkFrame):
         else:
             self.file_label.configure(text="No file selected.")
             self.start_btn.configure(state="disabled")
+        self.progress_bar.set(0)
+        self.eta_label.configure(text="")
 
-    def update_progress(self, progress_value):
+    def update_progress(self, progress_value, eta_text=None):
         self.progress_bar.set(progress_value)
+        if eta_text is not None:
+            self.eta_label.configure(text=eta_text)
+
+    def set_estimate(self, text):
+        self.eta_label.configure(text=text)
 
     def set_running_state(self, is_running):
         if is_running:
@@ -1,7 +1,7 @@
 import customtkinter as ctk
 
 class JogPanel(ctk.CTkFrame):
-    def __init__(self, master, jog_commands, **kwargs):
+    def __init__(self, master, jog_commands, on_jog_press=None, on_jog_release=None, **kwargs):
         super().__init__(master, **kwargs)
 
         button_font = ctk.CTkFont(size=18, weight="bold")
@@ -18,4 +18,12 @@ class JogPanel(ctk.CTkFrame):
         self.x_minus_btn.grid(row=1, column=0, padx=5, pady=5)
 
         self.y_minus_btn = ctk.CTkButton(self, text="Y-", font=button_font, width=button_size[0], height=button_size[1], command=jog_commands["y-"])
-        self.y_minus_btn.grid(row=1, column=1, padx=5, pady=5)
\ No newline at end of file
+        self.y_minus_btn.grid(row=1, column=1, padx=5, pady=5)
+
+        # Hold-to-jog: press/release replace the click command
+        if on_jog_press and on_jog_release:
+            buttons = {"x+": self.x_plus_btn, "x-": self.x_minus_btn, "y+": self.y_plus_btn, "y-": self.y_minus_btn}
+            for direction, button in buttons.items():
+                button.configure(command=None)
+                button.bind("<ButtonPress-1>", lambda event, d=direction: on_jog_press(d))
+                button.bind("<ButtonRelease-1>", lambda event, d=direction: on_jog_release(d))
@@ -28,15 +28,18 @@ class StatusBar(ctk.CTkFrame):
         script_dir = os.path.dirname(os.path.abspath(__file__))
         logo_path = os.path.join(script_dir, "..", "assets", "raspberry_pi_logo.png")
 
-        try:
-            self.logo_image = PhotoImage(file=logo_path)
+        self.logo_image = None
+        if os.path.isfile(logo_path):
+            try:
+                self.logo_image = PhotoImage(file=logo_path)
+            except Exception as e:
+                print(f"Could not load logo: {e}")
+        if self.logo_image is not None:
             self.logo_label = ctk.CTkLabel(self, image=self.logo_image, text="")
-            self.logo_label.grid(row=0, column=3, sticky="e")
-        except Exception as e:
-            print(f"Could not load logo: {e}")
-            # Fallback to text if image fails
+        else:
+            # The assets folder is optional; show text instead of failing on every start
             self.logo_label = ctk.CTkLabel(self, text="RPI", font=ctk.CTkFont(size=20, weight="bold"))
-            self.logo_label.grid(row=0, column=3, sticky="e")
+        self.logo_label.grid(row=0, column=3, sticky="e")
 
     def set_status(self, status_text):
         self.status_label.configure(text=status_text)
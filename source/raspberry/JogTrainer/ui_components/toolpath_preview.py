@@ -0,0 +1,427 @@
+import tkinter as tk
+from collections import OrderedDict
+
+import customtkinter as ctk
+
+from controller.toolpath import OP_RAPID, OP_ARC_CCW
+# numpy is imported in the functions that use it: the widget is built on the Tk
+# thread right after the first frame, the geometry only once a program is loaded
+
+TILE_SIZE = 256
+MAX_TILES = 48             # cached tile images, least recently used dropped first
+MAX_PRIMITIVES = 2000      # canvas line items; denser views are drawn from raster tiles
+MAX_OVERLAY_SEGMENTS = 2000  # larger progress jumps re-render the visible tiles
+MAX_ZOOM_LEVEL = 12
+PADDING = 4                # pixels around the program at zoom 0
+_CHUNK = 262144            # segments rasterized per numpy pass
+
+BACKGROUND = "#f5f5f5"
+RAPID_COLOR = "#b4b4b4"
+CUT_COLOR = "#1f6aa5"
+DONE_COLOR = "#2fa84f"
+MARKER_COLOR = "#d03030"
+
+
+def _rgb(color):
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+class PreviewGeometry:
+    """The program's motion as straight segments in parallel numpy arrays.
+
+    Built once per program (off the Tk thread is fine). Arcs are drawn
+    as their chord, as in estimate_job(). Segments stay in program order,
+    so "done" is always a prefix.
+    """
+
+    def __init__(self, toolpath):
+        import numpy as np
+        op = np.frombuffer(toolpath.op, dtype=np.uint8)
+        x = np.frombuffer(toolpath.x, dtype=np.float32)
+        y = np.frombuffer(toolpath.y, dtype=np.float32)
+        line = np.frombuffer(toolpath.line, dtype=np.uint32)
+        x0 = np.concatenate((np.zeros(1, np.float32), x[:-1]))
+        y0 = np.concatenate((np.zeros(1, np.float32), y[:-1]))
+        keep = (op <= OP_ARC_CCW) & ((x != x0) | (y != y0))
+        self.x0 = x0[keep]
+        self.y0 = y0[keep]
+        self.x1 = x[keep]
+        self.y1 = y[keep]
+        self.rapid = op[keep] == OP_RAPID
+        self.line = line[keep]
+        self.min_x = np.minimum(self.x0, self.x1)
+        self.max_x = np.maximum(self.x0, self.x1)
+        self.min_y = np.minimum(self.y0, self.y1)
+        self.max_y = np.maximum(self.y0, self.y1)
+        if len(self.line):
+            self.bbox = (float(self.min_x.min()), float(self.min_y.min()),
+                         float(self.max_x.max()), float(self.max_y.max()))
+        else:
+            self.bbox = (0.0, 0.0, 1.0, 1.0)
+
+    def __len__(self):
+        return len(self.line)
+
+    def select(self, min_x, min_y, max_x, max_y):
+        # Indices of segments whose bounding box overlaps the rectangle (mm)
+        import numpy as np
+        return np.flatnonzero((self.max_x >= min_x) & (self.min_x <= max_x) &
+                              (self.max_y >= min_y) & (self.min_y <= max_y))
+
+    def done_count(self, line_index):
+        # Segments at or before the given source line
+        import numpy as np
+        return int(np.searchsorted(self.line, line_index, side='right'))
+
+
+class PreviewView:
+    """Mapping between mm and global pixels at one zoom level (y up in mm, down in pixels)."""
+
+    def __init__(self, geometry, width, height, zoom=0):
+        min_x, min_y, max_x, max_y = geometry.bbox
+        self.min_x = min_x
+        self.max_y = max_y
+        fit = min((width - 2 * PADDING) / max(max_x - min_x, 1e-3),
+                  (height - 2 * PADDING) / max(max_y - min_y, 1e-3))
+        self.scale = max(fit, 1e-6) * 2 ** zoom
+
+    def to_pixels(self, x, y):
+        return (x - self.min_x) * self.scale + PADDING, (self.max_y - y) * self.scale + PADDING
+
+    def to_mm(self, gx, gy):
+        return (gx - PADDING) / self.scale + self.min_x, self.max_y - (gy - PADDING) / self.scale
+
+
+def rasterize_samples(geometry, view, indices, left, top, width, height):
+    """Pixel samples of the given segments inside a width x height window at (left, top).
+
+    Segments are clipped to the window first (Liang-Barsky), then sampled
+    at most one pixel apart. Returns (px, py, segment) arrays.
+    """
+    import numpy as np
+    xs, ys, segs = [], [], []
+    for start in range(0, len(indices), _CHUNK):
+        idx = indices[start:start + _CHUNK]
+        x0, y0 = view.to_pixels(geometry.x0[idx].astype(np.float64), geometry.y0[idx].astype(np.float64))
+        x1, y1 = view.to_pixels(geometry.x1[idx].astype(np.float64), geometry.y1[idx].astype(np.float64))
+        x0 -= left
+        x1 -= left
+        y0 -= top
+        y1 -= top
+        dx = x1 - x0
+        dy = y1 - y0
+        t0 = np.zeros(len(idx))
+        t1 = np.ones(len(idx))
+        valid = np.ones(len(idx), dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for p, q in ((-dx, x0), (dx, width - 1 - x0), (-dy, y0), (dy, height - 1 - y0)):
+                r = q / p
+                t0 = np.where(p < 0, np.maximum(t0, r), t0)
+                t1 = np.where(p > 0, np.minimum(t1, r), t1)
+                valid &= ~((p == 0) & (q < 0))
+        valid &= t0 <= t1
+        if not valid.any():
+            continue
+        idx, x0, y0, dx, dy, t0, t1 = idx[valid], x0[valid], y0[valid], dx[valid], dy[valid], t0[valid], t1[valid]
+        cx = x0 + t0 * dx
+        cy = y0 + t0 * dy
+        cdx = (t1 - t0) * dx
+        cdy = (t1 - t0) * dy
+        n = np.ceil(np.maximum(np.abs(cdx), np.abs(cdy))).astype(np.int64) + 1
+        seg = np.repeat(np.arange(len(idx)), n)
+        first = np.repeat(np.cumsum(n) - n, n)
+        t = (np.arange(len(seg)) - first) / np.maximum(n - 1, 1)[seg]
+        xs.append(np.clip(np.rint(cx[seg] + t * cdx[seg]), 0, width - 1).astype(np.int32))
+        ys.append(np.clip(np.rint(cy[seg] + t * cdy[seg]), 0, height - 1).astype(np.int32))
+        segs.append(idx[seg])
+    if not xs:
+        empty = np.zeros(0, dtype=np.int32)
+        return empty, empty, empty
+    return np.concatenate(xs), np.concatenate(ys), np.concatenate(segs)
+
+
+def render_tile(geometry, view, left, top, width, height, done):
+    """RGB image (height x width x 3) of the program in the window; segments below done are drawn as completed."""
+    import numpy as np
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = _rgb(BACKGROUND)
+    scale = view.scale
+    min_x, max_y = geometry.bbox[0], geometry.bbox[3]
+    # The window in mm, one pixel of slack for rounding
+    x_lo = (left - PADDING - 1) / scale + min_x
+    x_hi = (left + width - PADDING + 1) / scale + min_x
+    y_hi = max_y - (top - PADDING - 1) / scale
+    y_lo = max_y - (top + height - PADDING + 1) / scale
+    indices = geometry.select(x_lo, y_lo, x_hi, y_hi)
+    px, py, seg = rasterize_samples(geometry, view, indices, left, top, width, height)
+    rapid = geometry.rapid[seg]
+    is_done = seg < done
+    # Later layers win: rapids, then cuts, then completed moves
+    for mask, color in ((rapid & ~is_done, RAPID_COLOR), (~rapid & ~is_done, CUT_COLOR), (is_done, DONE_COLOR)):
+        image[py[mask], px[mask]] = _rgb(color)
+    return image
+
+
+def prerender_tiles(geometry, width, height):
+    """Zoom-0 tiles for a width x height preview, as numpy images; safe to call off the Tk thread."""
+    view = PreviewView(geometry, width, height)
+    return {(0, tx, ty): render_tile(geometry, view, tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE, 0)
+            for ty in range((height - 1) // TILE_SIZE + 1) for tx in range((width - 1) // TILE_SIZE + 1)}
+
+
+def to_photo(image, master):
+    height, width = image.shape[:2]
+    header = f"P6 {width} {height} 255\n".encode('ascii')
+    return tk.PhotoImage(master=master, data=header + image.tobytes(), format="PPM")
+
+
+def decimate(geometry, view, indices, left, top):
+    """Level-of-detail polyline for the given (sorted) segments.
+
+    Consecutive segments ending in the same pixel are folded into one, so
+    the result has at most one primitive per pixel step along the path.
+    Returns (x0, y0, x1, y1, segment) in canvas pixels, where segment is
+    the last original segment each primitive covers.
+    """
+    import numpy as np
+    sx, sy = view.to_pixels(geometry.x0[indices].astype(np.float64), geometry.y0[indices].astype(np.float64))
+    ex, ey = view.to_pixels(geometry.x1[indices].astype(np.float64), geometry.y1[indices].astype(np.float64))
+    sx, sy = np.rint(sx - left), np.rint(sy - top)
+    ex, ey = np.rint(ex - left), np.rint(ey - top)
+    rapid = geometry.rapid[indices]
+    n = len(indices)
+    start = np.ones(n, dtype=bool)   # begins a new polyline: gap in the selection or rapid/cut change
+    start[1:] = (indices[1:] != indices[:-1] + 1) | (rapid[1:] != rapid[:-1])
+    moved = np.ones(n, dtype=bool)
+    moved[1:] = (ex[1:] != ex[:-1]) | (ey[1:] != ey[:-1])
+    keep = start | moved
+    # A kept segment continues from the end pixel of the one before it
+    px = np.where(start, sx, np.roll(ex, 1))
+    py = np.where(start, sy, np.roll(ey, 1))
+    return px[keep], py[keep], ex[keep], ey[keep], indices[keep]
+
+
+class ToolpathPreview(ctk.CTkFrame):
+    """Top-down view of the loaded program with the completed part highlighted.
+
+    Zoomed-in views with few visible segments are drawn as canvas lines
+    (after level-of-detail decimation, at most MAX_PRIMITIVES items);
+    denser views are composed from cached TILE_SIZE raster tiles rendered
+    with numpy. Progress only repaints what changed: newly completed
+    segments are recoloured in place.
+    """
+
+    def __init__(self, master, width=150, height=90, **kwargs):
+        super().__init__(master, **kwargs)
+        self.canvas = tk.Canvas(self, width=width, height=height, bg=BACKGROUND, highlightthickness=0)
+        self.canvas.grid(row=0, column=0, rowspan=3)
+        self.zoom_in_btn = ctk.CTkButton(self, text="+", width=28, height=24, command=lambda: self.zoom_at(None, None, 1))
+        self.zoom_in_btn.grid(row=0, column=1, padx=(4, 0))
+        self.zoom_out_btn = ctk.CTkButton(self, text="-", width=28, height=24, command=lambda: self.zoom_at(None, None, -1))
+        self.zoom_out_btn.grid(row=1, column=1, padx=(4, 0))
+        self.fit_btn = ctk.CTkButton(self, text="Fit", width=28, height=24, command=self.fit)
+        self.fit_btn.grid(row=2, column=1, padx=(4, 0))
+
+        self.width = width
+        self.height = height
+        self.geometry = None
+        self.view = None
+        self.zoom = 0
+        self.offset = (0.0, 0.0)  # global pixel at the canvas' top-left corner
+        self.done = 0             # completed segments
+        self.tiles = OrderedDict()  # (zoom, tx, ty) -> [PhotoImage, done when rendered]
+        self.tile_items = {}
+        self.vector_items = []
+        self.vector_segments = None
+        self.marker = self.canvas.create_oval(0, 0, 0, 0, outline=MARKER_COLOR, width=2, state="hidden")
+        self._drag = None
+        self._redraw_pending = False
+
+        self.canvas.bind("<ButtonPress-1>", self._on_press)
+        self.canvas.bind("<B1-Motion>", self._on_drag)
+        self.canvas.bind("<Double-Button-1>", lambda event: self.fit())
+        self.canvas.bind("<MouseWheel>", lambda event: self.zoom_at(event.x, event.y, 1 if event.delta > 0 else -1))
+        self.canvas.bind("<Button-4>", lambda event: self.zoom_at(event.x, event.y, 1))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom_at(event.x, event.y, -1))
+
+    # --- Program and progress ---
+    def set_geometry(self, geometry, images=None):
+        """Show a program; images are optional prerender_tiles() results for this preview's size."""
+        self.geometry = geometry
+        self.done = 0
+        self.fit()
+        for key, image in (images or {}).items():
+            self.tiles[key] = [to_photo(image, self.canvas), 0]
+
+    def clear(self):
+        self.geometry = None
+        self.done = 0
+        self._clear_items()
+        self.tiles.clear()
+        self.canvas.itemconfigure(self.marker, state="hidden")
+
+    def set_progress(self, line_index):
+        """Mark everything up to and including the given source line as completed."""
+        geometry = self.geometry
+        if geometry is None:
+            return
+        done = geometry.done_count(line_index)
+        previous = self.done
+        if done == previous:
+            return
+        self.done = done
+        if done < previous or done - previous > MAX_OVERLAY_SEGMENTS:
+            self.request_redraw()
+        elif self.vector_segments is not None:
+            self._recolor_vectors(previous, done)
+        else:
+            for key in self.tile_items:
+                self._paint_tile(key, self.tiles[key])
+        self._move_marker()
+
+    # --- View ---
+    def fit(self):
+        self.zoom = 0
+        self.offset = (0.0, 0.0)
+        self.tiles.clear()
+        self._update_view()
+        self.request_redraw()
+
+    def zoom_at(self, x, y, step):
+        if self.geometry is None:
+            return
+        zoom = min(max(self.zoom + step, 0), MAX_ZOOM_LEVEL)
+        if zoom == self.zoom:
+            return
+        if x is None:
+            x, y = self.width / 2, self.height / 2
+        # Keep the point under the cursor in place
+        factor = 2.0 ** (zoom - self.zoom)
+        ox, oy = self.offset
+        self.offset = ((ox + x) * factor - x, (oy + y) * factor - y)
+        self.zoom = zoom
+        self._update_view()
+        self.request_redraw()
+
+    def _update_view(self):
+        if self.geometry is not None:
+            self.view = PreviewView(self.geometry, self.width, self.height, self.zoom)
+
+    def _on_press(self, event):
+        self._drag = (event.x, event.y)
+
+    def _on_drag(self, event):
+        if self._drag is None or self.geometry is None:
+            return
+        ox, oy = self.offset
+        self.offset = (ox - (event.x - self._drag[0]), oy - (event.y - self._drag[1]))
+        self._drag = (event.x, event.y)
+        self.request_redraw()
+
+    def request_redraw(self):
+        # Coalesce bursts of drag/zoom/progress events into one redraw
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.after_idle(self._redraw)
+
+    # --- Drawing ---
+    def _clear_items(self):
+        for item in self.tile_items.values():
+            self.canvas.delete(item)
+        self.tile_items.clear()
+        for item in self.vector_items:
+            self.canvas.delete(item)
+        self.vector_items = []
+        self.vector_segments = None
+
+    def _redraw(self):
+        self._redraw_pending = False
+        geometry = self.geometry
+        self._clear_items()
+        if geometry is None or not len(geometry):
+            return
+        view = self.view
+        left, top = self.offset
+        x_lo, y_hi = view.to_mm(left, top)
+        x_hi, y_lo = view.to_mm(left + self.width, top + self.height)
+        visible = geometry.select(x_lo, y_lo, x_hi, y_hi)
+        if len(visible) <= MAX_PRIMITIVES * 8:
+            lines = decimate(geometry, view, visible, left, top)
+            if len(lines[0]) <= MAX_PRIMITIVES:
+                self._draw_vectors(*lines)
+                self._move_marker()
+                return
+        self._draw_tiles()
+        self._move_marker()
+
+    def _draw_vectors(self, x0, y0, x1, y1, segments):
+        canvas = self.canvas
+        rapid = self.geometry.rapid[segments]
+        done = self.done
+        items = []
+        for i in range(len(segments)):
+            if segments[i] < done:
+                color = DONE_COLOR
+            else:
+                color = RAPID_COLOR if rapid[i] else CUT_COLOR
+            items.append(canvas.create_line(x0[i], y0[i], x1[i], y1[i], fill=color,
+                                            dash=(2, 2) if rapid[i] else None))
+        self.vector_items = items
+        self.vector_segments = segments
+        canvas.tag_raise(self.marker)
+
+    def _recolor_vectors(self, previous, done):
+        import numpy as np
+        segments = self.vector_segments
+        start = int(np.searchsorted(segments, previous))
+        end = int(np.searchsorted(segments, done))
+        for i in range(start, end):
+            self.canvas.itemconfigure(self.vector_items[i], fill=DONE_COLOR)
+
+    def _visible_tiles(self):
+        left, top = self.offset
+        tx0, ty0 = int(left // TILE_SIZE), int(top // TILE_SIZE)
+        tx1, ty1 = int((left + self.width - 1) // TILE_SIZE), int((top + self.height - 1) // TILE_SIZE)
+        return [(self.zoom, tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+
+    def _draw_tiles(self):
+        left, top = self.offset
+        for key in self._visible_tiles():
+            _, tx, ty = key
+            entry = self.tiles.get(key)
+            if entry is None or not 0 <= self.done - entry[1] <= MAX_OVERLAY_SEGMENTS:
+                image = render_tile(self.geometry, self.view, tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE, self.done)
+                entry = [to_photo(image, self.canvas), self.done]
+                self.tiles[key] = entry
+            else:
+                self._paint_tile(key, entry)
+            self.tiles.move_to_end(key)
+            while len(self.tiles) > MAX_TILES:
+                self.tiles.popitem(last=False)
+            self.tile_items[key] = self.canvas.create_image(
+                tx * TILE_SIZE - left, ty * TILE_SIZE - top, image=entry[0], anchor="nw")
+        self.canvas.tag_raise(self.marker)
+
+    def _paint_tile(self, key, entry):
+        # Recolour segments completed since the tile was drawn, without re-rendering it
+        import numpy as np
+        if entry[1] == self.done:
+            return
+        _, tx, ty = key
+        segments = np.arange(entry[1], self.done)
+        px, py, _ = rasterize_samples(self.geometry, self.view, segments, tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+        photo = entry[0]
+        for pixel in np.unique(py.astype(np.int64) * TILE_SIZE + px).tolist():
+            y, x = divmod(pixel, TILE_SIZE)
+            photo.put(DONE_COLOR, to=(x, y, x + 1, y + 1))
+        entry[1] = self.done
+
+    def _move_marker(self):
+        if self.geometry is None or self.done == 0 or self.view is None:
+            self.canvas.itemconfigure(self.marker, state="hidden")
+            return
+        gx, gy = self.view.to_pixels(float(self.geometry.x1[self.done - 1]), float(self.geometry.y1[self.done - 1]))
+        x, y = gx - self.offset[0], gy - self.offset[1]
+        self.canvas.coords(self.marker, x - 3, y - 3, x + 3, y + 3)
+        self.canvas.itemconfigure(self.marker, state="normal")
+        self.canvas.tag_raise(self.marker)
@@ -0,0 +1,107 @@
+from collections import deque
+
+
+class BoundedLog:
+    """Read-only textbox that keeps at most max_lines lines, written in bulk.
+
+    Lines are counted as displayed: a multi-line message (profiler dump,
+    pre-flight summary) counts once per line of text.
+    """
+
+    def __init__(self, textbox, max_lines=500):
+        self.textbox = textbox
+        self.max_lines = max_lines
+        self.line_count = 0
+
+    def append_lines(self, lines):
+        if not lines:
+            return
+        text = "\n".join(lines[-self.max_lines:])
+        count = text.count("\n") + 1
+        if count > self.max_lines:
+            text = text.rsplit("\n", self.max_lines)
+            text = "\n".join(text[1:])
+            count = self.max_lines
+        self.textbox.configure(state="normal")
+        self.textbox.insert("end", text + "\n")
+        self.line_count += count
+        excess = self.line_count - self.max_lines
+        if excess > 0:
+            self.textbox.delete("1.0", f"{excess + 1}.0")
+            self.line_count -= excess
+        self.textbox.see("end")
+        self.textbox.configure(state="disabled")
+
+    def clear(self):
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.configure(state="disabled")
+        self.line_count = 0
+
+
+class UIUpdatePipeline:
+    """Hands updates from worker threads to Tk on a fixed-rate after() tick.
+
+    The post_* methods never block and may be called from any thread; only
+    deque appends/pops and single dict operations are used, which are
+    atomic in CPython. Everything is delivered on the Tk thread:
+      - post_latest: coalesced per key, only the newest arguments are used
+      - post_event: delivered in order, never dropped (errors, state changes)
+      - post_log: written to the log sink in one batch per tick
+    """
+
+    def __init__(self, master, log_sink=None, rate_hz=30):
+        self.master = master
+        self.log_sink = log_sink
+        self.interval_ms = max(1, int(1000 / rate_hz))
+        self._handlers = {}
+        self._latest = {}
+        self._events = deque()
+        self._logs = deque()
+        self._after_id = None
+
+    def register(self, key, handler):
+        self._handlers[key] = handler
+
+    def post_latest(self, key, *args):
+        self._latest[key] = args
+
+    def post_event(self, handler, *args):
+        self._events.append((handler, args))
+
+    def post_log(self, message):
+        self._logs.append(message)
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.master.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.master.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        try:
+            self.drain()
+        finally:
+            self._after_id = self.master.after(self.interval_ms, self._tick)
+
+    def drain(self):
+        events = self._events
+        for _ in range(len(events)):
+            handler, args = events.popleft()
+            handler(*args)
+
+        for key in list(self._latest):
+            args = self._latest.pop(key, None)
+            handler = self._handlers.get(key)
+            if args is not None and handler:
+                handler(*args)
+
+        logs = self._logs
+        count = len(logs)
+        if count:
+            lines = [logs.popleft() for _ in range(count)]
+            if self.log_sink:
+                self.log_sink(lines)